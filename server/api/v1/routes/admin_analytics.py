@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Header, Query
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+from server.db.session import get_db
+from server.schemas.analytics import GlobalAnalyticsResponse
+from server.api.v1.routes.analytics import get_current_user
+from server.controllers.admin_analytics_controller import require_admin, fetch_global_analytics
+
+router = APIRouter(prefix="/v1/admin/analytics", tags=["admin-analytics"])
+
+@router.get("/global", response_model=GlobalAnalyticsResponse)
+def get_global_analytics(
+    authorization: str = Header(..., alias="Authorization"),
+    db: Session = Depends(get_db),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to")
+):
+    """
+    Cómo se sienten todos los usuarios: distribución de emociones, análisis por hora
+    y usuarios activos (aproximado) en el rango. Por defecto, los últimos 7 días.
+    Lee los agregados por hora que mantiene el job global, no la tabla analisis.
+    """
+    user = get_current_user(authorization, db)
+    require_admin(user)
+    return fetch_global_analytics(db, date_from, date_to)
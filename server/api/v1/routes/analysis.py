@@ -1,19 +1,13 @@
-from fastapi import APIRouter, HTTPException, status, Header, UploadFile, File
+from fastapi import APIRouter, HTTPException, status, Header, Request, UploadFile, File
 from pydantic import BaseModel
-from typing import Dict
-import random
-import base64
-import io
-import requests
-from PIL import Image
-from server.services.aws_rekognition_service import rekognition_service
-from server.core.config import settings
-from botocore.exceptions import BotoCoreError, ClientError
+from typing import Any, Dict, List, Optional
+import asyncio
 from datetime import datetime
+from server.controllers.analysis_controller import MOCK_EMOTIONS, aggregate_emotions, detect_emotion
+from server.core.config import settings
 from server.core.security import verify_token
-from server.db.models.user import User
-from server.db.session import get_db
-from sqlalchemy.orm import Session
+from server.services.recommendations import get_music_recommendations
+from server.utils.image import ImageBuffer, read_base64_image, read_raw_image, read_upload_image, validate_image
 
 router = APIRouter(prefix="/v1/analysis", tags=["analysis"])
 
@@ -27,285 +21,144 @@ class EmotionAnalysisResponse(BaseModel):
     timestamp: str
     message: str
     recommendations: list = []  # Agregar recomendaciones a la respuesta
+    preprocessing: Optional[Dict[str, Any]] = None  # Bytes ahorrados y tiempos del preprocesado (solo con Rekognition)
+    cache_status: Optional[str] = None  # exact, similar, shared o miss (solo con Rekognition)
+
+
+class BatchImageResult(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    success: bool
+    emotion: Optional[str] = None
+    confidence: Optional[float] = None
+    emotions_detected: Dict[str, float] = {}
+    message: Optional[str] = None
+    error: Optional[str] = None
+    preprocessing: Optional[Dict[str, Any]] = None
+    cache_status: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    emotion: str  # Emoción dominante del vector agregado
+    confidence: float
+    emotions_detected: Dict[str, float]  # Promedio de los vectores normalizados de cada imagen
+    analyzed: int
+    failed: int
+    results: List[BatchImageResult]
+    timestamp: str
+    recommendations: list = []  # Una sola consulta, para la emoción agregada
 
-# 🎭 Datos mockup de emociones
-MOCK_EMOTIONS = {
-    "happy": {
-        "emotion": "happy",
-        "confidence": 0.87,
-        "emotions_detected": {
-            "happy": 0.87,
-            "relaxed": 0.06,
-            "sad": 0.03,
-            "angry": 0.02,
-            "energetic": 0.02
-        }
-    },
-    "sad": {
-        "emotion": "sad",
-        "confidence": 0.82,
-        "emotions_detected": {
-            "sad": 0.82,
-            "relaxed": 0.09,
-            "happy": 0.05,
-            "angry": 0.03,
-            "energetic": 0.01
-        }
-    },
-    "angry": {
-        "emotion": "angry",
-        "confidence": 0.79,
-        "emotions_detected": {
-            "angry": 0.79,
-            "energetic": 0.11,
-            "sad": 0.06,
-            "happy": 0.03,
-            "relaxed": 0.01
-        }
-    },
-    "relaxed": {
-        "emotion": "relaxed",
-        "confidence": 0.85,
-        "emotions_detected": {
-            "relaxed": 0.85,
-            "happy": 0.08,
-            "sad": 0.04,
-            "angry": 0.02,
-            "energetic": 0.01
+
+def require_bearer(authorization: str) -> None:
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido o ausente"
+        )
+
+
+def token_subject(authorization: str) -> Optional[str]:
+    """sub del JWT; separa por usuario el caché de imágenes parecidas (None si el token no es válido)"""
+    try:
+        payload = verify_token(authorization.split(" ")[1].strip())
+    except Exception:
+        return None
+    subject = payload.get('sub') if payload else None
+    return str(subject) if subject is not None else None
+
+
+async def analyze_buffer(buffer: ImageBuffer, authorization: str, source: str) -> EmotionAnalysisResponse:
+    """Pipeline común: validar imagen -> emoción -> recomendaciones"""
+    validate_image(buffer)
+    emotion_data = await detect_emotion(buffer.data, source, token_subject(authorization))
+
+    # 🆕 Obtener recomendaciones musicales
+    recommendations = await get_music_recommendations(authorization, emotion_data['emotion'])
+    emotion_data['recommendations'] = recommendations
+
+    print(f"🎵 Recomendaciones obtenidas: {len(recommendations)} tracks")
+
+    return EmotionAnalysisResponse(**emotion_data)
+
+
+def analysis_failed(e: Exception) -> HTTPException:
+    print(f"❌ Error en análisis: {e}")
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail="Error procesando la imagen. Por favor, intenta nuevamente."
+    )
+
+
+@router.post(
+    "/analyze-base64",
+    response_model=EmotionAnalysisResponse,
+    status_code=status.HTTP_200_OK,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": ImageBase64Request.model_json_schema()},
+                "text/plain": {"schema": {"type": "string", "description": "Base64 o data URL"}},
+            },
         }
     },
-    "energetic": {
-        "emotion": "energetic",
-        "confidence": 0.83,
-        "emotions_detected": {
-            "energetic": 0.83,
-            "happy": 0.09,
-            "angry": 0.04,
-            "relaxed": 0.03,
-            "sad": 0.01
-        }
-    }
-}
-
-# Mapping from AWS Rekognition emotion types to our app emotion keys (reusable)
-AWS_TO_APP = {
-    'HAPPY': 'happy',
-    'SAD': 'sad',
-    'ANGRY': 'angry',
-    'CALM': 'relaxed',
-    'SURPRISED': 'energetic',
-    'CONFUSED': 'relaxed',
-    'DISGUSTED': 'angry',
-    'FEAR': 'sad'
-}
-
-def validate_image_base64(image_data: str) -> bool:
-    """
-    Valida que la imagen en base64 sea válida
+)
+async def analyze_emotion_base64(
+    request: Request,
+    authorization: str = Header(..., alias="Authorization")
+):
     """
-    try:
-        # Remover el prefijo data:image si existe
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        
-        # Decodificar base64
-        image_bytes = base64.b64decode(image_data)
-        
-        # Intentar abrir como imagen
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Verificar que sea una imagen válida
-        image.verify()
-        
-        return True
-    except Exception as e:
-        print(f"❌ Error validando imagen: {e}")
-        return False
+    🎭 Análisis de emoción desde imagen en Base64
 
-def get_music_recommendations(authorization: str, emotion: str) -> list:
-    """
-    Obtiene recomendaciones musicales para la emoción detectada
+    El cuerpo {"image": "<base64 o data URL>"} se decodifica mientras se recibe.
+    Para evitar el 33% extra del Base64, usar /analyze-binary.
     """
     try:
-        # Extraer token de Spotify si está disponible
-        jwt = None
-        if authorization and authorization.startswith("Bearer "):
-            token = authorization.split(" ")[1]
-            try:
-                payload = verify_token(token)
-                spotify_info = payload.get('spotify')
-                if spotify_info and spotify_info.get('access_token'):
-                    jwt = authorization  # Usar el JWT completo
-            except:
-                pass
-        
-        # Intentar obtener recomendaciones con Spotify
-        if jwt:
-            try:
-                response = requests.get(
-                    f"http://127.0.0.1:8000/recommend?emotion={emotion}",
-                    headers={"Authorization": jwt},
-                    timeout=10
-                )
-                if response.ok:
-                    data = response.json()
-                    return data.get('tracks', [])
-            except:
-                pass
-        
-        # Fallback a recomendaciones mockup
-        try:
-            response = requests.get(
-                f"http://127.0.0.1:8000/recommend/mockup?emotion={emotion}",
-                timeout=10
-            )
-            if response.ok:
-                data = response.json()
-                return data.get('tracks', [])
-        except:
-            pass
-        
-        return []
-        
+        require_bearer(authorization)
+        buffer = await read_base64_image(request)
+        return await analyze_buffer(buffer, authorization, "base64")
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Error obteniendo recomendaciones: {e}")
-        return []
-
-@router.post("/analyze-base64", response_model=EmotionAnalysisResponse, status_code=status.HTTP_200_OK)
-async def analyze_emotion_base64(
-    request: ImageBase64Request,
+        raise analysis_failed(e)
+
+
+@router.post(
+    "/analyze-binary",
+    response_model=EmotionAnalysisResponse,
+    status_code=status.HTTP_200_OK,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+                "image/*": {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+)
+async def analyze_emotion_binary(
+    request: Request,
     authorization: str = Header(..., alias="Authorization")
 ):
-    try:
-        # Verifica autenticación
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido o ausente"
-            )
-        
-        # Validar imagen
-        if not request.image:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="No se proporcionó ninguna imagen"
-            )
-
-        # Remover prefijo data:image si existe y decodificar
-        image_data = request.image
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-
-        try:
-            image_bytes = base64.b64decode(image_data)
-        except Exception:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Formato de imagen inválido (no es Base64)."
-            )
+    """
+    🎭 Análisis de emoción desde el cuerpo binario de la imagen
 
-        # Validar que sea una imagen válida
-        try:
-            img = Image.open(io.BytesIO(image_bytes))
-            img.verify()
-        except Exception:
+    Content-Type: application/octet-stream o image/jpeg, image/png, image/webp.
+    """
+    try:
+        require_bearer(authorization)
+        content_type = request.headers.get("content-type", "")
+        if not (content_type.startswith("image/") or content_type.startswith("application/octet-stream")):
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Formato de imagen inválido. Use JPEG, PNG o WebP."
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Use Content-Type application/octet-stream o image/*"
             )
-
-        # If AWS credentials are configured, try to use Rekognition. Otherwise fallback to mockup.
-        use_aws = bool(getattr(settings, 'AWS_ACCESS_KEY_ID', None) and getattr(settings, 'AWS_SECRET_ACCESS_KEY', None))
-
-        emotion_data = None
-
-        if use_aws:
-            try:
-                # Call Rekognition detect_faces
-                result = await rekognition_service.detect_faces(image_bytes)
-
-                if not result.get('success'):
-                    # Rekognition call failed -> log and fallthrough to mockup
-                    raise Exception(result.get('error', 'AWS Rekognition returned an error'))
-
-                faces = result.get('faces', [])
-                if not faces:
-                    # No faces detected -> return an explicit error for uploaded images
-                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No se detectaron rostros humanos en la imagen")
-
-                # Use first face for emotion analysis
-                emotions_list = faces[0].get('emotions', [])
-
-                # Convert to dictionary and normalize confidences to 0..1
-                emotions_detected = {}
-                for e in emotions_list:
-                    typ = e.get('Type') or e.get('type') or e.get('emotion')
-                    conf = e.get('Confidence') or e.get('confidence') or 0.0
-                    conf = float(conf) / 100.0
-                    key = AWS_TO_APP.get(typ.upper(), typ.lower() if isinstance(typ, str) else str(typ))
-                    if key in emotions_detected:
-                        emotions_detected[key] += conf
-                    else:
-                        emotions_detected[key] = conf
-
-                # Normalize after mapping and summing
-                mapped_total = sum(emotions_detected.values())
-                if mapped_total > 0:
-                    for k in list(emotions_detected.keys()):
-                        emotions_detected[k] = round(emotions_detected[k] / mapped_total, 3)
-
-                # Pick top emotion by normalized value
-                if emotions_detected:
-                    app_top = max(emotions_detected, key=lambda k: emotions_detected[k])
-                    top_conf = emotions_detected[app_top]
-                else:
-                    app_top = None
-                    top_conf = 0.0
-
-                emotion_data = {
-                    'emotion': app_top,
-                    'confidence': round(top_conf, 4),
-                    'emotions_detected': emotions_detected,
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'message': 'Análisis completado exitosamente (AWS Rekognition)'
-                }
-
-                print(f"✅ Análisis Rekognition: {app_top} ({emotion_data['confidence']*100:.1f}%)")
-
-            except (BotoCoreError, ClientError) as be:
-                print(f"❌ AWS Rekognition error: {be}")
-                # Fallthrough to mockup
-            except HTTPException:
-                # Re-raise explicit HTTPExceptions (e.g., no faces detected)
-                raise
-            except Exception as e:
-                print(f"❌ Rekognition processing error: {e}")
-                # Fallthrough to mockup
-
-        # If we reach here and don't have emotion_data, use mockup behavior
-        if not emotion_data:
-            emotion_key = random.choice(list(MOCK_EMOTIONS.keys()))
-            emotion_data = MOCK_EMOTIONS[emotion_key].copy()
-            emotion_data["timestamp"] = datetime.utcnow().isoformat()
-            emotion_data["message"] = f"Análisis completado exitosamente (modo mockup)"
-            print(f"✅ Análisis mockup: {emotion_key} ({emotion_data['confidence']*100:.1f}%)")
-        
-        # 🆕 Obtener recomendaciones musicales
-        recommendations = get_music_recommendations(authorization, emotion_data['emotion'])
-        emotion_data['recommendations'] = recommendations
-        
-        print(f"🎵 Recomendaciones obtenidas: {len(recommendations)} tracks")
-        
-        return EmotionAnalysisResponse(**emotion_data)
-        
+        buffer = await read_raw_image(request)
+        return await analyze_buffer(buffer, authorization, "binary")
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error en análisis: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error procesando la imagen. Por favor, intenta nuevamente."
-        )
+        raise analysis_failed(e)
 
 
 @router.post("/analyze", response_model=EmotionAnalysisResponse, status_code=status.HTTP_200_OK)
@@ -314,126 +167,109 @@ async def analyze_emotion_file(
     authorization: str = Header(..., alias="Authorization")
 ):
     """
-    🎭 Análisis de emoción desde archivo de imagen (MOCKUP)
-    
+    🎭 Análisis de emoción desde archivo de imagen
+
     Alternativa para subir archivos directamente en lugar de Base64.
     """
     try:
-        # Verificar autenticación
-        if not authorization or not authorization.startswith("Bearer "):
+        require_bearer(authorization)
+
+        # Validar tipo de archivo
+        if not image.content_type or not image.content_type.startswith("image/"):
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido o ausente"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El archivo debe ser una imagen (JPEG, PNG, WebP)"
             )
-        
-        # Validar tipo de archivo
+
+        buffer = await read_upload_image(image)
+        return await analyze_buffer(buffer, authorization, "file")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise analysis_failed(e)
+
+
+async def analyze_batch_item(index: int, image: UploadFile, semaphore: asyncio.Semaphore, user_key: Optional[str]) -> BatchImageResult:
+    """Una imagen del lote; sus errores se informan en el resultado sin cortar el resto"""
+    result = BatchImageResult(index=index, filename=image.filename, success=False)
+    try:
         if not image.content_type or not image.content_type.startswith("image/"):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="El archivo debe ser una imagen (JPEG, PNG, WebP)"
             )
-        
-        # Leer contenido
-        contents = await image.read()
-        
-        # Validar que sea una imagen válida
-        try:
-            img = Image.open(io.BytesIO(contents))
-            img.verify()
-        except Exception:
+        async with semaphore:
+            buffer = await read_upload_image(image)
+            # PIL verify es CPU: fuera del event loop para validar las imágenes en paralelo
+            await asyncio.to_thread(validate_image, buffer)
+            emotion_data = await detect_emotion(buffer.data, f"batch #{index}", user_key)
+    except HTTPException as e:
+        result.error = e.detail
+        return result
+    except Exception as e:
+        print(f"❌ Error en análisis (batch #{index}): {e}")
+        result.error = "Error procesando la imagen"
+        return result
+
+    result.success = True
+    result.emotion = emotion_data['emotion']
+    result.confidence = emotion_data['confidence']
+    result.emotions_detected = emotion_data['emotions_detected']
+    result.message = emotion_data.get('message')
+    result.preprocessing = emotion_data.get('preprocessing')
+    result.cache_status = emotion_data.get('cache_status')
+    return result
+
+
+@router.post("/analyze-batch", response_model=BatchAnalysisResponse, status_code=status.HTTP_200_OK)
+async def analyze_emotion_batch(
+    images: List[UploadFile] = File(...),
+    authorization: str = Header(..., alias="Authorization")
+):
+    """
+    🎭 Análisis de emoción de varias imágenes (p. ej. fotogramas del kiosco)
+
+    Analiza hasta ANALYSIS_BATCH_MAX_IMAGES imágenes en paralelo y devuelve el
+    resultado de cada una, el vector de emociones promedio y las recomendaciones
+    para la emoción agregada.
+    """
+    try:
+        require_bearer(authorization)
+
+        if len(images) > settings.ANALYSIS_BATCH_MAX_IMAGES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Máximo {settings.ANALYSIS_BATCH_MAX_IMAGES} imágenes por petición"
+            )
+
+        semaphore = asyncio.Semaphore(max(1, settings.ANALYSIS_BATCH_CONCURRENCY))
+        user_key = token_subject(authorization)
+        results = await asyncio.gather(*[analyze_batch_item(i, image, semaphore, user_key) for i, image in enumerate(images)])
+
+        analyzed = [r for r in results if r.success]
+        if not analyzed:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Archivo de imagen corrupto o inválido"
+                detail={"message": "No se pudo analizar ninguna imagen", "errors": [r.error for r in results]}
             )
-        
-        # If AWS credentials are configured, try to use Rekognition for face/emotion detection.
-        use_aws = bool(getattr(settings, 'AWS_ACCESS_KEY_ID', None) and getattr(settings, 'AWS_SECRET_ACCESS_KEY', None))
-
-        emotion_data = None
-
-        if use_aws:
-            try:
-                result = await rekognition_service.detect_faces(contents)
-                if not result.get('success'):
-                    # Rekognition failed -> log and fallthrough to mockup
-                    raise Exception(result.get('error', 'AWS Rekognition returned an error'))
-
-                faces = result.get('faces', [])
-                if not faces:
-                    # No faces detected -> return explicit error for uploaded images
-                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No se detectaron rostros humanos en la imagen")
-
-                # Use first face for emotion analysis
-                emotions_list = faces[0].get('emotions', [])
-
-                emotions_detected = {}
-                for e in emotions_list:
-                    typ = e.get('Type') or e.get('type') or e.get('emotion')
-                    conf = e.get('Confidence') or e.get('confidence') or 0.0
-                    conf = float(conf) / 100.0
-                    key = AWS_TO_APP.get(typ.upper(), typ.lower() if isinstance(typ, str) else str(typ))
-                    if key in emotions_detected:
-                        emotions_detected[key] += conf
-                    else:
-                        emotions_detected[key] = conf
-
-                # Normalize
-                mapped_total = sum(emotions_detected.values())
-                if mapped_total > 0:
-                    for k in list(emotions_detected.keys()):
-                        emotions_detected[k] = round(emotions_detected[k] / mapped_total, 3)
-
-                if emotions_detected:
-                    app_top = max(emotions_detected, key=lambda k: emotions_detected[k])
-                    top_conf = emotions_detected[app_top]
-                else:
-                    app_top = None
-                    top_conf = 0.0
-
-                emotion_data = {
-                    'emotion': app_top,
-                    'confidence': round(top_conf, 4),
-                    'emotions_detected': emotions_detected,
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'message': 'Análisis completado exitosamente (AWS Rekognition)'
-                }
-
-                print(f"✅ Análisis Rekognition (file): {app_top} ({emotion_data['confidence']*100:.1f}%)")
-
-            except (BotoCoreError, ClientError) as be:
-                print(f"❌ AWS Rekognition error (file): {be}")
-                # Fallthrough to mockup
-            except HTTPException:
-                # Re-raise explicit HTTPExceptions (e.g., no faces detected)
-                raise
-            except Exception as e:
-                print(f"❌ Rekognition processing error (file): {e}")
-                # Fallthrough to mockup
-
-        # If we don't have emotion_data from AWS, use mockup behavior
-        if not emotion_data:
-            emotion_key = random.choice(list(MOCK_EMOTIONS.keys()))
-            emotion_data = MOCK_EMOTIONS[emotion_key].copy()
-            emotion_data["timestamp"] = datetime.utcnow().isoformat()
-            emotion_data["message"] = f"Análisis completado exitosamente (modo mockup)"
-            print(f"✅ Análisis mockup (file): {emotion_key} ({emotion_data['confidence']*100:.1f}%)")
-
-        # 🆕 Obtener recomendaciones musicales
-        recommendations = get_music_recommendations(authorization, emotion_data['emotion'])
-        emotion_data['recommendations'] = recommendations
 
+        aggregate = aggregate_emotions([r.emotions_detected for r in analyzed])
+        recommendations = await get_music_recommendations(authorization, aggregate['emotion'])
+        print(f"✅ Análisis batch: {len(analyzed)}/{len(results)} imágenes -> {aggregate['emotion']} ({aggregate['confidence']*100:.1f}%)")
         print(f"🎵 Recomendaciones obtenidas: {len(recommendations)} tracks")
 
-        return EmotionAnalysisResponse(**emotion_data)
-        
+        return BatchAnalysisResponse(
+            **aggregate,
+            analyzed=len(analyzed),
+            failed=len(results) - len(analyzed),
+            results=results,
+            timestamp=datetime.utcnow().isoformat(),
+            recommendations=recommendations
+        )
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error en análisis: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error procesando la imagen. Por favor, intenta nuevamente."
-        )
+        raise analysis_failed(e)
 
 
 @router.get("/test", status_code=status.HTTP_200_OK)
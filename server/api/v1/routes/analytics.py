@@ -1,63 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Header, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from server.db.session import get_db
+from server.db.session import get_db, SessionLocal
 from server.core.security import verify_token
 from server.db.models.user import User
 from server.db.models.session import Session as UserSession
-from server.db.models.analysis import Analysis, Emotion, Cancion, AnalisisCancion
-from sqlalchemy import func, desc, extract, and_
+from server.db.models.analysis import Analysis, Cancion, AnalisisCancion
+from sqlalchemy import and_
 from datetime import datetime, timedelta
 import traceback
 from jose import JWTError
-from pydantic import BaseModel
-from typing import Dict, List, Optional
+from typing import Optional
+from server.schemas.analytics import (
+    UserStats,
+    AnalysisHistoryResponse,
+    AnalysisDetail,
+    AnalysisBatchRequest,
+    AnalysisBatchResponse,
+    TimeSeriesResponse,
+    HeatmapResponse,
+    TransitionMatrixResponse,
+    ConfidenceStatsResponse,
+    TimelineResponse,
+)
+from server.controllers.analytics_controller import (
+    compute_user_stats,
+    fetch_history_page,
+    fetch_data_version,
+    stream_history_export,
+    fetch_analysis_details,
+    fetch_timeseries,
+    compute_heatmap,
+    compute_transition_matrix,
+    compute_confidence_stats,
+    CONFIDENCE_DEFAULT_BINS,
+    fetch_confidence_timeline,
+    TIMELINE_DEFAULT_POINTS,
+    TIMELINE_MAX_POINTS,
+    resolve_timezone,
+    local_today,
+    HISTORY_DEFAULT_LIMIT,
+    HISTORY_MAX_LIMIT,
+)
+from server.services.analytics_rollup import record_analysis, record_streak_day
+from server.services.analytics_cache import analytics_cache, get_or_compute, invalidate_user
+from server.services.stats_snapshots import stats_snapshots, refresh_snapshot
+from server.utils.responses import make_etag, etag_matches, not_modified, set_etag
+from server.services.emotion_catalog import emotion_catalog
 
 router = APIRouter(prefix="/v1/analytics", tags=["analytics"])
 
-class EmotionStats(BaseModel):
-    emotion: str
-    count: int
-    percentage: float
-
-class WeeklyActivity(BaseModel):
-    day: str
-    analyses_count: int
-
-class WeeklyEmotionData(BaseModel):
-    week_start: str
-    emotions: Dict[str, int]
-
-class UserStats(BaseModel):
-    total_analyses: int
-    most_frequent_emotion: Optional[str]
-    average_confidence: float
-    streak: int
-    emotions_distribution: List[EmotionStats]
-    weekly_activity: List[WeeklyActivity]
-    hourly_activity: List[int]
-    weekly_emotions: List[WeeklyEmotionData]
-    positive_negative_balance: Dict[str, int]
-
-class AnalysisHistory(BaseModel):
-    id: str
-    emotion: str
-    confidence: float
-    date: datetime
-    emotions_detected: Dict[str, float]
-
-class AnalysisHistoryResponse(BaseModel):
-    analyses: List[AnalysisHistory]
-    total: int
-
-class AnalysisDetail(BaseModel):
-    id: int
-    emotion: str
-    confidence: float
-    date: datetime
-    emotions_detected: Dict[str, float]
-    session_id: int
-    recommendations: List[Dict] = []  # 🆕 Agregar recomendaciones
-
 def get_current_user(authorization: str, db: Session):
     """Helper para obtener usuario actual"""
     try:
@@ -80,343 +72,337 @@ def get_current_user(authorization: str, db: Session):
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido o expirado")
 
-def ensure_emotions_exist(db: Session):
-    """Asegurar que las emociones básicas existan en la base de datos"""
-    basic_emotions = ['happy', 'sad', 'angry', 'relaxed', 'energetic']
-    
-    for emotion_name in basic_emotions:
-        existing = db.query(Emotion).filter(Emotion.nombre == emotion_name).first()
-        if not existing:
-            new_emotion = Emotion(nombre=emotion_name)
-            db.add(new_emotion)
-    
-    db.commit()
-
 @router.get("/stats", response_model=UserStats)
 def get_user_stats(
+    response: Response,
+    background_tasks: BackgroundTasks,
     authorization: str = Header(..., alias="Authorization"),
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    db: Session = Depends(get_db),
+    tz: Optional[str] = None,
+    mode: str = Query("fresh", pattern="^(fresh|swr)$")
 ):
     """
-    Obtiene estadísticas del usuario para el dashboard usando datos reales
+    Obtiene estadísticas del usuario para el dashboard usando datos reales.
+    - tz: zona horaria IANA del usuario (UTC por defecto) para días y horas
+    - mode=swr: responde enseguida con el último snapshot y, si está desactualizado,
+      lo recalcula en segundo plano (X-Stats-Stale y Age indican su antigüedad)
+    Responde 304 si el ETag del cliente sigue vigente.
     """
     user = get_current_user(authorization, db)
-    ensure_emotions_exist(db)
-    
-    # Obtener todas las sesiones del usuario
-    user_sessions = db.query(UserSession).filter(UserSession.id_usuario == user.id).all()
-    session_ids = [session.id for session in user_sessions]
-    
-    if not session_ids:
-        # Usuario sin sesiones - datos iniciales
-        return create_empty_stats()
-    
-    # Obtener análisis reales de la base de datos
-    analyses = db.query(Analysis, Emotion).join(
-        Emotion, Analysis.id_emocion == Emotion.id
-    ).filter(Analysis.id_sesion.in_(session_ids)).all()
-    
-    if not analyses:
-        return create_empty_stats()
-    
-    total_analyses = len(analyses)
-    
-    # Calcular estadísticas
-    emotion_counts = {}
-    total_confidence = 0
-    hourly_counts = [0] * 24
-    
-    for analysis, emotion in analyses:
-        emotion_name = emotion.nombre
-        emotion_counts[emotion_name] = emotion_counts.get(emotion_name, 0) + 1
-        total_confidence += analysis.confidence or 0
-        
-        # Actividad por hora
-        hour = analysis.fecha_analisis.hour if analysis.fecha_analisis else 0
-        if 0 <= hour < 24:
-            hourly_counts[hour] += 1
-    
-    most_frequent_emotion = max(emotion_counts, key=emotion_counts.get) if emotion_counts else None
-    average_confidence = total_confidence / total_analyses if total_analyses > 0 else 0
-    
-    # Distribución de emociones
-    emotions_distribution = []
-    for emotion, count in emotion_counts.items():
-        percentage = (count / total_analyses) * 100
-        emotions_distribution.append(EmotionStats(
-            emotion=emotion,
-            count=count,
-            percentage=percentage
-        ))
-    
-    # Actividad semanal (últimos 7 días)
-    weekly_activity = calculate_weekly_activity(db, session_ids)
-    
-    # Emociones por semana (últimas 8 semanas)
-    weekly_emotions = calculate_weekly_emotions(db, session_ids)
-    
-    # Balance positivo vs negativo
-    positive_negative_balance = calculate_positive_negative_balance(emotion_counts)
-    
-    # Calcular racha
-    streak = calculate_streak(db, session_ids)
-    
-    return UserStats(
-        total_analyses=total_analyses,
-        most_frequent_emotion=most_frequent_emotion,
-        average_confidence=average_confidence,
-        streak=streak,
-        emotions_distribution=emotions_distribution,
-        weekly_activity=weekly_activity,
-        hourly_activity=hourly_counts,
-        weekly_emotions=weekly_emotions,
-        positive_negative_balance=positive_negative_balance
-    )
+    zone = resolve_timezone(tz)
+    today = local_today(zone)
+
+    # La clave incluye zona y día: la semana actual y la racha dependen de "hoy"
+    cache_key = f"stats:{zone.key}:{today.isoformat()}"
+    data_version = fetch_data_version(db, user.id)
+
+    def compute(session: Session) -> dict:
+        return compute_user_stats(session, user.id, today, zone).model_dump(mode="json")
+
+    snapshot = stats_snapshots.get(user.id, cache_key) if mode == "swr" else None
+    if snapshot is not None:
+        stale = snapshot.data_version != data_version
+        if stale:
+            stats_snapshots.mark_served_stale()
+            if stats_snapshots.begin_refresh(user.id, cache_key):
+                background_tasks.add_task(refresh_snapshot, stats_snapshots, SessionLocal, user.id, cache_key, compute)
+
+        # El ETag describe el snapshot servido, no los datos actuales
+        etag = make_etag(user.id, *snapshot.data_version, cache_key)
+        staleness = {"X-Stats-Stale": "1" if stale else "0", "Age": str(int(stats_snapshots.age(snapshot)))}
+        if etag_matches(if_none_match, etag):
+            not_modified_response = not_modified(etag)
+            not_modified_response.headers.update(staleness)
+            return not_modified_response
+        set_etag(response, etag)
+        response.headers.update(staleness)
+        return UserStats(**snapshot.data)
+
+    etag = make_etag(user.id, *data_version, cache_key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    response.headers["X-Stats-Stale"] = "0"
+
+    data = get_or_compute(analytics_cache, user.id, cache_key, lambda: compute(db))
+    stats_snapshots.put(user.id, cache_key, data, data_version)
+    return UserStats(**data)
 
 @router.get("/analysis/{analysis_id}", response_model=AnalysisDetail)
 def get_analysis_details(
     analysis_id: int,
+    response: Response,
     authorization: str = Header(..., alias="Authorization"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
     db: Session = Depends(get_db)
 ):
     """
     Obtiene los detalles de un análisis específico con sus recomendaciones guardadas
     """
     user = get_current_user(authorization, db)
+
+    etag = make_etag(user.id, *fetch_data_version(db, user.id), f"analysis:{analysis_id}")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     
-    # Obtener sesiones del usuario
-    user_sessions = db.query(UserSession).filter(UserSession.id_usuario == user.id).all()
-    session_ids = [session.id for session in user_sessions]
-    
-    if not session_ids:
-        raise HTTPException(
-            status_code=404,
-            detail="No se encontraron sesiones para este usuario"
-        )
-    
-    # Obtener el análisis específico
-    analysis_result = db.query(Analysis, Emotion).join(
-        Emotion, Analysis.id_emocion == Emotion.id
-    ).filter(
-        and_(
-            Analysis.id == analysis_id,
-            Analysis.id_sesion.in_(session_ids)
-        )
-    ).first()
-    
-    if not analysis_result:
+    # Obtener el análisis (solo si pertenece al usuario) junto con sus canciones
+    details = fetch_analysis_details(db, user.id, [analysis_id])
+    if not details:
         raise HTTPException(
             status_code=404,
             detail="Análisis no encontrado"
         )
-    
-    analysis, emotion = analysis_result
-    
-    # Obtener canciones vinculadas al análisis (si existen)
-    try:
-        songs = db.query(Cancion).join(AnalisisCancion, Cancion.id == AnalisisCancion.ID_cancion).filter(
-            AnalisisCancion.ID_analisis == analysis.id
-        ).all()
-
-        recommendations = []
-        for s in songs:
-            if s.track_raw:
-                recommendations.append(s.track_raw)
-            else:
-                recommendations.append({
-                    'id': s.spotify_id,
-                    'name': s.titulo,
-                    'artists': s.artists,
-                    'album': s.album_data or {'name': s.album},
-                    'external_urls': {'spotify': s.external_url} if s.external_url else None,
-                    'uri': s.uri,
-                    'preview_url': s.preview_url,
-                    'duration_ms': s.duration_ms,
-                    'popularity': s.popularity
-                })
-    except Exception as e:
-        print(f"❌ Error cargando canciones vinculadas: {e}")
-        recommendations = analysis.recommendations or []
-
-    return AnalysisDetail(
-        id=analysis.id,
-        emotion=emotion.nombre,
-        confidence=analysis.confidence or 0.0,
-        date=analysis.fecha_analisis,
-        emotions_detected=analysis.emotions_detected or {},
-        session_id=analysis.id_sesion,
-        recommendations=recommendations
-    )
 
-def create_empty_stats():
-    """Crear estadísticas vacías para usuarios nuevos"""
-    return UserStats(
-        total_analyses=0,
-        most_frequent_emotion=None,
-        average_confidence=0.0,
-        streak=0,
-        emotions_distribution=[],
-        weekly_activity=[WeeklyActivity(day=day, analyses_count=0) for day in ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]],
-        hourly_activity=[0] * 24,
-        weekly_emotions=[],
-        positive_negative_balance={"positive": 0, "negative": 0}
-    )
+    return details[0]
 
-def calculate_weekly_activity(db: Session, session_ids: List[int]) -> List[WeeklyActivity]:
-    """Calcular actividad de los últimos 7 días"""
-    today = datetime.now().date()
-    week_start = today - timedelta(days=today.weekday())  # Lunes de esta semana
-    
-    daily_counts = {}
-    days = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
-    
-    # Inicializar contadores
-    for i, day in enumerate(days):
-        daily_counts[i] = 0
-    
-    # Obtener análisis de la semana actual
-    week_end = week_start + timedelta(days=6)
-    analyses = db.query(Analysis).filter(
-        and_(
-            Analysis.id_sesion.in_(session_ids),
-            Analysis.fecha_analisis >= week_start,
-            Analysis.fecha_analisis <= week_end + timedelta(days=1)
-        )
-    ).all()
-    
-    # Contar por día de la semana
-    for analysis in analyses:
-        weekday = analysis.fecha_analisis.weekday()  # 0=Lunes, 6=Domingo
-        if 0 <= weekday <= 6:
-            daily_counts[weekday] += 1
-    
-    return [WeeklyActivity(day=days[i], analyses_count=daily_counts[i]) for i in range(7)]
+@router.post("/analysis/batch", response_model=AnalysisBatchResponse)
+def get_analysis_details_batch(
+    request: AnalysisBatchRequest,
+    authorization: str = Header(..., alias="Authorization"),
+    db: Session = Depends(get_db)
+):
+    """
+    Obtiene los detalles de varios análisis (hasta 50) en una sola petición
+    """
+    user = get_current_user(authorization, db)
 
-def calculate_weekly_emotions(db: Session, session_ids: List[int]) -> List[WeeklyEmotionData]:
-    """Calcular emociones por semana (últimas 8 semanas)"""
-    today = datetime.now().date()
-    weeks_data = []
-    
-    for week_offset in range(7, -1, -1):  # Últimas 8 semanas
-        week_start = today - timedelta(days=today.weekday() + (week_offset * 7))
-        week_end = week_start + timedelta(days=6)
-        
-        # Obtener análisis de esta semana
-        analyses = db.query(Analysis, Emotion).join(
-            Emotion, Analysis.id_emocion == Emotion.id
-        ).filter(
-            and_(
-                Analysis.id_sesion.in_(session_ids),
-                Analysis.fecha_analisis >= week_start,
-                Analysis.fecha_analisis <= week_end + timedelta(days=1)
-            )
-        ).all()
-        
-        emotion_counts = {}
-        for analysis, emotion in analyses:
-            emotion_name = emotion.nombre
-            emotion_counts[emotion_name] = emotion_counts.get(emotion_name, 0) + 1
-        
-        weeks_data.append(WeeklyEmotionData(
-            week_start=week_start.strftime("%Y-%m-%d"),
-            emotions=emotion_counts
-        ))
-    
-    return weeks_data
+    details = fetch_analysis_details(db, user.id, request.ids)
+    found = {detail.id for detail in details}
 
-def calculate_positive_negative_balance(emotion_counts: Dict[str, int]) -> Dict[str, int]:
-    """Calcular balance de emociones positivas vs negativas"""
-    positive_emotions = ['happy', 'energetic', 'relaxed']
-    negative_emotions = ['sad', 'angry']
-    
-    positive_count = sum(emotion_counts.get(emotion, 0) for emotion in positive_emotions)
-    negative_count = sum(emotion_counts.get(emotion, 0) for emotion in negative_emotions)
-    
-    return {
-        "positive": positive_count,
-        "negative": negative_count
-    }
-
-def calculate_streak(db: Session, session_ids: List[int]) -> int:
-    """Calcular racha de días consecutivos con análisis"""
-    if not session_ids:
-        return 0
-    
-    # Obtener fechas únicas de análisis, ordenadas descendentemente
-    dates_query = db.query(
-        func.date(Analysis.fecha_analisis).label('analysis_date')
-    ).filter(
-        Analysis.id_sesion.in_(session_ids)
-    ).distinct().order_by(
-        func.date(Analysis.fecha_analisis).desc()
-    ).all()
-    
-    if not dates_query:
-        return 0
-    
-    dates = [row.analysis_date for row in dates_query]
-    today = datetime.now().date()
-    
-    streak = 0
-    current_date = today
-    
-    for analysis_date in dates:
-        if analysis_date == current_date:
-            streak += 1
-            current_date -= timedelta(days=1)
-        elif analysis_date == current_date + timedelta(days=1):
-            # Si hay un gap de un día, podemos continuar
-            streak += 1
-            current_date = analysis_date - timedelta(days=1)
-        else:
-            break
-    
-    return streak
+    return AnalysisBatchResponse(
+        analyses=details,
+        missing=[analysis_id for analysis_id in dict.fromkeys(request.ids) if analysis_id not in found]
+    )
 
 @router.get("/history", response_model=AnalysisHistoryResponse)
 def get_user_history(
+    response: Response,
     authorization: str = Header(..., alias="Authorization"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
     db: Session = Depends(get_db),
-    emotion_filter: Optional[str] = None
+    emotion_filter: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(HISTORY_DEFAULT_LIMIT, ge=1, le=HISTORY_MAX_LIMIT),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    count: str = Query("exact", pattern="^(exact|estimated|none)$"),
+    tz: Optional[str] = None
 ):
     """
-    Obtiene el historial de análisis del usuario usando datos reales
+    Obtiene el historial de análisis del usuario, paginado por cursor.
+    - from / to: rango de fechas (from inclusivo, to exclusivo)
+    - tz: zona horaria IANA en la que se interpretan from / to sin zona (UTC por defecto)
+    - cursor: valor next_cursor de la respuesta anterior
+    - count: exact, estimated (desde el resumen diario) o none
     """
     user = get_current_user(authorization, db)
-    
-    # Obtener sesiones del usuario
-    user_sessions = db.query(UserSession).filter(UserSession.id_usuario == user.id).all()
-    session_ids = [session.id for session in user_sessions]
-    
-    if not session_ids:
-        return AnalysisHistoryResponse(analyses=[], total=0)
-    
-    # Query base
-    query = db.query(Analysis, Emotion).join(
-        Emotion, Analysis.id_emocion == Emotion.id
-    ).filter(Analysis.id_sesion.in_(session_ids))
-    
-    # Filtrar por emoción si s      e especifica
-    if emotion_filter and emotion_filter != 'all':
-        query = query.filter(Emotion.nombre == emotion_filter)
-    
-    # Obtener resultados ordenados por fecha
-    results = query.order_by(Analysis.fecha_analisis.desc()).all()
-    
-    # Convertir a formato de respuesta
-    analyses = []
-    for analysis, emotion in results:
-        analyses.append(AnalysisHistory(
-            id=str(analysis.id),
-            emotion=emotion.nombre,
-            confidence=analysis.confidence or 0.0,
-            date=analysis.fecha_analisis,
-            emotions_detected=analysis.emotions_detected or {}
-        ))
-    
-    return AnalysisHistoryResponse(
-        analyses=analyses,
-        total=len(analyses)
+    zone = resolve_timezone(tz)
+
+    etag = make_etag(user.id, *fetch_data_version(db, user.id), "history")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    return fetch_history_page(
+        db,
+        user.id,
+        limit=limit,
+        cursor=cursor,
+        date_from=date_from,
+        date_to=date_to,
+        emotion=emotion_filter,
+        count_mode=count,
+        zone=zone,
+    )
+
+@router.get("/timeseries", response_model=TimeSeriesResponse)
+def get_user_timeseries(
+    response: Response,
+    authorization: str = Header(..., alias="Authorization"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    db: Session = Depends(get_db),
+    granularity: str = Query("day", pattern="^(hour|day|week|month)$"),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    emotion: Optional[str] = None,
+    tz: Optional[str] = None
+):
+    """
+    Serie temporal de análisis por emoción.
+    - granularity: hour, day, week o month
+    - from / to: rango (from inclusivo, to exclusivo); por defecto los últimos buckets hasta hoy
+    - emotion: limita la serie a una emoción
+    - tz: zona horaria IANA de los buckets (UTC por defecto)
+    Los buckets sin análisis se devuelven con 0.
+    """
+    user = get_current_user(authorization, db)
+    zone = resolve_timezone(tz)
+
+    cache_key = f"timeseries:{granularity}:{zone.key}:{date_from}:{date_to}:{emotion}"
+    if date_to is None:
+        # Sin "to" el rango depende de la fecha actual
+        cache_key += f":{local_today(zone).isoformat()}"
+        if granularity == "hour":
+            cache_key += f"T{datetime.now(zone).hour:02d}"
+    etag = make_etag(user.id, *fetch_data_version(db, user.id), cache_key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    data = get_or_compute(
+        analytics_cache,
+        user.id,
+        cache_key,
+        lambda: fetch_timeseries(db, user.id, granularity, date_from, date_to, emotion, zone).model_dump(mode="json")
+    )
+    return TimeSeriesResponse(**data)
+
+@router.get("/heatmap", response_model=HeatmapResponse)
+def get_user_heatmap(
+    response: Response,
+    authorization: str = Header(..., alias="Authorization"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    db: Session = Depends(get_db),
+    tz: Optional[str] = None
+):
+    """
+    Mapa de calor día de la semana × hora (7×24) por emoción.
+    - tz: zona horaria IANA del usuario (UTC por defecto)
+    """
+    user = get_current_user(authorization, db)
+    zone = resolve_timezone(tz)
+
+    cache_key = f"heatmap:{zone.key}"
+    etag = make_etag(user.id, *fetch_data_version(db, user.id), cache_key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    data = get_or_compute(
+        analytics_cache,
+        user.id,
+        cache_key,
+        lambda: compute_heatmap(db, user.id, zone).model_dump(mode="json")
+    )
+    return HeatmapResponse(**data)
+
+@router.get("/transitions", response_model=TransitionMatrixResponse)
+def get_user_transitions(
+    response: Response,
+    authorization: str = Header(..., alias="Authorization"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    db: Session = Depends(get_db),
+    scope: str = Query("all", pattern="^(all|session|day)$"),
+    max_gap_minutes: Optional[int] = Query(None, ge=1),
+    tz: Optional[str] = None
+):
+    """
+    Matriz de transiciones entre emociones de análisis consecutivos.
+    - scope: all (todo el historial), session (solo dentro de cada sesión) o day (dentro de cada día local)
+    - max_gap_minutes: ignora pares separados por más minutos
+    - tz: zona horaria IANA del usuario (UTC por defecto)
+    """
+    user = get_current_user(authorization, db)
+    zone = resolve_timezone(tz)
+
+    cache_key = f"transitions:{scope}:{max_gap_minutes}:{zone.key}"
+    etag = make_etag(user.id, *fetch_data_version(db, user.id), cache_key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    data = get_or_compute(
+        analytics_cache,
+        user.id,
+        cache_key,
+        lambda: compute_transition_matrix(db, user.id, scope, max_gap_minutes, zone).model_dump(mode="json")
+    )
+    return TransitionMatrixResponse(**data)
+
+@router.get("/confidence", response_model=ConfidenceStatsResponse)
+def get_user_confidence_stats(
+    response: Response,
+    authorization: str = Header(..., alias="Authorization"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    db: Session = Depends(get_db),
+    bins: int = Query(CONFIDENCE_DEFAULT_BINS, ge=2, le=50)
+):
+    """
+    Histograma y percentiles (p10/p50/p90) de confidence por emoción, junto con el
+    promedio de cada componente de emotions_detected. Sirve para detectar análisis de baja calidad.
+    """
+    user = get_current_user(authorization, db)
+
+    cache_key = f"confidence:{bins}"
+    etag = make_etag(user.id, *fetch_data_version(db, user.id), cache_key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    data = get_or_compute(
+        analytics_cache,
+        user.id,
+        cache_key,
+        lambda: compute_confidence_stats(db, user.id, bins).model_dump(mode="json")
+    )
+    return ConfidenceStatsResponse(**data)
+
+@router.get("/timeline", response_model=TimelineResponse)
+def get_user_confidence_timeline(
+    response: Response,
+    authorization: str = Header(..., alias="Authorization"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    db: Session = Depends(get_db),
+    points: int = Query(TIMELINE_DEFAULT_POINTS, ge=3, le=TIMELINE_MAX_POINTS),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    emotion: Optional[str] = None,
+    tz: Optional[str] = None
+):
+    """
+    Confidence de cada análisis a lo largo del tiempo, reducida en el servidor a
+    `points` puntos (LTTB) para que el tamaño de la respuesta no dependa del historial.
+    - tz: zona horaria IANA del usuario (UTC por defecto); from/to sin zona se interpretan en ella
+    """
+    user = get_current_user(authorization, db)
+    zone = resolve_timezone(tz)
+
+    cache_key = f"timeline:{points}:{date_from}:{date_to}:{emotion}:{zone.key}"
+    etag = make_etag(user.id, *fetch_data_version(db, user.id), cache_key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    data = get_or_compute(
+        analytics_cache,
+        user.id,
+        cache_key,
+        lambda: fetch_confidence_timeline(db, user.id, points, date_from, date_to, emotion, zone).model_dump(mode="json")
+    )
+    return TimelineResponse(**data)
+
+@router.get("/export")
+def export_user_history(
+    authorization: str = Header(..., alias="Authorization"),
+    db: Session = Depends(get_db),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    include_songs: bool = False
+):
+    """
+    Exporta el historial completo del usuario en NDJSON o CSV.
+    La respuesta se envía en streaming, lote a lote, sin cargar todo el historial en memoria.
+    """
+    user = get_current_user(authorization, db)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv; charset=utf-8"
+    filename = f"anima_historial_{user.id}.{format}"
+
+    return StreamingResponse(
+        stream_history_export(SessionLocal, user.id, format, include_songs),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
 @router.post("/save-analysis")
@@ -430,7 +416,6 @@ def save_analysis_result(
     🆕 Ahora incluye las recomendaciones musicales
     """
     user = get_current_user(authorization, db)
-    ensure_emotions_exist(db)
     
     try:
         # Obtener la sesión activa más reciente del usuario
@@ -449,22 +434,16 @@ def save_analysis_result(
             db.commit()
             db.refresh(latest_session)
         
-        # Obtener o crear la emoción
+        # Obtener o crear la emoción (desde el catálogo en memoria)
         emotion_name = analysis_data.get("emotion")
-        emotion = db.query(Emotion).filter(Emotion.nombre == emotion_name).first()
-        
-        if not emotion:
-            emotion = Emotion(nombre=emotion_name)
-            db.add(emotion)
-            db.commit()
-            db.refresh(emotion)
+        emotion_id = emotion_catalog.get_or_create_id(db, emotion_name)
         
         # Verificar si ya existe un análisis muy reciente (últimos 30 segundos)
         now = datetime.utcnow()
         recent_analysis = db.query(Analysis).filter(
             and_(
                 Analysis.id_sesion == latest_session.id,
-                Analysis.id_emocion == emotion.id,
+                Analysis.id_emocion == emotion_id,
                 Analysis.fecha_analisis >= now - timedelta(seconds=30)
             )
         ).first()
@@ -476,7 +455,8 @@ def save_analysis_result(
         # 🆕 Crear nuevo registro de análisis con recomendaciones
         new_analysis = Analysis(
             id_sesion=latest_session.id,
-            id_emocion=emotion.id,
+            id_usuario=user.id,
+            id_emocion=emotion_id,
             fecha_analisis=now,
             confidence=analysis_data.get("confidence", 0.0),
             emotions_detected=analysis_data.get("emotions_detected", {}),
@@ -484,80 +464,82 @@ def save_analysis_result(
         )
         
         db.add(new_analysis)
-        db.commit()
-        db.refresh(new_analysis)
-
-        print(f"✅ Análisis guardado en BD para usuario {user.id}: {emotion_name}")
+        # Actualizar el resumen diario y la racha en la misma transacción que el análisis
+        record_analysis(db, user.id, new_analysis)
+        record_streak_day(db, user.id, now.date())
+        db.flush()
 
-        # Persistir las canciones recomendadas en la tabla cancion y la relación analisis_cancion
+        # Persistir las canciones recomendadas en la tabla cancion y la relación analisis_cancion.
+        # Van en la misma transacción: el análisis (y su nueva versión/ETag) solo se ve con sus canciones
         recommendations = analysis_data.get('recommendations', []) or []
         saved_count = 0
         errors = []
 
         for track in recommendations:
+            spotify_id = None
             try:
-                spotify_id = track.get('id') if isinstance(track, dict) else None
-                # Fallback: extract id from uri if needed
-                if not spotify_id and isinstance(track, dict) and track.get('uri'):
-                    parts = track.get('uri').split(":")
-                    spotify_id = parts[-1] if parts else None
-
-                # Try to find existing song by spotify_id
-                song = None
-                if spotify_id:
-                    song = db.query(Cancion).filter(Cancion.spotify_id == spotify_id).first()
-
-                # If not found, try by external url
-                if not song and isinstance(track, dict):
-                    ext = None
-                    if track.get('external_urls') and isinstance(track.get('external_urls'), dict):
-                        ext = track.get('external_urls').get('spotify')
-                    if ext:
-                        song = db.query(Cancion).filter(Cancion.external_url == ext).first()
-
-                # Create song if not exists
-                if not song:
-                    titulo = track.get('name') if isinstance(track, dict) else None
-                    artists_list = track.get('artists') if isinstance(track, dict) else None
-                    artista = None
-                    if isinstance(artists_list, list):
-                        artista = ', '.join([a.get('name') for a in artists_list if a.get('name')])
-                    album_info = track.get('album') if isinstance(track, dict) else None
-                    album_name = album_info.get('name') if isinstance(album_info, dict) else None
-
-                    song = Cancion(
-                        titulo=titulo or 'Sin título',
-                        artista=artista,
-                        album=album_name,
-                        spotify_id=spotify_id,
-                        uri=track.get('uri') if isinstance(track, dict) else None,
-                        external_url=(track.get('external_urls') or {}).get('spotify') if isinstance(track, dict) and track.get('external_urls') else None,
-                        preview_url=track.get('preview_url') if isinstance(track, dict) else None,
-                        duration_ms=track.get('duration_ms') if isinstance(track, dict) else None,
-                        popularity=track.get('popularity') if isinstance(track, dict) else None,
-                        album_data=album_info if isinstance(album_info, dict) else None,
-                        artists=artists_list if isinstance(artists_list, list) else None,
-                        track_raw=track if isinstance(track, dict) else None
-                    )
-                    db.add(song)
-                    db.commit()
-                    db.refresh(song)
-
-                # Link analysis <-> song if not already linked
-                existing_link = db.query(AnalisisCancion).filter(
-                    AnalisisCancion.ID_analisis == new_analysis.id,
-                    AnalisisCancion.ID_cancion == song.id
-                ).first()
-
-                if not existing_link:
-                    link = AnalisisCancion(ID_analisis=new_analysis.id, ID_cancion=song.id)
-                    db.add(link)
-                    db.commit()
+                # Savepoint por canción: si una falla, solo se deshace esa
+                with db.begin_nested():
+                    spotify_id = track.get('id') if isinstance(track, dict) else None
+                    # Fallback: extract id from uri if needed
+                    if not spotify_id and isinstance(track, dict) and track.get('uri'):
+                        parts = track.get('uri').split(":")
+                        spotify_id = parts[-1] if parts else None
+
+                    # Try to find existing song by spotify_id
+                    song = None
+                    if spotify_id:
+                        song = db.query(Cancion).filter(Cancion.spotify_id == spotify_id).first()
+
+                    # If not found, try by external url
+                    if not song and isinstance(track, dict):
+                        ext = None
+                        if track.get('external_urls') and isinstance(track.get('external_urls'), dict):
+                            ext = track.get('external_urls').get('spotify')
+                        if ext:
+                            song = db.query(Cancion).filter(Cancion.external_url == ext).first()
+
+                    # Create song if not exists
+                    if not song:
+                        titulo = track.get('name') if isinstance(track, dict) else None
+                        artists_list = track.get('artists') if isinstance(track, dict) else None
+                        artista = None
+                        if isinstance(artists_list, list):
+                            artista = ', '.join([a.get('name') for a in artists_list if a.get('name')])
+                        album_info = track.get('album') if isinstance(track, dict) else None
+                        album_name = album_info.get('name') if isinstance(album_info, dict) else None
+
+                        song = Cancion(
+                            titulo=titulo or 'Sin título',
+                            artista=artista,
+                            album=album_name,
+                            spotify_id=spotify_id,
+                            uri=track.get('uri') if isinstance(track, dict) else None,
+                            external_url=(track.get('external_urls') or {}).get('spotify') if isinstance(track, dict) and track.get('external_urls') else None,
+                            preview_url=track.get('preview_url') if isinstance(track, dict) else None,
+                            duration_ms=track.get('duration_ms') if isinstance(track, dict) else None,
+                            popularity=track.get('popularity') if isinstance(track, dict) else None,
+                            album_data=album_info if isinstance(album_info, dict) else None,
+                            artists=artists_list if isinstance(artists_list, list) else None,
+                            track_raw=track if isinstance(track, dict) else None
+                        )
+                        db.add(song)
+                        db.flush()
+
+                    # Link analysis <-> song if not already linked
+                    existing_link = db.query(AnalisisCancion).filter(
+                        AnalisisCancion.ID_analisis == new_analysis.id,
+                        AnalisisCancion.ID_cancion == song.id
+                    ).first()
+
+                    if not existing_link:
+                        link = AnalisisCancion(ID_analisis=new_analysis.id, ID_cancion=song.id)
+                        db.add(link)
+                        db.flush()
 
                 saved_count += 1
             except Exception as e:
                 # No queremos romper el guardado del análisis si una canción falla
-                db.rollback()
                 tb = traceback.format_exc()
                 print(f"❌ Error guardando canción recomendada: {e}\n{tb}")
                 errors.append({
@@ -566,6 +548,10 @@ def save_analysis_result(
                     'trace': tb
                 })
 
+        db.commit()
+        invalidate_user(analytics_cache, user.id)
+
+        print(f"✅ Análisis guardado en BD para usuario {user.id}: {emotion_name}")
         print(f"🎵 Recomendaciones procesadas y vinculadas: {saved_count} / {len(recommendations)}")
 
         return {
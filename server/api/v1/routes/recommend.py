@@ -1,10 +1,8 @@
 from fastapi import APIRouter, Depends, Query, Header, HTTPException, Request
 from server.controllers.recommend_controller import recommend_songs_by_emotion
 import requests
-import json
-import os
-import random
 from server.core.security import verify_token
+from server.services.recommendations import EMOTION_TRACK_FILTERS, load_mock_data, mockup_tracks
 
 router = APIRouter(prefix="/recommend", tags=["recommendations"])
 
@@ -85,47 +83,6 @@ def test_spotify_connection(access_token: str = Query(...)):
 # 🎵 ENDPOINTS MOCKUP
 # ============================================
 
-def load_mock_data():
-    """Cargar datos mockup desde el JSON"""
-    json_path = os.path.join(os.path.dirname(__file__), '../../../../recomendacionesSpotify.json')
-    
-    try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data
-    except FileNotFoundError:
-        return generate_fallback_data()
-
-def generate_fallback_data():
-    """Datos de respaldo si no se encuentra el JSON"""
-    return {
-        "tracks": [
-            {
-                "name": "Happy Song",
-                "artists": [{"name": "Artist Name"}],
-                "album": {
-                    "name": "Album Name",
-                    "images": [{"url": "https://via.placeholder.com/300"}]
-                },
-                "external_urls": {"spotify": "https://open.spotify.com"},
-                "duration_ms": 180000,
-                "popularity": 75
-            }
-        ] * 10,
-        "emotion": "happy",
-        "total_tracks": 10,
-        "search_method": "fallback"
-    }
-
-# Mapeo de emociones a diferentes conjuntos de canciones
-EMOTION_TRACK_FILTERS = {
-    "happy": lambda tracks: tracks[:30],
-    "sad": lambda tracks: tracks[:30],
-    "angry": lambda tracks: tracks[:30],
-    "relaxed": lambda tracks: tracks[:30],
-    "energetic": lambda tracks: tracks[:30]
-}
-
 @router.get("/mockup")
 def get_mockup_recommendations(emotion: str = Query(...)):
     """
@@ -136,27 +93,18 @@ def get_mockup_recommendations(emotion: str = Query(...)):
     """
     emotion = emotion.lower()
     
-    if emotion not in EMOTION_TRACK_FILTERS:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Emoción inválida. Opciones: {', '.join(EMOTION_TRACK_FILTERS.keys())}"
-        )
-    
-    # Cargar datos
-    mock_data = load_mock_data()
-    all_tracks = mock_data.get("tracks", [])
+    try:
+        # Filtro según emoción, aleatorizado
+        selected_tracks = mockup_tracks(emotion)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    if not all_tracks:
+    if not selected_tracks:
         raise HTTPException(
             status_code=500,
             detail="No se pudieron cargar las canciones mockup"
         )
     
-    # Aplicar filtro según emoción y aleatorizar
-    random.shuffle(all_tracks)
-    filter_func = EMOTION_TRACK_FILTERS[emotion]
-    selected_tracks = filter_func(all_tracks)
-    
     return {
         "tracks": selected_tracks,
         "emotion": emotion,
@@ -8,7 +8,12 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from server.db.database import init_database
 from server.api import router as api_router
 from server.db.models.user import Base
-from server.db.session import engine
+from server.db.session import engine, SessionLocal
+from server.services.emotion_catalog import emotion_catalog
+from server.services.global_analytics import GlobalAnalyticsScheduler
+from server.services.image_preprocessing import image_preprocessor
+from server.services.aws_rekognition_service import rekognition_service
+from server.core.config import settings
 from server.controllers import rekognition_controller
 from server.middlewares.error_handler import (
     http_exception_handler,
@@ -20,10 +25,22 @@ from server.middlewares.error_handler import (
 async def lifespan(app: FastAPI):
     # ✅ Inicializar base de datos desde schema.sql al arrancar la app
     init_database()
+    # Cargar el catálogo de emociones una sola vez (crea las básicas si faltan)
+    db = SessionLocal()
+    try:
+        emotion_catalog.load(db)
+    finally:
+        db.close()
+    # Job incremental de las analíticas globales (GLOBAL_ANALYTICS_REFRESH_SECONDS=0 lo desactiva)
+    scheduler = GlobalAnalyticsScheduler(SessionLocal, settings.GLOBAL_ANALYTICS_REFRESH_SECONDS)
+    scheduler.start()
     # Si prefieres usar SQLAlchemy ORM en lugar de SQL:
     # Base.metadata.drop_all(bind=engine)
     # Base.metadata.create_all(bind=engine)
     yield
+    await scheduler.stop()
+    image_preprocessor.shutdown()
+    rekognition_service.shutdown()
 
 
 # Crear la app FastAPI con el ciclo de vida personalizado
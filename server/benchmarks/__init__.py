@@ -0,0 +1,10 @@
+"""
+Benchmarks de las analíticas sobre una población sintética.
+
+    python -m server.benchmarks run --database-url sqlite:///bench.db --sizes 1000 10000 100000 --output bench.json
+    python -m server.benchmarks compare baseline.json bench.json --threshold 0.2
+
+`run` crea usuarios nuevos (no borra nada) con N análisis cada uno y mide los
+endpoints a través de la app. `compare` sale con código 1 si alguna mediana
+empeora más que el umbral.
+"""
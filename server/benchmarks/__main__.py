@@ -0,0 +1,50 @@
+import argparse
+from typing import List, Optional
+from server.benchmarks.runner import (
+    DEFAULT_REPEAT,
+    DEFAULT_SIZES,
+    compare_results,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de analíticas con datos sintéticos")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Sembrar datos sintéticos y medir los endpoints")
+    run.add_argument("--database-url", required=True, help="Base de datos de pruebas (sqlite:///bench.db o postgresql://...)")
+    run.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Análisis por usuario")
+    run.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--output", default="bench_results.json")
+
+    compare = commands.add_parser("compare", help="Comparar dos archivos de resultados")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.2, help="Empeoramiento tolerado (0.2 = 20 %%)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run_benchmarks(args.database_url, args.sizes, args.repeat, args.seed)
+        save_results(results, args.output)
+        print(f"✅ Resultados guardados en {args.output}")
+        return 0
+
+    rows = compare_results(load_results(args.baseline), load_results(args.current), args.threshold)
+    for row in rows:
+        mark = "❌" if row['regression'] else "✅"
+        print(
+            f"{mark} {row['size']:>7} {row['endpoint']:<24} "
+            f"{row['baseline_ms']:>10.2f} ms -> {row['current_ms']:>10.2f} ms ({row['change']:+.1%})"
+        )
+    regressions = sum(row['regression'] for row in rows)
+    print(f"{'⚠️' if regressions else '✅'} Regresiones: {regressions}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
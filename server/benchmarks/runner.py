@@ -0,0 +1,199 @@
+"""
+Mide los endpoints de analíticas sobre usuarios sintéticos de distintos tamaños
+y compara resultados guardados en JSON.
+"""
+import json
+import platform
+import random
+import statistics
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from server.app.main import app
+from server.benchmarks.synthetic import seed_song_pool, seed_user, BENCH_PASSWORD
+from server.core.security import create_access_token, hash_password
+from server.db.base import Base
+from server.db.models.analysis import Analysis
+from server.db.models.session import Session as UserSession
+from server.db.session import get_db
+from server.services.analytics_cache import analytics_cache, invalidate_user
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_REPEAT = 5
+SONG_POOL_SIZE = 500
+SAMPLE_TRACKS = [
+    {
+        'id': f"benchtrack{i:02d}",
+        'name': f"Bench {i}",
+        'uri': f"spotify:track:benchtrack{i:02d}",
+        'artists': [{'name': 'Bench'}],
+        'album': {'name': 'Bench'},
+        'external_urls': {'spotify': f"https://open.spotify.com/track/benchtrack{i:02d}"},
+    }
+    for i in range(3)
+]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Milisegundos: mínimo, mediana, p95 y promedio"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'min_ms': round(ordered[0], 3),
+        'median_ms': round(statistics.median(ordered), 3),
+        'p95_ms': round(p95, 3),
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'runs': len(ordered),
+    }
+
+
+def time_call(call: Callable[[], object], repeat: int, before: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        response = call()
+        samples.append((time.perf_counter() - start) * 1000)
+        if getattr(response, "status_code", 200) >= 400:
+            raise RuntimeError(f"El endpoint respondió {response.status_code}: {response.text[:200]}")
+    return summarize(samples)
+
+
+def run_benchmarks(
+    database_url: str,
+    sizes=DEFAULT_SIZES,
+    repeat: int = DEFAULT_REPEAT,
+    seed: int = 42,
+) -> Dict:
+    """
+    Siembra un usuario por tamaño (análisis por usuario) y mide cada endpoint `repeat` veces.
+    stats_cold invalida el caché de analíticas antes de cada llamada; stats_warm no.
+    """
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    BenchSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    rng = random.Random(seed)
+
+    def override_get_db():
+        db = BenchSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+    db = BenchSession()
+    results: Dict[str, Dict] = {}
+    try:
+        song_ids = seed_song_pool(db, SONG_POOL_SIZE, rng)
+        password_hash = hash_password(BENCH_PASSWORD)
+
+        for size in sizes:
+            seed_started = time.perf_counter()
+            user = seed_user(db, size, song_ids, rng, password_hash=password_hash)
+            seed_seconds = time.perf_counter() - seed_started
+
+            user_id = user.id
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}
+            analysis_ids = list(db.scalars(select(Analysis.id).where(Analysis.id_usuario == user_id)))
+            sample_ids = rng.sample(analysis_ids, min(repeat, len(analysis_ids)))
+            batch_ids = rng.sample(analysis_ids, min(50, len(analysis_ids)))
+            detail_ids = iter(sample_ids * 2)
+
+            def new_session():
+                # save-analysis ignora duplicados recientes de la misma sesión
+                db.add(UserSession(id_usuario=user_id, fecha_inicio=datetime.utcnow()))
+                db.commit()
+
+            results[str(size)] = {
+                'seed_seconds': round(seed_seconds, 3),
+                'stats_cold': time_call(
+                    lambda: client.get("/v1/analytics/stats", headers=headers),
+                    repeat,
+                    before=lambda: invalidate_user(analytics_cache, user_id),
+                ),
+                'stats_warm': time_call(lambda: client.get("/v1/analytics/stats", headers=headers), repeat),
+                'history_first_page': time_call(
+                    lambda: client.get("/v1/analytics/history", params={"limit": 50}, headers=headers),
+                    repeat,
+                ),
+                'analysis_details': time_call(
+                    lambda: client.get(f"/v1/analytics/analysis/{next(detail_ids)}", headers=headers),
+                    repeat,
+                ),
+                'analysis_details_batch': time_call(
+                    lambda: client.post("/v1/analytics/analysis/batch", json={"ids": batch_ids}, headers=headers),
+                    repeat,
+                ),
+                'save_analysis': time_call(
+                    lambda: client.post(
+                        "/v1/analytics/save-analysis",
+                        json={
+                            "emotion": "happy",
+                            "confidence": 0.8,
+                            "emotions_detected": {"happy": 0.8, "sad": 0.2},
+                            "recommendations": SAMPLE_TRACKS,
+                        },
+                        headers=headers,
+                    ),
+                    repeat,
+                    before=new_session,
+                ),
+            }
+            print(f"✅ {size} análisis: stats_cold {results[str(size)]['stats_cold']['median_ms']} ms")
+    finally:
+        db.close()
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+    return {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(),
+            'dialect': engine.dialect.name,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare_results(baseline: Dict, current: Dict, threshold: float = 0.2) -> List[Dict]:
+    """
+    Compara las medianas de cada (tamaño, endpoint) presente en ambos archivos.
+    Devuelve una fila por medición; `regression` es True si empeoró más que threshold.
+    """
+    rows = []
+    for size, endpoints in current.get('results', {}).items():
+        base_endpoints = baseline.get('results', {}).get(size, {})
+        for name, measured in endpoints.items():
+            base = base_endpoints.get(name)
+            if not isinstance(measured, dict) or not isinstance(base, dict):
+                continue
+            before, after = base['median_ms'], measured['median_ms']
+            change = (after - before) / before if before else 0.0
+            rows.append({
+                'size': size,
+                'endpoint': name,
+                'baseline_ms': before,
+                'current_ms': after,
+                'change': round(change, 4),
+                'regression': change > threshold,
+            })
+    return rows
+
+
+def load_results(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(results: Dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
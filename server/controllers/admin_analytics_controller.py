@@ -0,0 +1,97 @@
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from server.controllers.analytics_controller import to_naive_utc, truncate_datetime
+from server.core.config import settings
+from server.db.models.analytics import GlobalEmotionHourly, GlobalHourlyUsers, AnalyticsJobState
+from server.db.models.user import User
+from server.schemas.analytics import EmotionStats, GlobalAnalyticsResponse
+from server.services.emotion_catalog import emotion_catalog
+from server.services.global_analytics import JOB_NAME, HLL_PRECISION
+from server.utils.hyperloglog import HyperLogLog
+
+GLOBAL_DEFAULT_HOURS = 24 * 7
+GLOBAL_MAX_HOURS = 24 * 366
+
+
+def require_admin(user: User) -> None:
+    """Solo los emails listados en ANALYTICS_ADMIN_EMAILS ven las analíticas globales"""
+    admins = {email.strip().lower() for email in settings.ANALYTICS_ADMIN_EMAILS.split(",") if email.strip()}
+    if user.email.lower() not in admins:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permisos para ver las analíticas globales"
+        )
+
+
+def fetch_global_analytics(
+    db: Session,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> GlobalAnalyticsResponse:
+    """
+    Vista global a partir de los agregados por hora: nunca lee la tabla analisis.
+    El costo es proporcional a las horas del rango (y los sketches de esas horas).
+    """
+    # El rango se amplía a horas completas: [hora de from, hora siguiente a to)
+    end = truncate_datetime((to_naive_utc(date_to) or datetime.utcnow()) - timedelta(microseconds=1), "hour")
+    end += timedelta(hours=1)
+    start = truncate_datetime(to_naive_utc(date_from) or end - timedelta(hours=GLOBAL_DEFAULT_HOURS), "hour")
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango es vacío: from debe ser anterior a to"
+        )
+    if (end - start) > timedelta(hours=GLOBAL_MAX_HOURS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El rango supera {GLOBAL_MAX_HOURS} horas"
+        )
+
+    rows = db.query(
+        GlobalEmotionHourly.hora,
+        GlobalEmotionHourly.id_emocion,
+        GlobalEmotionHourly.total,
+        GlobalEmotionHourly.suma_confidence,
+    ).filter(GlobalEmotionHourly.hora >= start, GlobalEmotionHourly.hora < end).all()
+
+    hours = []
+    hour = start
+    while hour < end:
+        hours.append(hour)
+        hour += timedelta(hours=1)
+    index = {hour: i for i, hour in enumerate(hours)}
+    per_hour = [0] * len(hours)
+    emotion_counts: Dict[str, int] = {}
+    total_confidence = 0.0
+    for hora, emotion_id, total, confidence_sum in rows:
+        per_hour[index[hora]] += total
+        name = emotion_catalog.name_for(db, emotion_id) or str(emotion_id)
+        emotion_counts[name] = emotion_counts.get(name, 0) + total
+        total_confidence += confidence_sum or 0.0
+    total_analyses = sum(per_hour)
+
+    users = HyperLogLog.union(HLL_PRECISION, (
+        sketch for (sketch,) in db.query(GlobalHourlyUsers.sketch).filter(
+            GlobalHourlyUsers.hora >= start, GlobalHourlyUsers.hora < end
+        )
+    ))
+
+    state = db.get(AnalyticsJobState, JOB_NAME)
+
+    return GlobalAnalyticsResponse(
+        date_from=start,
+        date_to=end,
+        total_analyses=total_analyses,
+        average_confidence=total_confidence / total_analyses if total_analyses else 0.0,
+        emotions_distribution=[
+            EmotionStats(emotion=name, count=count, percentage=count / total_analyses * 100)
+            for name, count in sorted(emotion_counts.items(), key=lambda item: item[1], reverse=True)
+        ],
+        hours=hours,
+        analyses_per_hour=per_hour,
+        distinct_users_estimate=users.count(),
+        high_water_mark=state.ultimo_id if state else 0,
+        refreshed_at=state.actualizado if state else None,
+    )
@@ -0,0 +1,193 @@
+"""
+Pipeline compartido del análisis de emociones: imagen -> Rekognition (o mockup) -> emoción.
+Las rutas de análisis solo se encargan de leer la imagen y agregar las recomendaciones.
+"""
+import random
+from datetime import datetime
+from typing import Dict, List, Optional
+from botocore.exceptions import BotoCoreError, ClientError
+from fastapi import HTTPException, status
+from server.core.config import settings
+from server.services.aws_rekognition_service import rekognition_service
+from server.services.face_result_cache import face_result_cache
+from server.services.image_preprocessing import image_preprocessor
+
+# 🎭 Datos mockup de emociones
+MOCK_EMOTIONS = {
+    "happy": {
+        "emotion": "happy",
+        "confidence": 0.87,
+        "emotions_detected": {
+            "happy": 0.87,
+            "relaxed": 0.06,
+            "sad": 0.03,
+            "angry": 0.02,
+            "energetic": 0.02
+        }
+    },
+    "sad": {
+        "emotion": "sad",
+        "confidence": 0.82,
+        "emotions_detected": {
+            "sad": 0.82,
+            "relaxed": 0.09,
+            "happy": 0.05,
+            "angry": 0.03,
+            "energetic": 0.01
+        }
+    },
+    "angry": {
+        "emotion": "angry",
+        "confidence": 0.79,
+        "emotions_detected": {
+            "angry": 0.79,
+            "energetic": 0.11,
+            "sad": 0.06,
+            "happy": 0.03,
+            "relaxed": 0.01
+        }
+    },
+    "relaxed": {
+        "emotion": "relaxed",
+        "confidence": 0.85,
+        "emotions_detected": {
+            "relaxed": 0.85,
+            "happy": 0.08,
+            "sad": 0.04,
+            "angry": 0.02,
+            "energetic": 0.01
+        }
+    },
+    "energetic": {
+        "emotion": "energetic",
+        "confidence": 0.83,
+        "emotions_detected": {
+            "energetic": 0.83,
+            "happy": 0.09,
+            "angry": 0.04,
+            "relaxed": 0.03,
+            "sad": 0.01
+        }
+    }
+}
+
+# Mapping from AWS Rekognition emotion types to our app emotion keys (reusable)
+AWS_TO_APP = {
+    'HAPPY': 'happy',
+    'SAD': 'sad',
+    'ANGRY': 'angry',
+    'CALM': 'relaxed',
+    'SURPRISED': 'energetic',
+    'CONFUSED': 'relaxed',
+    'DISGUSTED': 'angry',
+    'FEAR': 'sad'
+}
+
+
+def aws_configured() -> bool:
+    return bool(getattr(settings, 'AWS_ACCESS_KEY_ID', None) and getattr(settings, 'AWS_SECRET_ACCESS_KEY', None))
+
+
+def emotion_data_from_faces(faces: List[Dict]) -> Dict:
+    """
+    Convierte las emociones de Rekognition (primer rostro) a las emociones de la app,
+    normalizadas para que sumen 1.
+    """
+    if not faces:
+        # Sin rostros -> error explícito para la imagen subida
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No se detectaron rostros humanos en la imagen")
+
+    emotions_detected: Dict[str, float] = {}
+    for e in faces[0].get('emotions', []):
+        typ = e.get('Type') or e.get('type') or e.get('emotion')
+        conf = float(e.get('Confidence') or e.get('confidence') or 0.0) / 100.0
+        key = AWS_TO_APP.get(typ.upper(), typ.lower() if isinstance(typ, str) else str(typ))
+        emotions_detected[key] = emotions_detected.get(key, 0.0) + conf
+
+    # Normalizar después de mapear y sumar
+    mapped_total = sum(emotions_detected.values())
+    if mapped_total > 0:
+        for k in list(emotions_detected.keys()):
+            emotions_detected[k] = round(emotions_detected[k] / mapped_total, 3)
+
+    if emotions_detected:
+        app_top = max(emotions_detected, key=lambda k: emotions_detected[k])
+        top_conf = emotions_detected[app_top]
+    else:
+        app_top = None
+        top_conf = 0.0
+
+    return {
+        'emotion': app_top,
+        'confidence': round(top_conf, 4),
+        'emotions_detected': emotions_detected,
+        'timestamp': datetime.utcnow().isoformat(),
+        'message': 'Análisis completado exitosamente (AWS Rekognition)'
+    }
+
+
+def mock_emotion_data() -> Dict:
+    emotion_key = random.choice(list(MOCK_EMOTIONS.keys()))
+    emotion_data = MOCK_EMOTIONS[emotion_key].copy()
+    emotion_data["timestamp"] = datetime.utcnow().isoformat()
+    emotion_data["message"] = "Análisis completado exitosamente (modo mockup)"
+    return emotion_data
+
+
+async def detect_emotion(image_bytes, source: str = "", user_key: Optional[str] = None) -> Dict:
+    """
+    Emoción dominante de la imagen (bytes o bytearray ya validados).
+    Usa Rekognition si hay credenciales (con la imagen ya reducida y recodificada,
+    pasando por el caché de resultados); ante un error de AWS cae al mockup.
+    user_key (sub del token) limita los aciertos por imagen parecida a ese usuario.
+    """
+    label = f" ({source})" if source else ""
+    emotion_data: Optional[Dict] = None
+    preprocessing: Optional[Dict] = None
+    cache_status: Optional[str] = None
+
+    if aws_configured():
+        try:
+            # Reintentos y selfies casi iguales salen del caché sin llamar a Rekognition
+            result, preprocessing, cache_status = await face_result_cache.detect(
+                image_bytes, image_preprocessor.process, rekognition_service.detect_faces, user_key
+            )
+            if preprocessing:
+                print(f"🗜️ Preprocesado{label}: {preprocessing['original_bytes']} -> {preprocessing['processed_bytes']} bytes ({preprocessing.get('elapsed_ms', 0):.1f} ms)")
+            print(f"🗂️ Caché de resultados{label}: {cache_status}")
+            if not result.get('success'):
+                # Rekognition falló -> registrar y usar el mockup
+                raise Exception(result.get('error', 'AWS Rekognition returned an error'))
+            emotion_data = emotion_data_from_faces(result.get('faces', []))
+            print(f"✅ Análisis Rekognition{label}: {emotion_data['emotion']} ({emotion_data['confidence']*100:.1f}%)")
+        except (BotoCoreError, ClientError) as be:
+            print(f"❌ AWS Rekognition error{label}: {be}")
+        except HTTPException:
+            # Errores explícitos (p. ej. sin rostros) llegan al cliente
+            raise
+        except Exception as e:
+            print(f"❌ Rekognition processing error{label}: {e}")
+
+    if not emotion_data:
+        emotion_data = mock_emotion_data()
+        print(f"✅ Análisis mockup{label}: {emotion_data['emotion']} ({emotion_data['confidence']*100:.1f}%)")
+    emotion_data['preprocessing'] = preprocessing
+    emotion_data['cache_status'] = cache_status
+    return emotion_data
+
+
+def aggregate_emotions(maps: List[Dict[str, float]]) -> Dict:
+    """
+    Vector de emociones de varias imágenes: promedio de los emotions_detected
+    normalizados (una emoción ausente en una imagen cuenta como 0).
+    """
+    if not maps:
+        return {'emotion': None, 'confidence': 0.0, 'emotions_detected': {}}
+
+    totals: Dict[str, float] = {}
+    for emotions in maps:
+        for key, value in emotions.items():
+            totals[key] = totals.get(key, 0.0) + value
+    averaged = {key: round(total / len(maps), 3) for key, total in totals.items()}
+    top = max(averaged, key=lambda k: averaged[k])
+    return {'emotion': top, 'confidence': averaged[top], 'emotions_detected': averaged}
@@ -0,0 +1,1193 @@
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session, selectinload, defer
+from sqlalchemy import func, extract, cast, select, tuple_, literal, literal_column, case, Integer, Date
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import base64
+import numpy as np
+import csv
+import io
+import json
+import logging
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from server.db.models.analysis import Analysis, Cancion, AnalisisCancion
+from server.db.models.analytics import EmotionDailyRollup, UserStreak
+from server.services.emotion_catalog import emotion_catalog, BASIC_EMOTIONS
+from server.utils.downsampling import lttb_indices
+from server.schemas.analytics import (
+    EmotionStats,
+    WeeklyActivity,
+    WeeklyEmotionData,
+    UserStats,
+    AnalysisHistory,
+    AnalysisHistoryResponse,
+    AnalysisDetail,
+    TimeSeriesResponse,
+    HeatmapResponse,
+    TransitionMatrixResponse,
+    ConfidenceDistribution,
+    ConfidenceStatsResponse,
+    TimelineResponse,
+)
+
+logger = logging.getLogger(__name__)
+
+DAY_LABELS = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
+POSITIVE_EMOTIONS = ['happy', 'energetic', 'relaxed']
+NEGATIVE_EMOTIONS = ['sad', 'angry']
+WEEKS_IN_CHART = 8
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 200
+HISTORY_COUNT_MODES = ("exact", "estimated", "none")
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CSV_COLUMNS = ["id", "date", "emotion", "confidence", "emotions_detected", "session_id", "songs"]
+DEFAULT_TIMEZONE = "UTC"
+UTC_ZONE_KEYS = ("UTC", "Etc/UTC")
+TRANSITION_SCOPES = ("all", "session", "day")
+CONFIDENCE_PERCENTILES = (0.1, 0.5, 0.9)
+CONFIDENCE_DEFAULT_BINS = 10
+TIMELINE_DEFAULT_POINTS = 500
+TIMELINE_MAX_POINTS = 5000
+TIMESERIES_GRANULARITIES = ("hour", "day", "week", "month")
+TIMESERIES_DEFAULT_SPAN = {"hour": 48, "day": 30, "week": WEEKS_IN_CHART, "month": 12}  # en unidades de granularidad
+TIMESERIES_MAX_BUCKETS = 5000
+# SQLite: formato del inicio de cada bucket y paso de la serie (PostgreSQL usa date_trunc / interval)
+_SQLITE_TRUNC = {
+    "hour": ("%Y-%m-%d %H:00:00",),
+    "day": ("%Y-%m-%d 00:00:00",),
+    "week": ("%Y-%m-%d 00:00:00", "weekday 0", "-6 days"),
+    "month": ("%Y-%m-01 00:00:00",),
+}
+_SQLITE_STEP = {"hour": "+1 hour", "day": "+1 day", "week": "+7 days", "month": "+1 month"}
+
+
+class StatsBucket(NamedTuple):
+    """Resumen (día, emoción) sobre el que se construye el dashboard"""
+    day: Optional[date]
+    emotion: str
+    count: int
+    confidence_sum: float
+    hours: List[int]  # 24 contadores, uno por hora del día
+
+
+def _as_date(value) -> Optional[date]:
+    """Normaliza el resultado de func.date() (SQLite lo devuelve como texto)"""
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def resolve_timezone(tz: Optional[str]) -> ZoneInfo:
+    """Zona horaria IANA del cliente (p. ej. America/Caracas); UTC si no se envía"""
+    try:
+        return ZoneInfo(tz or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Zona horaria inválida: {tz}"
+        )
+
+
+def local_today(zone: ZoneInfo) -> date:
+    return datetime.now(zone).date()
+
+
+def local_timestamp(db: Session, column, zone: ZoneInfo):
+    """
+    Columna UTC sin zona expresada en la hora local de la zona.
+    PostgreSQL: columna AT TIME ZONE 'UTC' AT TIME ZONE :tz (respeta cambios de horario).
+    SQLite no conoce zonas: se aplica el desfase actual (solo se usa en pruebas).
+    """
+    if db.get_bind().dialect.name == 'sqlite':
+        minutes = int(datetime.now(zone).utcoffset().total_seconds() // 60)
+        return func.datetime(column, f"{minutes:+d} minutes")
+    return func.timezone(zone.key, func.timezone('UTC', column))
+
+
+def local_day(db: Session, local_ts):
+    """Día (DATE) de un timestamp local: date_trunc('day', ...) en PostgreSQL"""
+    if db.get_bind().dialect.name == 'sqlite':
+        return func.date(local_ts)
+    return cast(func.date_trunc('day', local_ts), Date)
+
+
+def fetch_raw_rollup_rows(
+    db: Session,
+    user_id: Optional[int] = None,
+    zone: Optional[ZoneInfo] = None,
+) -> Dict[Tuple[int, Optional[date], int], list]:
+    """
+    Agrupa los análisis crudos por usuario, día, hora y emoción en una sola consulta.
+    Devuelve {(id_usuario, día, id_emocion): [total, suma_confidence, horas]},
+    la misma forma que guarda la tabla resumen_emocion_diario.
+    Con zone, el día y la hora se calculan en esa zona horaria dentro de la base de datos.
+    """
+    timestamp = Analysis.fecha_analisis
+    if zone is not None:
+        timestamp = local_timestamp(db, Analysis.fecha_analisis, zone)
+        day_col = local_day(db, timestamp)
+    else:
+        day_col = func.date(timestamp)
+    hour_col = extract('hour', timestamp)
+
+    query = db.query(
+        Analysis.id_usuario,
+        day_col,
+        hour_col,
+        Analysis.id_emocion,
+        func.count(Analysis.id),
+        func.coalesce(func.sum(Analysis.confidence), 0.0),
+    )
+    if user_id is not None:
+        query = query.filter(Analysis.id_usuario == user_id)
+
+    rows = query.group_by(Analysis.id_usuario, day_col, hour_col, Analysis.id_emocion).all()
+
+    result: Dict[Tuple[int, Optional[date], int], list] = {}
+    for owner_id, day, hour, emotion_id, count, confidence_sum in rows:
+        key = (owner_id, _as_date(day), emotion_id)
+        entry = result.setdefault(key, [0, 0.0, [0] * 24])
+        entry[0] += int(count)
+        entry[1] += float(confidence_sum or 0.0)
+        hour = int(hour) if hour is not None else 0
+        if 0 <= hour < 24:
+            entry[2][hour] += int(count)
+    return result
+
+
+def fetch_stats_buckets(db: Session, user_id: int) -> List[StatsBucket]:
+    """
+    Lee el resumen diario del usuario (una fila por día activo y emoción).
+    El costo depende de los días activos, no de la cantidad de análisis.
+    """
+    rows = db.query(
+        EmotionDailyRollup.dia,
+        EmotionDailyRollup.id_emocion,
+        EmotionDailyRollup.total,
+        EmotionDailyRollup.suma_confidence,
+        EmotionDailyRollup.horas,
+    ).filter(EmotionDailyRollup.id_usuario == user_id).all()
+
+    return [
+        StatsBucket(
+            day=_as_date(day),
+            emotion=emotion_catalog.name_for(db, emotion_id) or str(emotion_id),
+            count=int(total or 0),
+            confidence_sum=float(confidence_sum or 0.0),
+            hours=list(hours or [0] * 24),
+        )
+        for day, emotion_id, total, confidence_sum, hours in rows
+    ]
+
+
+def localize_buckets(buckets: List[StatsBucket], zone: ZoneInfo) -> Optional[List[StatsBucket]]:
+    """
+    Mueve los buckets UTC (día, hora) a la zona local sin volver a leer analisis.
+    Solo es exacto si el desfase es de horas completas; si no, devuelve None
+    y hay que agrupar en SQL (fetch_local_stats_buckets).
+    """
+    merged: Dict[Tuple[date, str], list] = {}
+    for bucket in buckets:
+        if bucket.day is None:
+            return None
+        # suma_confidence no está por hora; solo se usa para el promedio total
+        pending_confidence = bucket.confidence_sum
+        for hour, count in enumerate(bucket.hours[:24]):
+            if not count:
+                continue
+            local = datetime.combine(bucket.day, time(hour), tzinfo=timezone.utc).astimezone(zone)
+            if local.utcoffset() % timedelta(hours=1):
+                return None
+            entry = merged.setdefault((local.date(), bucket.emotion), [0, 0.0, [0] * 24])
+            entry[0] += count
+            entry[1] += pending_confidence
+            entry[2][local.hour] += count
+            pending_confidence = 0.0
+
+    return [
+        StatsBucket(day=day, emotion=emotion, count=count, confidence_sum=confidence_sum, hours=hours)
+        for (day, emotion), (count, confidence_sum, hours) in merged.items()
+    ]
+
+
+def fetch_local_stats_buckets(db: Session, user_id: int, zone: ZoneInfo) -> List[StatsBucket]:
+    """Buckets (día local, emoción) agrupados en SQL con AT TIME ZONE"""
+    raw = fetch_raw_rollup_rows(db, user_id, zone)
+    return [
+        StatsBucket(
+            day=day,
+            emotion=emotion_catalog.name_for(db, emotion_id) or str(emotion_id),
+            count=total,
+            confidence_sum=confidence_sum,
+            hours=hours,
+        )
+        for (_, day, emotion_id), (total, confidence_sum, hours) in raw.items()
+    ]
+
+
+def create_empty_stats() -> UserStats:
+    """Crear estadísticas vacías para usuarios nuevos"""
+    return UserStats(
+        total_analyses=0,
+        most_frequent_emotion=None,
+        average_confidence=0.0,
+        streak=0,
+        emotions_distribution=[],
+        weekly_activity=[WeeklyActivity(day=day, analyses_count=0) for day in DAY_LABELS],
+        hourly_activity=[0] * 24,
+        weekly_emotions=[],
+        positive_negative_balance={"positive": 0, "negative": 0}
+    )
+
+
+def calculate_positive_negative_balance(emotion_counts: Dict[str, int]) -> Dict[str, int]:
+    """Calcular balance de emociones positivas vs negativas"""
+    positive_count = sum(emotion_counts.get(emotion, 0) for emotion in POSITIVE_EMOTIONS)
+    negative_count = sum(emotion_counts.get(emotion, 0) for emotion in NEGATIVE_EMOTIONS)
+
+    return {
+        "positive": positive_count,
+        "negative": negative_count
+    }
+
+
+def _day_number(db: Session, day_col):
+    """Número entero de día de una columna DATE, para agrupar días consecutivos"""
+    if db.get_bind().dialect.name == 'sqlite':
+        return cast(func.julianday(day_col), Integer)
+    return day_col - func.date('1970-01-01')
+
+
+def fetch_latest_streak(db: Session, user_id: int) -> Tuple[Optional[date], int]:
+    """
+    Calcula en la base de datos la última racha del usuario ("gaps and islands"):
+    día - ROW_NUMBER() es constante dentro de cada bloque de días consecutivos.
+    Devuelve (último día del bloque más reciente, longitud del bloque).
+    """
+    day_col = func.date(Analysis.fecha_analisis)
+    days = db.query(day_col.label('dia')).filter(
+        Analysis.id_usuario == user_id,
+        Analysis.fecha_analisis.isnot(None)
+    ).distinct().subquery()
+
+    islands = db.query(
+        days.c.dia.label('dia'),
+        (_day_number(db, days.c.dia) - func.row_number().over(order_by=days.c.dia)).label('isla')
+    ).subquery()
+
+    last_day = func.max(islands.c.dia)
+    row = db.query(last_day, func.count()).group_by(islands.c.isla).order_by(last_day.desc()).first()
+    if not row:
+        return None, 0
+    return _as_date(row[0]), int(row[1])
+
+
+def streak_as_of(last_day: Optional[date], length: int, today: date) -> int:
+    """
+    Racha visible hoy: el bloque más reciente solo cuenta si termina hoy,
+    o mañana (tolerancia de un día si "hoy" y los días se calcularon en zonas distintas).
+    """
+    if last_day is None:
+        return 0
+    if last_day == today or last_day == today + timedelta(days=1):
+        return length
+    return 0
+
+
+def latest_streak_from_days(days) -> Tuple[Optional[date], int]:
+    """Último bloque de días consecutivos a partir de los días activos (ya agregados)"""
+    ordered = sorted(set(day for day in days if day is not None), reverse=True)
+    if not ordered:
+        return None, 0
+    length = 1
+    while length < len(ordered) and ordered[length] == ordered[length - 1] - timedelta(days=1):
+        length += 1
+    return ordered[0], length
+
+
+def read_user_streak(db: Session, user_id: int, today: date) -> int:
+    """Lee la racha guardada por clave primaria; si no existe la calcula en SQL"""
+    stored = db.get(UserStreak, user_id)
+    if stored is not None:
+        return streak_as_of(stored.ultimo_dia, stored.racha or 0, today)
+    return streak_as_of(*fetch_latest_streak(db, user_id), today)
+
+
+def build_user_stats(buckets: List[StatsBucket], today: Optional[date] = None, streak: int = 0) -> UserStats:
+    """
+    Construye el UserStats del dashboard a partir de las filas agregadas.
+    Todo el trabajo en Python es proporcional al número de buckets.
+    """
+    if not buckets:
+        return create_empty_stats()
+
+    today = today or datetime.utcnow().date()
+    week_start = today - timedelta(days=today.weekday())  # Lunes de esta semana
+    first_chart_week = week_start - timedelta(weeks=WEEKS_IN_CHART - 1)
+
+    total_analyses = 0
+    total_confidence = 0.0
+    emotion_counts: Dict[str, int] = {}
+    hourly_counts = [0] * 24
+    daily_counts = [0] * 7
+    weeks: Dict[date, Dict[str, int]] = {
+        first_chart_week + timedelta(weeks=i): {} for i in range(WEEKS_IN_CHART)
+    }
+
+    for bucket in buckets:
+        total_analyses += bucket.count
+        total_confidence += bucket.confidence_sum
+        emotion_counts[bucket.emotion] = emotion_counts.get(bucket.emotion, 0) + bucket.count
+
+        for hour, count in enumerate(bucket.hours[:24]):
+            hourly_counts[hour] += count
+
+        if bucket.day is None:
+            continue
+
+        # Actividad de la semana actual (Lunes a Domingo)
+        offset = (bucket.day - week_start).days
+        if 0 <= offset < 7:
+            daily_counts[offset] += bucket.count
+
+        # Emociones por semana (últimas 8 semanas)
+        bucket_week = bucket.day - timedelta(days=bucket.day.weekday())
+        if bucket_week in weeks:
+            week = weeks[bucket_week]
+            week[bucket.emotion] = week.get(bucket.emotion, 0) + bucket.count
+
+    if total_analyses == 0:
+        return create_empty_stats()
+
+    most_frequent_emotion = max(emotion_counts, key=emotion_counts.get) if emotion_counts else None
+
+    emotions_distribution = [
+        EmotionStats(
+            emotion=emotion,
+            count=count,
+            percentage=(count / total_analyses) * 100
+        )
+        for emotion, count in emotion_counts.items()
+    ]
+
+    return UserStats(
+        total_analyses=total_analyses,
+        most_frequent_emotion=most_frequent_emotion,
+        average_confidence=total_confidence / total_analyses,
+        streak=streak,
+        emotions_distribution=emotions_distribution,
+        weekly_activity=[WeeklyActivity(day=DAY_LABELS[i], analyses_count=daily_counts[i]) for i in range(7)],
+        hourly_activity=hourly_counts,
+        weekly_emotions=[
+            WeeklyEmotionData(week_start=start.strftime("%Y-%m-%d"), emotions=counts)
+            for start, counts in weeks.items()
+        ],
+        positive_negative_balance=calculate_positive_negative_balance(emotion_counts)
+    )
+
+
+def compute_user_stats(
+    db: Session,
+    user_id: int,
+    today: Optional[date] = None,
+    zone: Optional[ZoneInfo] = None,
+) -> UserStats:
+    """
+    Calcula las estadísticas del dashboard a partir del resumen diario (UTC).
+    Con otra zona horaria los días y horas se trasladan a la hora local del usuario.
+    """
+    zone = zone or ZoneInfo(DEFAULT_TIMEZONE)
+    buckets = fetch_stats_buckets(db, user_id)
+    if not buckets:
+        return create_empty_stats()
+    today = today or local_today(zone)
+
+    if zone.key in UTC_ZONE_KEYS:
+        return build_user_stats(buckets, today, read_user_streak(db, user_id, today))
+
+    local = localize_buckets(buckets, zone)
+    if local is None:
+        local = fetch_local_stats_buckets(db, user_id, zone)
+    streak = streak_as_of(*latest_streak_from_days(bucket.day for bucket in local), today)
+    return build_user_stats(local, today, streak)
+
+
+def fetch_data_version(db: Session, user_id: int) -> Tuple[int, int]:
+    """
+    (último id de análisis, cantidad de análisis) del usuario en una consulta indexada.
+    Los análisis no se editan, así que el par cambia con cada INSERT o DELETE.
+    """
+    row = db.query(func.max(Analysis.id), func.count(Analysis.id)).filter(
+        Analysis.id_usuario == user_id
+    ).one()
+    return int(row[0] or 0), int(row[1] or 0)
+
+
+def to_naive_utc(value: Optional[datetime], zone: Optional[ZoneInfo] = None) -> Optional[datetime]:
+    """
+    Las fechas se guardan como UTC sin zona horaria (datetime.utcnow()).
+    Una fecha sin zona se interpreta en zone, si se indica.
+    """
+    if value is None:
+        return value
+    if value.tzinfo is None:
+        if zone is None:
+            return value
+        value = value.replace(tzinfo=zone)
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def encode_history_cursor(fecha: datetime, analysis_id: int) -> str:
+    """Cursor opaco con la clave (fecha_analisis, id) de la última fila entregada"""
+    raw = json.dumps({"d": fecha.isoformat(), "i": analysis_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["d"]), int(data["i"])
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+
+
+def count_history(
+    db: Session,
+    user_id: int,
+    mode: str,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    emotion_ids: Optional[Tuple[int, ...]] = None,
+) -> Optional[int]:
+    """
+    Total del historial filtrado.
+    - exact: COUNT(*) sobre analisis usando los mismos filtros que la página
+    - estimated: suma del resumen diario (los límites se redondean al día)
+    - none: no se calcula
+    """
+    if mode == "none":
+        return None
+
+    if mode == "estimated":
+        query = db.query(func.coalesce(func.sum(EmotionDailyRollup.total), 0)).filter(
+            EmotionDailyRollup.id_usuario == user_id
+        )
+        if emotion_ids is not None:
+            query = query.filter(EmotionDailyRollup.id_emocion.in_(emotion_ids))
+        if date_from:
+            query = query.filter(EmotionDailyRollup.dia >= date_from.date())
+        if date_to:
+            query = query.filter(EmotionDailyRollup.dia < date_to.date())
+        return int(query.scalar() or 0)
+
+    query = db.query(func.count(Analysis.id)).filter(Analysis.id_usuario == user_id)
+    if emotion_ids is not None:
+        query = query.filter(Analysis.id_emocion.in_(emotion_ids))
+    if date_from:
+        query = query.filter(Analysis.fecha_analisis >= date_from)
+    if date_to:
+        query = query.filter(Analysis.fecha_analisis < date_to)
+    return int(query.scalar() or 0)
+
+
+def fetch_history_page(
+    db: Session,
+    user_id: int,
+    limit: int = HISTORY_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    emotion: Optional[str] = None,
+    count_mode: str = "exact",
+    zone: Optional[ZoneInfo] = None,
+) -> AnalysisHistoryResponse:
+    """
+    Página del historial ordenada por (fecha_analisis, id) descendente.
+    Usa paginación por clave (keyset): la siguiente página continúa después del
+    cursor en lugar de saltar filas con OFFSET.
+    Las fechas from / to sin zona se interpretan en zone.
+    """
+    if count_mode not in HISTORY_COUNT_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"count inválido. Opciones: {', '.join(HISTORY_COUNT_MODES)}"
+        )
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    date_from = to_naive_utc(date_from, zone)
+    date_to = to_naive_utc(date_to, zone)
+    # Filtro por id de emoción: sin JOIN con la tabla emocion
+    emotion_ids = emotion_catalog.ids_for(db, emotion) if emotion and emotion != 'all' else None
+
+    query = db.query(
+        Analysis.id,
+        Analysis.fecha_analisis,
+        Analysis.confidence,
+        Analysis.emotions_detected,
+        Analysis.id_emocion,
+    ).filter(Analysis.id_usuario == user_id)
+
+    if emotion_ids is not None:
+        query = query.filter(Analysis.id_emocion.in_(emotion_ids))
+    if date_from:
+        query = query.filter(Analysis.fecha_analisis >= date_from)
+    if date_to:
+        query = query.filter(Analysis.fecha_analisis < date_to)
+    if cursor:
+        after_fecha, after_id = decode_history_cursor(cursor)
+        query = query.filter(tuple_(Analysis.fecha_analisis, Analysis.id) < tuple_(after_fecha, after_id))
+
+    # Una fila extra indica si hay más páginas
+    rows = query.order_by(Analysis.fecha_analisis.desc(), Analysis.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    analyses = [
+        AnalysisHistory(
+            id=str(analysis_id),
+            emotion=emotion_catalog.name_for(db, emotion_id) or str(emotion_id),
+            confidence=confidence or 0.0,
+            date=fecha,
+            emotions_detected=emotions_detected or {}
+        )
+        for analysis_id, fecha, confidence, emotions_detected, emotion_id in rows
+    ]
+
+    next_cursor = None
+    if has_more and rows:
+        last_id, last_fecha = rows[-1][0], rows[-1][1]
+        next_cursor = encode_history_cursor(last_fecha, last_id)
+
+    return AnalysisHistoryResponse(
+        analyses=analyses,
+        total=count_history(db, user_id, count_mode, date_from, date_to, emotion_ids),
+        total_is_estimate=count_mode == "estimated",
+        next_cursor=next_cursor,
+    )
+
+
+def export_song(song: Cancion) -> Dict:
+    """Versión compacta de una canción vinculada para la exportación"""
+    artists = song.artists if isinstance(song.artists, list) else []
+    return {
+        'id': song.spotify_id,
+        'name': song.titulo,
+        'artists': [a.get('name') for a in artists if isinstance(a, dict) and a.get('name')] or ([song.artista] if song.artista else []),
+        'url': song.external_url,
+    }
+
+
+def fetch_songs_for_analyses(db: Session, analysis_ids: List[int]) -> Dict[int, List[Cancion]]:
+    """Canciones vinculadas a varios análisis en una sola consulta IN"""
+    songs: Dict[int, List[Cancion]] = {analysis_id: [] for analysis_id in analysis_ids}
+    if not analysis_ids:
+        return songs
+    rows = db.query(AnalisisCancion.ID_analisis, Cancion).join(
+        Cancion, Cancion.id == AnalisisCancion.ID_cancion
+    ).filter(AnalisisCancion.ID_analisis.in_(analysis_ids)).order_by(Cancion.id).all()
+    for analysis_id, song in rows:
+        songs[analysis_id].append(song)
+    return songs
+
+
+def iter_history_export(db: Session, user_id: int, fmt: str = "ndjson", include_songs: bool = False) -> Iterator[str]:
+    """
+    Genera la exportación del historial completo por lotes.
+    Las filas se leen con yield_per (cursor del lado del servidor en PostgreSQL),
+    así que la memoria usada no depende del tamaño del historial.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportación inválido: {fmt}")
+
+    stmt = select(
+        Analysis.id,
+        Analysis.fecha_analisis,
+        Analysis.id_emocion,
+        Analysis.confidence,
+        Analysis.emotions_detected,
+        Analysis.id_sesion,
+    ).where(
+        Analysis.id_usuario == user_id
+    ).order_by(
+        Analysis.fecha_analisis, Analysis.id
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    columns = EXPORT_CSV_COLUMNS if include_songs else EXPORT_CSV_COLUMNS[:-1]
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+
+    for batch in db.execute(stmt).partitions():
+        songs = fetch_songs_for_analyses(db, [row[0] for row in batch]) if include_songs else {}
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+
+        lines = []
+        for analysis_id, fecha, emotion_id, confidence, emotions_detected, session_id in batch:
+            record = {
+                'id': analysis_id,
+                'date': fecha.isoformat() if fecha else None,
+                'emotion': emotion_catalog.name_for(db, emotion_id),
+                'confidence': confidence or 0.0,
+                'emotions_detected': emotions_detected or {},
+                'session_id': session_id,
+            }
+            if include_songs:
+                record['songs'] = [export_song(song) for song in songs.get(analysis_id, [])]
+
+            if fmt == "csv":
+                writer.writerow([
+                    json.dumps(record[c], ensure_ascii=False) if isinstance(record[c], (dict, list)) else record[c]
+                    for c in columns
+                ])
+            else:
+                lines.append(json.dumps(record, ensure_ascii=False))
+
+        if fmt == "csv":
+            yield buffer.getvalue()
+        elif lines:
+            yield "\n".join(lines) + "\n"
+
+
+def stream_history_export(
+    session_factory: Callable[[], Session],
+    user_id: int,
+    fmt: str = "ndjson",
+    include_songs: bool = False,
+) -> Iterator[str]:
+    """
+    Igual que iter_history_export pero con su propia sesión de base de datos,
+    que vive mientras dura la respuesta en streaming.
+    """
+    db = session_factory()
+    try:
+        yield from iter_history_export(db, user_id, fmt, include_songs)
+    finally:
+        db.close()
+
+
+def song_to_track(song: Cancion) -> Dict:
+    """Track de Spotify guardado para una canción vinculada"""
+    if song.track_raw:
+        return song.track_raw
+    return {
+        'id': song.spotify_id,
+        'name': song.titulo,
+        'artists': song.artists,
+        'album': song.album_data or {'name': song.album},
+        'external_urls': {'spotify': song.external_url} if song.external_url else None,
+        'uri': song.uri,
+        'preview_url': song.preview_url,
+        'duration_ms': song.duration_ms,
+        'popularity': song.popularity
+    }
+
+
+def build_analysis_detail(db: Session, analysis: Analysis, recommendations: List[Dict]) -> AnalysisDetail:
+    return AnalysisDetail(
+        id=analysis.id,
+        emotion=emotion_catalog.name_for(db, analysis.id_emocion) or str(analysis.id_emocion),
+        confidence=analysis.confidence or 0.0,
+        date=analysis.fecha_analisis,
+        emotions_detected=analysis.emotions_detected or {},
+        session_id=analysis.id_sesion,
+        recommendations=recommendations
+    )
+
+
+def fetch_analysis_details(db: Session, user_id: int, analysis_ids: List[int]) -> List[AnalysisDetail]:
+    """
+    Detalles de varios análisis del usuario en dos consultas: una para los análisis
+    (con control de pertenencia) y un IN para todas sus canciones vinculadas.
+    Se devuelven en el orden pedido; los ids ajenos o inexistentes se omiten.
+    """
+    ids = list(dict.fromkeys(analysis_ids))
+    if not ids:
+        return []
+    query = db.query(Analysis).filter(Analysis.id.in_(ids), Analysis.id_usuario == user_id)
+
+    try:
+        # Savepoint: si falla la carga de canciones solo se deshace esta lectura, no lo pendiente del llamador
+        with db.begin_nested():
+            analyses = query.options(
+                selectinload(Analysis.songs),
+                defer(Analysis.recommendations),
+            ).all()
+    except SQLAlchemyError as e:
+        # Si fallan las canciones vinculadas, usar las recomendaciones guardadas en el análisis
+        logger.warning(f"Linked songs failed to load, using stored recommendations: {e}")
+        return order_details(ids, {a.id: build_analysis_detail(db, a, a.recommendations or []) for a in query.all()})
+
+    details = {a.id: build_analysis_detail(db, a, [song_to_track(s) for s in a.songs]) for a in analyses}
+
+    return order_details(ids, details)
+
+
+def order_details(ids: List[int], details: Dict[int, AnalysisDetail]) -> List[AnalysisDetail]:
+    """En el orden pedido; los ids ajenos o inexistentes se omiten"""
+    return [details[analysis_id] for analysis_id in ids if analysis_id in details]
+
+
+def truncate_datetime(value: datetime, granularity: str) -> datetime:
+    """Inicio del bucket que contiene value (semanas de lunes a domingo, como date_trunc)"""
+    if granularity == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return value - timedelta(days=value.weekday())
+    if granularity == "month":
+        return value.replace(day=1)
+    return value
+
+
+def step_datetime(value: datetime, granularity: str) -> datetime:
+    if granularity == "month":
+        return value.replace(year=value.year + value.month // 12, month=value.month % 12 + 1)
+    if granularity == "week":
+        return value + timedelta(weeks=1)
+    return value + (timedelta(hours=1) if granularity == "hour" else timedelta(days=1))
+
+
+def count_buckets(first: datetime, last: datetime, granularity: str) -> int:
+    if last < first:
+        return 0
+    if granularity == "month":
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    step = {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}[granularity]
+    return (last - first) // step + 1
+
+
+def truncate_column(db: Session, granularity: str, local_ts):
+    if db.get_bind().dialect.name == 'sqlite':
+        fmt, *modifiers = _SQLITE_TRUNC[granularity]
+        return func.strftime(fmt, local_ts, *modifiers)
+    return func.date_trunc(granularity, local_ts)
+
+
+def _bucket_series(db: Session, granularity: str, first: datetime, last: datetime):
+    """
+    Serie con el inicio de cada bucket entre first y last (incluidos).
+    PostgreSQL: generate_series(first, last, interval). SQLite: CTE recursiva.
+    """
+    if db.get_bind().dialect.name == 'sqlite':
+        seed = select(literal(first.strftime("%Y-%m-%d %H:%M:%S")).label("bucket")).cte("series", recursive=True)
+        next_bucket = func.datetime(seed.c.bucket, _SQLITE_STEP[granularity])
+        return seed.union_all(
+            select(next_bucket).where(next_bucket <= last.strftime("%Y-%m-%d %H:%M:%S"))
+        )
+    return func.generate_series(
+        literal(first), literal(last), literal_column(f"interval '1 {granularity}'")
+    ).table_valued("bucket").render_derived(name="series")
+
+
+def resolve_timeseries_range(
+    granularity: str,
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    zone: ZoneInfo,
+) -> Tuple[datetime, datetime]:
+    """
+    Rango [from, to) en hora local sin zona. Por defecto termina al final del bucket
+    actual y cubre TIMESERIES_DEFAULT_SPAN buckets.
+    """
+    if granularity not in TIMESERIES_GRANULARITIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"granularity inválido. Opciones: {', '.join(TIMESERIES_GRANULARITIES)}"
+        )
+
+    def as_local(value: datetime) -> datetime:
+        if value.tzinfo is not None:
+            value = value.astimezone(zone).replace(tzinfo=None)
+        return value
+
+    if date_to is not None:
+        end = as_local(date_to)
+    else:
+        end = step_datetime(truncate_datetime(datetime.now(zone).replace(tzinfo=None), granularity), granularity)
+
+    if date_from is not None:
+        start = as_local(date_from)
+    else:
+        start = truncate_datetime(end - timedelta(microseconds=1), granularity)
+        for _ in range(TIMESERIES_DEFAULT_SPAN[granularity] - 1):
+            start = truncate_datetime(start - timedelta(microseconds=1), granularity)
+
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango es vacío: from debe ser anterior a to"
+        )
+    return start, end
+
+
+def fetch_timeseries(
+    db: Session,
+    user_id: int,
+    granularity: str = "day",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    emotion: Optional[str] = None,
+    zone: Optional[ZoneInfo] = None,
+) -> TimeSeriesResponse:
+    """
+    Conteo de análisis por bucket (hora, día, semana o mes local) y emoción.
+    Una sola consulta: los conteos agrupados se unen con LEFT JOIN a la serie de
+    buckets, así los buckets vacíos llegan de la base de datos con cero.
+    """
+    zone = zone or ZoneInfo(DEFAULT_TIMEZONE)
+    start, end = resolve_timeseries_range(granularity, date_from, date_to, zone)
+    first = truncate_datetime(start, granularity)
+    last = truncate_datetime(end - timedelta(microseconds=1), granularity)
+    if count_buckets(first, last, granularity) > TIMESERIES_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El rango supera {TIMESERIES_MAX_BUCKETS} buckets; usa una granularidad mayor"
+        )
+    emotion_ids = emotion_catalog.ids_for(db, emotion) if emotion and emotion != 'all' else None
+
+    bucket_col = truncate_column(db, granularity, local_timestamp(db, Analysis.fecha_analisis, zone))
+    counts = db.query(
+        bucket_col.label("bucket"),
+        Analysis.id_emocion.label("id_emocion"),
+        func.count(Analysis.id).label("total"),
+    ).filter(
+        Analysis.id_usuario == user_id,
+        Analysis.fecha_analisis >= to_naive_utc(start.replace(tzinfo=zone)),
+        Analysis.fecha_analisis < to_naive_utc(end.replace(tzinfo=zone)),
+    )
+    if emotion_ids is not None:
+        counts = counts.filter(Analysis.id_emocion.in_(emotion_ids))
+    counts = counts.group_by(bucket_col, Analysis.id_emocion).subquery()
+
+    series = _bucket_series(db, granularity, first, last)
+    rows = db.query(series.c.bucket, counts.c.id_emocion, counts.c.total).select_from(series).outerjoin(
+        counts, counts.c.bucket == series.c.bucket
+    ).order_by(series.c.bucket).all()
+
+    buckets: List[datetime] = []
+    totals: List[int] = []
+    emotions: Dict[str, List[int]] = {}
+    if emotion_ids is not None:
+        emotions[emotion] = []
+    for bucket, emotion_id, total in rows:
+        bucket = bucket if isinstance(bucket, datetime) else datetime.fromisoformat(str(bucket))
+        if not buckets or buckets[-1] != bucket:
+            buckets.append(bucket)
+            totals.append(0)
+            for values in emotions.values():
+                values.append(0)
+        if emotion_id is None:
+            continue
+        name = emotion_catalog.name_for(db, emotion_id) or str(emotion_id)
+        values = emotions.setdefault(name, [0] * len(buckets))
+        values[-1] += int(total)
+        totals[-1] += int(total)
+
+    return TimeSeriesResponse(
+        granularity=granularity,
+        timezone=zone.key,
+        date_from=start,
+        date_to=end,
+        buckets=buckets,
+        total=totals,
+        emotions=emotions,
+    )
+
+
+def _empty_heatmap() -> List[List[int]]:
+    return [[0] * 24 for _ in range(7)]
+
+
+def heatmap_from_buckets(buckets: List[StatsBucket]) -> Dict[str, List[List[int]]]:
+    """Matriz día de la semana (lunes = 0) × hora por emoción a partir de buckets diarios"""
+    heatmap: Dict[str, List[List[int]]] = {}
+    for bucket in buckets:
+        if bucket.day is None:
+            continue
+        row = heatmap.setdefault(bucket.emotion, _empty_heatmap())[bucket.day.weekday()]
+        for hour, count in enumerate(bucket.hours[:24]):
+            row[hour] += count
+    return heatmap
+
+
+def fetch_heatmap_sql(db: Session, user_id: int, zone: ZoneInfo) -> Dict[str, List[List[int]]]:
+    """Una consulta GROUP BY extract(dow), extract(hour), id_emocion sobre la hora local"""
+    local_ts = local_timestamp(db, Analysis.fecha_analisis, zone)
+    dow_col = extract('dow', local_ts)
+    hour_col = extract('hour', local_ts)
+    rows = db.query(dow_col, hour_col, Analysis.id_emocion, func.count(Analysis.id)).filter(
+        Analysis.id_usuario == user_id,
+        Analysis.fecha_analisis.isnot(None),
+    ).group_by(dow_col, hour_col, Analysis.id_emocion).all()
+
+    heatmap: Dict[str, List[List[int]]] = {}
+    for dow, hour, emotion_id, count in rows:
+        name = emotion_catalog.name_for(db, emotion_id) or str(emotion_id)
+        # dow: 0 = domingo en PostgreSQL y SQLite; la matriz empieza en lunes
+        heatmap.setdefault(name, _empty_heatmap())[(int(dow) + 6) % 7][int(hour)] += int(count)
+    return heatmap
+
+
+def compute_heatmap(db: Session, user_id: int, zone: Optional[ZoneInfo] = None) -> HeatmapResponse:
+    """
+    Mapa de calor 7×24 por emoción. Sale del resumen diario (costo proporcional a
+    los días activos); solo las zonas con desfase de media hora agrupan analisis en SQL.
+    """
+    zone = zone or ZoneInfo(DEFAULT_TIMEZONE)
+    buckets = fetch_stats_buckets(db, user_id)
+    if zone.key not in UTC_ZONE_KEYS:
+        buckets = localize_buckets(buckets, zone)
+
+    heatmap = heatmap_from_buckets(buckets) if buckets is not None else fetch_heatmap_sql(db, user_id, zone)
+
+    total = _empty_heatmap()
+    for matrix in heatmap.values():
+        for day, row in enumerate(matrix):
+            for hour, count in enumerate(row):
+                total[day][hour] += count
+
+    return HeatmapResponse(timezone=zone.key, days=DAY_LABELS, total=total, emotions=heatmap)
+
+
+def _seconds_between(db: Session, later, earlier):
+    if db.get_bind().dialect.name == 'sqlite':
+        return (func.julianday(later) - func.julianday(earlier)) * 86400
+    return extract('epoch', later - earlier)
+
+
+def compute_transition_matrix(
+    db: Session,
+    user_id: int,
+    scope: str = "all",
+    max_gap_minutes: Optional[int] = None,
+    zone: Optional[ZoneInfo] = None,
+) -> TransitionMatrixResponse:
+    """
+    Matriz de transiciones entre análisis consecutivos (cadena de Markov).
+    LAG() sobre (fecha_analisis, id) empareja cada análisis con el anterior en SQL;
+    solo vuelven a Python los conteos agrupados (emoción anterior, emoción actual).
+    - scope=session: solo transiciones dentro de la misma sesión
+    - scope=day: solo transiciones dentro del mismo día local de zone
+    - max_gap_minutes: descarta pares separados por más de ese tiempo real (medido en UTC)
+    """
+    zone = zone or ZoneInfo(DEFAULT_TIMEZONE)
+    if scope not in TRANSITION_SCOPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"scope inválido. Opciones: {', '.join(TRANSITION_SCOPES)}"
+        )
+
+    window = dict(order_by=(Analysis.fecha_analisis, Analysis.id))
+    if scope == "session":
+        window["partition_by"] = Analysis.id_sesion
+    elif scope == "day":
+        window["partition_by"] = local_day(db, local_timestamp(db, Analysis.fecha_analisis, zone))
+    # El hueco se mide en UTC: en hora local un cambio de horario lo alarga o lo vuelve negativo
+    pairs = db.query(
+        Analysis.id_emocion.label("actual"),
+        Analysis.fecha_analisis.label("fecha"),
+        func.lag(Analysis.id_emocion).over(**window).label("anterior"),
+        func.lag(Analysis.fecha_analisis).over(**window).label("fecha_anterior"),
+    ).filter(
+        Analysis.id_usuario == user_id,
+        Analysis.fecha_analisis.isnot(None),
+    ).subquery()
+
+    query = db.query(pairs.c.anterior, pairs.c.actual, func.count()).filter(pairs.c.anterior.isnot(None))
+    if max_gap_minutes is not None:
+        query = query.filter(_seconds_between(db, pairs.c.fecha, pairs.c.fecha_anterior) <= max_gap_minutes * 60)
+    rows = query.group_by(pairs.c.anterior, pairs.c.actual).all()
+
+    # Ejes: nombres del catálogo de emociones (un nombre puede tener varios ids)
+    emotions = list(dict.fromkeys(emotion_catalog.names(db).values()))
+    index = {name: i for i, name in enumerate(emotions)}
+    counts = [[0] * len(emotions) for _ in emotions]
+    for previous_id, current_id, count in rows:
+        previous = emotion_catalog.name_for(db, previous_id) or str(previous_id)
+        current = emotion_catalog.name_for(db, current_id) or str(current_id)
+        for name in (previous, current):
+            if name not in index:
+                index[name] = len(emotions)
+                emotions.append(name)
+                for row in counts:
+                    row.append(0)
+                counts.append([0] * len(emotions))
+        counts[index[previous]][index[current]] += int(count)
+
+    probabilities = [
+        [count / sum(row) if sum(row) else 0.0 for count in row]
+        for row in counts
+    ]
+    return TransitionMatrixResponse(
+        scope=scope,
+        timezone=zone.key,
+        max_gap_minutes=max_gap_minutes,
+        emotions=emotions,
+        counts=counts,
+        probabilities=probabilities,
+        total_transitions=sum(map(sum, counts)),
+    )
+
+
+def percentile_cont(values: List[float], fraction: float) -> Optional[float]:
+    """Misma interpolación lineal que percentile_cont de PostgreSQL"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = fraction * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def compute_confidence_stats(db: Session, user_id: int, bins: int = CONFIDENCE_DEFAULT_BINS) -> ConfidenceStatsResponse:
+    """
+    Distribución de confidence por emoción en una sola consulta agrupada por id_emocion:
+    histograma (width_bucket en [0, 1]), p10/p50/p90 (percentile_cont) y el promedio
+    de cada componente de emotions_detected (las claves ausentes no cuentan).
+    SQLite (pruebas) no tiene esas funciones: el bucket se calcula con aritmética y
+    los percentiles sobre un group_concat de la misma consulta.
+    """
+    sqlite = db.get_bind().dialect.name == 'sqlite'
+    confidence = func.coalesce(Analysis.confidence, 0.0)
+
+    if sqlite:
+        bucket = func.min(cast(confidence * bins, Integer) + 1, bins)
+        percentile_cols = [func.group_concat(confidence)]
+    else:
+        # width_bucket deja 1.0 en el bucket de desborde (bins + 1): se suma al último
+        bucket = func.least(func.width_bucket(confidence, 0.0, 1.0, bins), bins)
+        percentile_cols = [func.percentile_cont(p).within_group(confidence) for p in CONFIDENCE_PERCENTILES]
+
+    histogram_cols = [func.sum(case((bucket == i, 1), else_=0)) for i in range(1, bins + 1)]
+    component_cols = [func.avg(Analysis.emotions_detected[name].as_float()) for name in BASIC_EMOTIONS]
+
+    rows = db.query(
+        Analysis.id_emocion,
+        func.count(Analysis.id),
+        func.avg(confidence),
+        *percentile_cols,
+        *histogram_cols,
+        *component_cols,
+    ).filter(Analysis.id_usuario == user_id).group_by(Analysis.id_emocion).all()
+
+    distributions: Dict[str, ConfidenceDistribution] = {}
+    for row in rows:
+        emotion_id, count, average = row[0], int(row[1]), float(row[2] or 0.0)
+        rest = list(row[3:])
+        if sqlite:
+            raw = rest.pop(0)
+            values = [float(v) for v in str(raw).split(",")] if raw is not None else []
+            percentiles = [percentile_cont(values, p) for p in CONFIDENCE_PERCENTILES]
+        else:
+            percentiles = [float(v) if v is not None else None for v in rest[:len(CONFIDENCE_PERCENTILES)]]
+            rest = rest[len(CONFIDENCE_PERCENTILES):]
+        histogram = [int(v or 0) for v in rest[:bins]]
+        components = {
+            name: float(value)
+            for name, value in zip(BASIC_EMOTIONS, rest[bins:])
+            if value is not None
+        }
+
+        name = emotion_catalog.name_for(db, emotion_id) or str(emotion_id)
+        previous = distributions.get(name)
+        if previous is not None:
+            # Varios ids con el mismo nombre: se suman los conteos; percentiles y
+            # componentes no se pueden combinar y se conservan los del grupo mayor
+            if previous.count > count:
+                percentiles = [previous.p10, previous.p50, previous.p90]
+                components = previous.average_components
+            histogram = [a + b for a, b in zip(previous.histogram, histogram)]
+            average = (previous.average_confidence * previous.count + average * count) / (previous.count + count)
+            count += previous.count
+
+        distributions[name] = ConfidenceDistribution(
+            emotion=name,
+            count=count,
+            average_confidence=average,
+            p10=percentiles[0],
+            p50=percentiles[1],
+            p90=percentiles[2],
+            histogram=histogram,
+            average_components=components,
+        )
+
+    return ConfidenceStatsResponse(
+        bins=bins,
+        bin_edges=[round(i / bins, 6) for i in range(bins + 1)],
+        emotions=sorted(distributions.values(), key=lambda d: d.count, reverse=True),
+    )
+
+
+def _epoch_seconds(db: Session, column):
+    """Segundos desde 1970 de una columna UTC sin zona, calculados en la base de datos"""
+    if db.get_bind().dialect.name == 'sqlite':
+        return (func.julianday(column) - 2440587.5) * 86400.0
+    return extract('epoch', column)
+
+
+def fetch_confidence_timeline(
+    db: Session,
+    user_id: int,
+    points: int = TIMELINE_DEFAULT_POINTS,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    emotion: Optional[str] = None,
+    zone: Optional[ZoneInfo] = None,
+) -> TimelineResponse:
+    """
+    Línea de tiempo de confidence por análisis reducida a `points` puntos con LTTB.
+    Las filas llegan por lotes (yield_per) directamente a arreglos de NumPy; solo
+    los puntos elegidos se convierten en objetos de respuesta.
+    Las fechas sin zona del rango y las de la respuesta están en hora local de zone.
+    """
+    zone = zone or ZoneInfo(DEFAULT_TIMEZONE)
+    points = max(3, min(points, TIMELINE_MAX_POINTS))
+    date_from = to_naive_utc(date_from, zone)
+    date_to = to_naive_utc(date_to, zone)
+    emotion_ids = emotion_catalog.ids_for(db, emotion) if emotion and emotion != 'all' else None
+
+    stmt = select(
+        _epoch_seconds(db, Analysis.fecha_analisis),
+        func.coalesce(Analysis.confidence, 0.0),
+        Analysis.id,
+        Analysis.id_emocion,
+    ).where(
+        Analysis.id_usuario == user_id,
+        Analysis.fecha_analisis.isnot(None),
+    )
+    if emotion_ids is not None:
+        stmt = stmt.where(Analysis.id_emocion.in_(emotion_ids))
+    if date_from:
+        stmt = stmt.where(Analysis.fecha_analisis >= date_from)
+    if date_to:
+        stmt = stmt.where(Analysis.fecha_analisis < date_to)
+    stmt = stmt.order_by(Analysis.fecha_analisis, Analysis.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    chunks = [np.asarray(batch, dtype=np.float64) for batch in db.execute(stmt).partitions()]
+    data = np.concatenate(chunks) if chunks else np.empty((0, 4))
+
+    selected = lttb_indices(data[:, 0], data[:, 1], points)
+    chosen = data[selected]
+    return TimelineResponse(
+        timezone=zone.key,
+        total_points=len(data),
+        points=len(chosen),
+        ids=chosen[:, 2].astype(np.int64).tolist(),
+        dates=[
+            datetime.fromtimestamp(round(ts, 3), zone).replace(tzinfo=None)
+            for ts in chosen[:, 0].tolist()
+        ],
+        confidence=chosen[:, 1].tolist(),
+        emotions=[emotion_catalog.name_for(db, int(eid)) or str(int(eid)) for eid in chosen[:, 3].tolist()],
+    )
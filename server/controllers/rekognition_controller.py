@@ -1,5 +1,6 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from server.services.aws_rekognition_service import rekognition_service
+from server.services.face_result_cache import face_result_cache
 from server.schemas.rekognition import (
     FaceDetectionResponse,
     LabelDetectionResponse,
@@ -13,6 +14,14 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/rekognition", tags=["AWS Rekognition"])
 
+@router.get("/metrics")
+async def rekognition_metrics():
+    """
+    Estado del pool de Rekognition (llamadas en cola, en curso, errores y timeouts)
+    y del caché de resultados del análisis de emociones
+    """
+    return {**rekognition_service.metrics(), "result_cache": face_result_cache.stats()}
+
 @router.post("/detect-faces", response_model=FaceDetectionResponse)
 async def detect_faces(file: UploadFile = File(...)):
     """
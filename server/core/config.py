@@ -27,6 +27,34 @@ class Settings(BaseSettings):
     AWS_REKOGNITION_MAX_LABELS: int = 10
     AWS_REKOGNITION_MIN_CONFIDENCE: float = 75.0
     AWS_REKOGNITION_SIMILARITY_THRESHOLD: float = 90.0
+    # Llamadas simultáneas a Rekognition (tamaño del pool) y timeout por llamada
+    AWS_REKOGNITION_MAX_CONCURRENCY: int = 8
+    AWS_REKOGNITION_TIMEOUT_SECONDS: float = 10.0
+
+    # Tamaño máximo de la imagen recibida para el análisis de emociones
+    ANALYSIS_MAX_IMAGE_BYTES: int = 10 * 1024 * 1024
+    # Preprocesado antes de Rekognition: lado mayor máximo, calidad JPEG e hilos del pool
+    ANALYSIS_PREPROCESS_MAX_EDGE: int = 1280
+    ANALYSIS_PREPROCESS_JPEG_QUALITY: int = 85
+    ANALYSIS_PREPROCESS_WORKERS: int = 2
+    # Caché de resultados de Rekognition: exactos por SHA-256 y casi iguales por dHash
+    # (distancia de Hamming máxima sobre 64 bits; -1 desactiva los casi iguales)
+    ANALYSIS_RESULT_CACHE_TTL_SECONDS: int = 600
+    ANALYSIS_RESULT_CACHE_MAX_ENTRIES: int = 1024
+    ANALYSIS_RESULT_CACHE_MAX_DISTANCE: int = 6
+    # /v1/analysis/analyze-batch: imágenes por petición e imágenes analizadas a la vez
+    ANALYSIS_BATCH_MAX_IMAGES: int = 8
+    ANALYSIS_BATCH_CONCURRENCY: int = 4
+
+    # Caché de analíticas ("memory" por proceso o "redis" compartido entre workers)
+    ANALYTICS_CACHE_BACKEND: str = "memory"
+    ANALYTICS_CACHE_URL: str | None = None
+    ANALYTICS_CACHE_TTL_SECONDS: int = 300
+    ANALYTICS_CACHE_MAX_ENTRIES: int = 2048
+
+    # Analíticas globales: emails con acceso (separados por coma) y frecuencia del job (0 = desactivado)
+    ANALYTICS_ADMIN_EMAILS: str = ""
+    GLOBAL_ANALYTICS_REFRESH_SECONDS: int = 300
 
     model_config = SettingsConfigDict(
         env_file = os.path.join(BASE_DIR, '.env'),
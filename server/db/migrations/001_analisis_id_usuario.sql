@@ -0,0 +1,22 @@
+-- Copia el dueño de la sesión en cada análisis para poder filtrar por usuario
+-- sin cargar antes todas sus sesiones (analisis.ID_sesion IN (...)).
+--
+-- Ejecutar una vez sobre una base existente:
+--   psql "$DATABASE_URL" -f server/db/migrations/001_analisis_id_usuario.sql
+
+BEGIN;
+
+ALTER TABLE analisis ADD COLUMN IF NOT EXISTS ID_usuario INTEGER REFERENCES usuario(id) ON DELETE CASCADE;
+
+UPDATE analisis a
+SET ID_usuario = s.ID_usuario
+FROM sesion s
+WHERE a.ID_sesion = s.id
+  AND a.ID_usuario IS NULL;
+
+ALTER TABLE analisis ALTER COLUMN ID_usuario SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_analisis_usuario_fecha ON analisis(ID_usuario, fecha_analisis, id);
+DROP INDEX IF EXISTS idx_analisis_sesion_fecha;
+
+COMMIT;
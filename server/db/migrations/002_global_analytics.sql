@@ -0,0 +1,28 @@
+-- Tablas de analíticas globales (vista de administración).
+-- El job incremental las llena desde analisis.id > ultimo_id, empezando por 0.
+--
+-- Ejecutar una vez sobre una base existente:
+--   psql "$DATABASE_URL" -f server/db/migrations/002_global_analytics.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS resumen_global_hora (
+    hora TIMESTAMP NOT NULL,
+    ID_emocion INTEGER NOT NULL REFERENCES emocion(id) ON DELETE CASCADE,
+    total INTEGER NOT NULL DEFAULT 0,
+    suma_confidence FLOAT NOT NULL DEFAULT 0.0,
+    PRIMARY KEY (hora, ID_emocion)
+);
+
+CREATE TABLE IF NOT EXISTS usuarios_global_hora (
+    hora TIMESTAMP PRIMARY KEY,
+    sketch BYTEA NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS estado_job_analiticas (
+    nombre VARCHAR(50) PRIMARY KEY,
+    ultimo_id INTEGER NOT NULL DEFAULT 0,
+    actualizado TIMESTAMP
+);
+
+COMMIT;
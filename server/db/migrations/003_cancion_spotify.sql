@@ -0,0 +1,26 @@
+-- Columnas de la canción de Spotify guardadas en cancion (antes solo título, artista y álbum).
+-- ID_emocion pasa a ser opcional y los textos admiten nombres más largos.
+--
+-- Ejecutar una vez sobre una base existente:
+--   psql "$DATABASE_URL" -f server/db/migrations/003_cancion_spotify.sql
+
+BEGIN;
+
+ALTER TABLE cancion ALTER COLUMN ID_emocion DROP NOT NULL;
+ALTER TABLE cancion ALTER COLUMN titulo TYPE VARCHAR(255);
+ALTER TABLE cancion ALTER COLUMN artista TYPE VARCHAR(255);
+ALTER TABLE cancion ALTER COLUMN album TYPE VARCHAR(255);
+
+ALTER TABLE cancion ADD COLUMN IF NOT EXISTS spotify_id VARCHAR(64);
+ALTER TABLE cancion ADD COLUMN IF NOT EXISTS uri VARCHAR(255);
+ALTER TABLE cancion ADD COLUMN IF NOT EXISTS external_url VARCHAR(512);
+ALTER TABLE cancion ADD COLUMN IF NOT EXISTS preview_url VARCHAR(512);
+ALTER TABLE cancion ADD COLUMN IF NOT EXISTS duration_ms INTEGER;
+ALTER TABLE cancion ADD COLUMN IF NOT EXISTS popularity INTEGER;
+ALTER TABLE cancion ADD COLUMN IF NOT EXISTS album_data JSONB;
+ALTER TABLE cancion ADD COLUMN IF NOT EXISTS artists JSONB;
+ALTER TABLE cancion ADD COLUMN IF NOT EXISTS track_raw JSONB;
+
+CREATE INDEX IF NOT EXISTS idx_cancion_spotify_id ON cancion(spotify_id);
+
+COMMIT;
@@ -0,0 +1,27 @@
+-- Tablas derivadas que save-analysis mantiene en la misma transacción del análisis.
+--
+-- Ejecutar una vez sobre una base existente y después reconstruirlas desde analisis:
+--   psql "$DATABASE_URL" -f server/db/migrations/004_resumen_rachas.sql
+--   python -m server.services.analytics_rollup backfill
+
+BEGIN;
+
+-- Resumen diario por usuario y emoción
+CREATE TABLE IF NOT EXISTS resumen_emocion_diario (
+    ID_usuario INTEGER NOT NULL REFERENCES usuario(id) ON DELETE CASCADE,
+    dia DATE NOT NULL,
+    ID_emocion INTEGER NOT NULL REFERENCES emocion(id) ON DELETE CASCADE,
+    total INTEGER NOT NULL DEFAULT 0,
+    suma_confidence FLOAT NOT NULL DEFAULT 0.0,
+    horas JSONB NOT NULL,
+    PRIMARY KEY (ID_usuario, dia, ID_emocion)
+);
+
+-- Racha de días consecutivos por usuario
+CREATE TABLE IF NOT EXISTS racha_usuario (
+    ID_usuario INTEGER PRIMARY KEY REFERENCES usuario(id) ON DELETE CASCADE,
+    racha INTEGER NOT NULL DEFAULT 0,
+    ultimo_dia DATE
+);
+
+COMMIT;
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, TIMESTAMP, ForeignKey, String, Float, JSON
+from sqlalchemy import Column, Integer, TIMESTAMP, ForeignKey, String, Float, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from server.db.base import Base
@@ -17,6 +17,8 @@ class Analysis(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     id_sesion = Column(Integer, ForeignKey("sesion.id", ondelete="CASCADE"), nullable=False)
+    # Dueño del análisis (copia de sesion.id_usuario) para filtrar sin pasar por sesion
+    id_usuario = Column(Integer, ForeignKey("usuario.id", ondelete="CASCADE"), nullable=False)
     id_emocion = Column(Integer, ForeignKey("emocion.id", ondelete="CASCADE"), nullable=False)
     fecha_analisis = Column(TIMESTAMP, default=datetime.utcnow)
     
@@ -26,4 +28,36 @@ class Analysis(Base):
     recommendations = Column(JSON)    # Para guardar las recomendaciones musicales
     
     session = relationship("Session", foreign_keys=[id_sesion])
-    emotion = relationship("Emotion", back_populates="analyses")
\ No newline at end of file
+    emotion = relationship("Emotion", back_populates="analyses")
+    # Canciones vinculadas (usar selectinload para cargarlas en lote)
+    songs = relationship("Cancion", secondary="analisis_cancion", order_by="Cancion.id", viewonly=True)
+
+    __table_args__ = (
+        Index("idx_analisis_usuario_fecha", "id_usuario", "fecha_analisis", "id"),
+    )
+
+class Cancion(Base):
+    __tablename__ = "cancion"
+
+    id = Column(Integer, primary_key=True, index=True)
+    id_emocion = Column(Integer, ForeignKey("emocion.id", ondelete="CASCADE"), nullable=True)
+    titulo = Column(String(255), nullable=False)
+    artista = Column(String(255))
+    album = Column(String(255))
+
+    # Metadatos de Spotify guardados al vincular recomendaciones
+    spotify_id = Column(String(64), index=True)
+    uri = Column(String(255))
+    external_url = Column(String(512))
+    preview_url = Column(String(512))
+    duration_ms = Column(Integer)
+    popularity = Column(Integer)
+    album_data = Column(JSON)
+    artists = Column(JSON)
+    track_raw = Column(JSON)  # Track completo tal como lo devolvió Spotify
+
+class AnalisisCancion(Base):
+    __tablename__ = "analisis_cancion"
+
+    ID_analisis = Column('id_analisis', Integer, ForeignKey("analisis.id", ondelete="CASCADE"), primary_key=True)
+    ID_cancion = Column('id_cancion', Integer, ForeignKey("cancion.id", ondelete="CASCADE"), primary_key=True)
@@ -0,0 +1,45 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey, Float, JSON, String, TIMESTAMP, LargeBinary
+from server.db.base import Base
+
+class EmotionDailyRollup(Base):
+    """Resumen por (usuario, día, emoción) mantenido al guardar cada análisis"""
+    __tablename__ = "resumen_emocion_diario"
+
+    id_usuario = Column(Integer, ForeignKey("usuario.id", ondelete="CASCADE"), primary_key=True)
+    dia = Column(Date, primary_key=True)
+    id_emocion = Column(Integer, ForeignKey("emocion.id", ondelete="CASCADE"), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    suma_confidence = Column(Float, nullable=False, default=0.0)
+    horas = Column(JSON, nullable=False)  # 24 contadores, uno por hora del día (UTC)
+
+class UserStreak(Base):
+    """Racha actual del usuario (días consecutivos que terminan en ultimo_dia)"""
+    __tablename__ = "racha_usuario"
+
+    id_usuario = Column(Integer, ForeignKey("usuario.id", ondelete="CASCADE"), primary_key=True)
+    racha = Column(Integer, nullable=False, default=0)
+    ultimo_dia = Column(Date, nullable=True)
+
+class GlobalEmotionHourly(Base):
+    """Conteo global (todos los usuarios) por hora UTC y emoción"""
+    __tablename__ = "resumen_global_hora"
+
+    hora = Column(TIMESTAMP, primary_key=True)  # Inicio de la hora (UTC)
+    id_emocion = Column(Integer, ForeignKey("emocion.id", ondelete="CASCADE"), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    suma_confidence = Column(Float, nullable=False, default=0.0)
+
+class GlobalHourlyUsers(Base):
+    """Usuarios activos por hora UTC como sketch HyperLogLog"""
+    __tablename__ = "usuarios_global_hora"
+
+    hora = Column(TIMESTAMP, primary_key=True)
+    sketch = Column(LargeBinary, nullable=False)
+
+class AnalyticsJobState(Base):
+    """Marca de agua (último analisis.id procesado) de cada job incremental"""
+    __tablename__ = "estado_job_analiticas"
+
+    nombre = Column(String(50), primary_key=True)
+    ultimo_id = Column(Integer, nullable=False, default=0)
+    actualizado = Column(TIMESTAMP, nullable=True)
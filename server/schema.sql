@@ -5,6 +5,11 @@ DROP TABLE IF EXISTS sesion CASCADE;
 DROP TABLE IF EXISTS cancion CASCADE;
 DROP TABLE IF EXISTS analisis CASCADE;
 DROP TABLE IF EXISTS analisis_cancion CASCADE;
+DROP TABLE IF EXISTS resumen_emocion_diario CASCADE;
+DROP TABLE IF EXISTS racha_usuario CASCADE;
+DROP TABLE IF EXISTS resumen_global_hora CASCADE;
+DROP TABLE IF EXISTS usuarios_global_hora CASCADE;
+DROP TABLE IF EXISTS estado_job_analiticas CASCADE;
 
 CREATE TABLE usuario (
     id SERIAL PRIMARY KEY,
@@ -29,6 +34,7 @@ CREATE TABLE sesion(
 CREATE TABLE analisis (
     id SERIAL PRIMARY KEY,
     ID_sesion INTEGER NOT NULL REFERENCES sesion(id) ON DELETE CASCADE,
+    ID_usuario INTEGER NOT NULL REFERENCES usuario(id) ON DELETE CASCADE,
     ID_emocion INTEGER NOT NULL REFERENCES emocion(id) ON DELETE CASCADE,
     fecha_analisis TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     confidence FLOAT DEFAULT 0.0,
@@ -38,10 +44,19 @@ CREATE TABLE analisis (
 
 CREATE TABLE cancion (
     id SERIAL PRIMARY KEY,
-    ID_emocion INTEGER NOT NULL REFERENCES emocion(id) ON DELETE CASCADE,
-    titulo VARCHAR(100) NOT NULL,
-    artista VARCHAR(100),
-    album VARCHAR(100)
+    ID_emocion INTEGER REFERENCES emocion(id) ON DELETE CASCADE,
+    titulo VARCHAR(255) NOT NULL,
+    artista VARCHAR(255),
+    album VARCHAR(255),
+    spotify_id VARCHAR(64),
+    uri VARCHAR(255),
+    external_url VARCHAR(512),
+    preview_url VARCHAR(512),
+    duration_ms INTEGER,
+    popularity INTEGER,
+    album_data JSONB,
+    artists JSONB,
+    track_raw JSONB
 );
 
 CREATE TABLE analisis_cancion (
@@ -50,6 +65,46 @@ CREATE TABLE analisis_cancion (
     PRIMARY KEY (ID_analisis, ID_cancion)
 );
 
+-- Resumen diario por usuario y emoción (lo mantiene save-analysis)
+CREATE TABLE resumen_emocion_diario (
+    ID_usuario INTEGER NOT NULL REFERENCES usuario(id) ON DELETE CASCADE,
+    dia DATE NOT NULL,
+    ID_emocion INTEGER NOT NULL REFERENCES emocion(id) ON DELETE CASCADE,
+    total INTEGER NOT NULL DEFAULT 0,
+    suma_confidence FLOAT NOT NULL DEFAULT 0.0,
+    horas JSONB NOT NULL,
+    PRIMARY KEY (ID_usuario, dia, ID_emocion)
+);
+
+-- Racha de días consecutivos por usuario (lectura por clave primaria)
+CREATE TABLE racha_usuario (
+    ID_usuario INTEGER PRIMARY KEY REFERENCES usuario(id) ON DELETE CASCADE,
+    racha INTEGER NOT NULL DEFAULT 0,
+    ultimo_dia DATE
+);
+
+-- Agregados globales por hora (todos los usuarios), actualizados por un job incremental
+CREATE TABLE resumen_global_hora (
+    hora TIMESTAMP NOT NULL,
+    ID_emocion INTEGER NOT NULL REFERENCES emocion(id) ON DELETE CASCADE,
+    total INTEGER NOT NULL DEFAULT 0,
+    suma_confidence FLOAT NOT NULL DEFAULT 0.0,
+    PRIMARY KEY (hora, ID_emocion)
+);
+
+-- Usuarios activos por hora como sketch HyperLogLog
+CREATE TABLE usuarios_global_hora (
+    hora TIMESTAMP PRIMARY KEY,
+    sketch BYTEA NOT NULL
+);
+
+-- Marca de agua (último analisis.id procesado) de cada job
+CREATE TABLE estado_job_analiticas (
+    nombre VARCHAR(50) PRIMARY KEY,
+    ultimo_id INTEGER NOT NULL DEFAULT 0,
+    actualizado TIMESTAMP
+);
+
 -- Tabla para códigos de recuperación de contraseña
 CREATE TABLE recuperacion_contrasena (
     id SERIAL PRIMARY KEY,
@@ -65,6 +120,8 @@ CREATE TABLE recuperacion_contrasena (
 CREATE INDEX IF NOT EXISTS idx_recovery_code ON recuperacion_contrasena(codigo, ID_usuario, usado);
 CREATE INDEX IF NOT EXISTS idx_recovery_expires ON recuperacion_contrasena(hora_expiracion);
 CREATE INDEX IF NOT EXISTS idx_analisis_sesion ON analisis(ID_sesion);
+CREATE INDEX IF NOT EXISTS idx_analisis_usuario_fecha ON analisis(ID_usuario, fecha_analisis, id);
 CREATE INDEX IF NOT EXISTS idx_analisis_emocion ON analisis(ID_emocion);
 CREATE INDEX IF NOT EXISTS idx_analisis_cancion_analisis ON analisis_cancion(ID_analisis);
-CREATE INDEX IF NOT EXISTS idx_analisis_cancion_cancion ON analisis_cancion(ID_cancion);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_analisis_cancion_cancion ON analisis_cancion(ID_cancion);
+CREATE INDEX IF NOT EXISTS idx_cancion_spotify_id ON cancion(spotify_id);
\ No newline at end of file
@@ -0,0 +1,117 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class EmotionStats(BaseModel):
+    emotion: str
+    count: int
+    percentage: float
+
+class WeeklyActivity(BaseModel):
+    day: str
+    analyses_count: int
+
+class WeeklyEmotionData(BaseModel):
+    week_start: str
+    emotions: Dict[str, int]
+
+class UserStats(BaseModel):
+    total_analyses: int
+    most_frequent_emotion: Optional[str]
+    average_confidence: float
+    streak: int
+    emotions_distribution: List[EmotionStats]
+    weekly_activity: List[WeeklyActivity]
+    hourly_activity: List[int]
+    weekly_emotions: List[WeeklyEmotionData]
+    positive_negative_balance: Dict[str, int]
+
+class AnalysisHistory(BaseModel):
+    id: str
+    emotion: str
+    confidence: float
+    date: datetime
+    emotions_detected: Dict[str, float]
+
+class AnalysisHistoryResponse(BaseModel):
+    analyses: List[AnalysisHistory]
+    total: Optional[int] = None  # None cuando se pide count=none
+    total_is_estimate: bool = False
+    next_cursor: Optional[str] = None  # Se envía como ?cursor= para la siguiente página
+
+class AnalysisDetail(BaseModel):
+    id: int
+    emotion: str
+    confidence: float
+    date: datetime
+    emotions_detected: Dict[str, float]
+    session_id: int
+    recommendations: List[Dict] = []  # 🆕 Agregar recomendaciones
+
+class AnalysisBatchRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=50)
+
+class AnalysisBatchResponse(BaseModel):
+    analyses: List[AnalysisDetail]
+    missing: List[int] = []  # Ids que no existen o no pertenecen al usuario
+
+class TimeSeriesResponse(BaseModel):
+    granularity: str
+    timezone: str
+    date_from: datetime  # Hora local, inclusivo
+    date_to: datetime  # Hora local, exclusivo
+    buckets: List[datetime]  # Inicio de cada bucket en hora local
+    total: List[int]  # Alineado con buckets
+    emotions: Dict[str, List[int]]  # Conteos por emoción, alineados con buckets
+
+class HeatmapResponse(BaseModel):
+    timezone: str
+    days: List[str]  # Etiquetas de las filas (lunes a domingo)
+    total: List[List[int]]  # 7 filas × 24 horas
+    emotions: Dict[str, List[List[int]]]  # Misma matriz 7×24 por emoción
+
+class TransitionMatrixResponse(BaseModel):
+    scope: str
+    timezone: str
+    max_gap_minutes: Optional[int] = None
+    emotions: List[str]  # Ejes de la matriz: filas = emoción anterior, columnas = siguiente
+    counts: List[List[int]]
+    probabilities: List[List[float]]  # Cada fila suma 1 (o 0 si no hay transiciones)
+    total_transitions: int
+
+class ConfidenceDistribution(BaseModel):
+    emotion: str
+    count: int
+    average_confidence: float
+    p10: Optional[float] = None
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    histogram: List[int]  # Conteo por bin de confidence, ver bin_edges
+    average_components: Dict[str, float]  # Promedio de cada emoción en emotions_detected
+
+class ConfidenceStatsResponse(BaseModel):
+    bins: int
+    bin_edges: List[float]  # bins + 1 límites entre 0 y 1
+    emotions: List[ConfidenceDistribution]
+
+class GlobalAnalyticsResponse(BaseModel):
+    date_from: datetime  # UTC, inclusivo
+    date_to: datetime  # UTC, exclusivo
+    total_analyses: int
+    average_confidence: float
+    emotions_distribution: List[EmotionStats]
+    hours: List[datetime]  # Inicio de cada hora UTC del rango
+    analyses_per_hour: List[int]  # Alineado con hours
+    distinct_users_estimate: int  # Aproximado (HyperLogLog)
+    high_water_mark: int  # Último analisis.id incluido en los agregados
+    refreshed_at: Optional[datetime] = None
+
+class TimelineResponse(BaseModel):
+    timezone: str
+    total_points: int  # Análisis en el rango antes de reducir
+    points: int
+    ids: List[int]  # Arreglos alineados, ordenados por fecha
+    dates: List[datetime]  # Hora local de timezone
+    confidence: List[float]
+    emotions: List[str]
@@ -0,0 +1,203 @@
+"""
+Caché de resultados de analíticas por usuario.
+
+Cada usuario tiene un número de versión; las entradas se guardan bajo
+(usuario, versión, clave). save-analysis incrementa la versión después del
+commit, así que cualquier resultado calculado antes queda inalcanzable aunque
+otra petición lo escriba tarde. Las entradas viejas salen por TTL o LRU.
+En memoria las versiones salen de un contador global; las de usuarios sin
+entradas se olvidan cuando hay más de max_entries, subiendo la versión base.
+
+Backends:
+- MemoryAnalyticsCache: diccionario LRU en el proceso (un solo worker).
+- RedisAnalyticsCache: cualquier cliente compatible con redis-py (varios workers).
+  El límite de memoria lo aplica Redis (maxmemory-policy allkeys-lru).
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from server.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryAnalyticsCache:
+    def __init__(self, ttl_seconds: int, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._versions: Dict[int, int] = {}  # Solo usuarios invalidados; el resto usa _floor
+        self._generation = 0  # Última versión entregada por invalidate (global, creciente)
+        self._floor = 0  # Versión de los usuarios sin entrada en _versions
+        self._user_keys: Dict[int, set] = {}  # Claves guardadas de cada usuario, para invalidar sin recorrer todo
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self, user_id: int) -> int:
+        with self._lock:
+            return self._versions.get(user_id, self._floor)
+
+    def get(self, user_id: int, key: str, version: int) -> Optional[Any]:
+        entry_key = (user_id, version, key)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    self._remove(entry_key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id: int, key: str, value: Any, version: int) -> None:
+        entry_key = (user_id, version, key)
+        with self._lock:
+            if self._versions.get(user_id, self._floor) != version:
+                return  # Calculado con datos anteriores a la última invalidación
+            self._entries[entry_key] = (self._clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(entry_key)
+            self._user_keys.setdefault(user_id, set()).add(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_key: tuple) -> None:
+        """Borra una entrada y su referencia en el índice por usuario (con el lock tomado)"""
+        self._entries.pop(entry_key, None)
+        keys = self._user_keys.get(entry_key[0])
+        if keys is not None:
+            keys.discard(entry_key)
+            if not keys:
+                del self._user_keys[entry_key[0]]
+
+    def _prune_versions(self) -> None:
+        """
+        Olvida las versiones de los usuarios sin entradas (con el lock tomado).
+        La versión base pasa a la última entregada, así un cálculo que empezó
+        antes de una invalidación olvidada sigue sin poder escribir; los usuarios
+        con entradas conservan explícitamente la base anterior.
+        """
+        for user_id in self._user_keys:
+            self._versions.setdefault(user_id, self._floor)
+        self._versions = {user_id: v for user_id, v in self._versions.items() if user_id in self._user_keys}
+        self._floor = self._generation
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            self._versions[user_id] = self._generation
+            # Solo las entradas del usuario: O(claves del usuario), no O(caché)
+            for entry_key in self._user_keys.pop(user_id, ()):
+                self._entries.pop(entry_key, None)
+            if len(self._versions) > self.max_entries:
+                self._prune_versions()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "versions": len(self._versions),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+class RedisAnalyticsCache:
+    def __init__(self, client, ttl_seconds: int, prefix: str = "anima:analytics"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _version_key(self, user_id: int) -> str:
+        return f"{self.prefix}:ver:{user_id}"
+
+    def _entry_key(self, user_id: int, key: str, version: int) -> str:
+        return f"{self.prefix}:{user_id}:{version}:{key}"
+
+    def version(self, user_id: int) -> int:
+        value = self.client.get(self._version_key(user_id))
+        return int(value) if value is not None else 0
+
+    def get(self, user_id: int, key: str, version: int) -> Optional[Any]:
+        raw = self.client.get(self._entry_key(user_id, key, version))
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(raw)
+
+    def set(self, user_id: int, key: str, value: Any, version: int) -> None:
+        self.client.set(self._entry_key(user_id, key, version), json.dumps(value, default=str), ex=self.ttl_seconds)
+
+    def invalidate(self, user_id: int) -> None:
+        self.client.incr(self._version_key(user_id))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "redis",
+                "hits": self.hits,
+                "misses": self.misses,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+def get_or_compute(cache, user_id: int, key: str, compute: Callable[[], Any]) -> Any:
+    """
+    Devuelve el valor cacheado o lo calcula y lo guarda bajo la versión leída
+    antes de calcular. Un error del backend nunca rompe la petición.
+    """
+    try:
+        version = cache.version(user_id)
+        cached = cache.get(user_id, key, version)
+    except Exception as e:
+        logger.warning(f"Analytics cache unavailable: {e}")
+        return compute()
+
+    if cached is not None:
+        return cached
+
+    value = compute()
+    try:
+        cache.set(user_id, key, value, version)
+    except Exception as e:
+        logger.warning(f"Analytics cache write failed: {e}")
+    return value
+
+
+def invalidate_user(cache, user_id: int) -> None:
+    try:
+        cache.invalidate(user_id)
+    except Exception as e:
+        logger.warning(f"Analytics cache invalidation failed for user {user_id}: {e}")
+
+
+def build_analytics_cache():
+    backend = (settings.ANALYTICS_CACHE_BACKEND or "memory").lower()
+    if backend == "redis":
+        if not settings.ANALYTICS_CACHE_URL:
+            raise RuntimeError("ANALYTICS_CACHE_URL es obligatorio con ANALYTICS_CACHE_BACKEND=redis")
+        import redis  # Solo se necesita con el backend compartido
+
+        client = redis.Redis.from_url(settings.ANALYTICS_CACHE_URL)
+        return RedisAnalyticsCache(client, settings.ANALYTICS_CACHE_TTL_SECONDS)
+    return MemoryAnalyticsCache(settings.ANALYTICS_CACHE_TTL_SECONDS, settings.ANALYTICS_CACHE_MAX_ENTRIES)
+
+
+# Instancia global del caché
+analytics_cache = build_analytics_cache()
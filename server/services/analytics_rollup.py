@@ -0,0 +1,195 @@
+"""
+Mantenimiento de las tablas derivadas de analisis (resumen_emocion_diario y racha_usuario).
+
+save-analysis las actualiza en la misma transacción que el INSERT del análisis.
+Para reconstruirlas o verificarlas contra la tabla analisis:
+
+    python -m server.services.analytics_rollup backfill [--user-id ID]
+    python -m server.services.analytics_rollup check [--user-id ID]
+"""
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from server.controllers.analytics_controller import fetch_raw_rollup_rows, fetch_latest_streak
+from server.db.models.analysis import Analysis
+from server.db.models.analytics import EmotionDailyRollup, UserStreak
+from server.db.models.user import User
+
+logger = logging.getLogger(__name__)
+
+CONFIDENCE_TOLERANCE = 1e-6
+
+
+def record_analysis(db: Session, user_id: int, analysis: Analysis) -> EmotionDailyRollup:
+    """
+    Suma un análisis recién creado al resumen (usuario, día, emoción).
+    No hace commit: el llamador confirma el análisis y el resumen juntos.
+    """
+    when = analysis.fecha_analisis or datetime.utcnow()
+    key = dict(id_usuario=user_id, dia=when.date(), id_emocion=analysis.id_emocion)
+
+    row = db.query(EmotionDailyRollup).filter_by(**key).with_for_update().first()
+    if not row:
+        try:
+            # Savepoint: si otra petición crea la fila a la vez, reintentamos como UPDATE
+            with db.begin_nested():
+                row = EmotionDailyRollup(**key, total=0, suma_confidence=0.0, horas=[0] * 24)
+                db.add(row)
+        except IntegrityError:
+            row = db.query(EmotionDailyRollup).filter_by(**key).with_for_update().first()
+
+    hours = list(row.horas or [0] * 24)
+    hours[when.hour] += 1
+    row.total = (row.total or 0) + 1
+    row.suma_confidence = (row.suma_confidence or 0.0) + (analysis.confidence or 0.0)
+    row.horas = hours  # Reasignar para que SQLAlchemy detecte el cambio en el JSON
+    return row
+
+
+def rebuild_streak(db: Session, user_id: int) -> UserStreak:
+    """Recalcula la racha guardada con la consulta gaps-and-islands. No hace commit"""
+    last_day, length = fetch_latest_streak(db, user_id)
+    row = db.get(UserStreak, user_id)
+    if not row:
+        row = UserStreak(id_usuario=user_id)
+        db.add(row)
+    row.ultimo_dia = last_day
+    row.racha = length
+    return row
+
+
+def record_streak_day(db: Session, user_id: int, day: date) -> UserStreak:
+    """
+    Actualiza la racha guardada en O(1) con un nuevo día activo. No hace commit.
+    Solo un análisis con fecha anterior al último día obliga a recalcular en SQL.
+    """
+    query = db.query(UserStreak).filter_by(id_usuario=user_id).with_for_update()
+    row = query.first()
+    if not row:
+        db.flush()
+        try:
+            with db.begin_nested():
+                return rebuild_streak(db, user_id)
+        except IntegrityError:
+            row = query.first()
+
+    if row.ultimo_dia is None or day > row.ultimo_dia + timedelta(days=1):
+        row.racha = 1
+        row.ultimo_dia = day
+    elif day == row.ultimo_dia + timedelta(days=1):
+        row.racha = (row.racha or 0) + 1
+        row.ultimo_dia = day
+    elif day < row.ultimo_dia:
+        db.flush()
+        return rebuild_streak(db, user_id)
+    return row
+
+
+def backfill_rollups(db: Session, user_id: Optional[int] = None) -> int:
+    """Reconstruye el resumen desde la tabla analisis. Devuelve las filas escritas"""
+    raw = fetch_raw_rollup_rows(db, user_id)
+
+    query = db.query(EmotionDailyRollup)
+    if user_id is not None:
+        query = query.filter(EmotionDailyRollup.id_usuario == user_id)
+    query.delete(synchronize_session=False)
+
+    written = 0
+    for (owner_id, day, emotion_id), (total, confidence_sum, hours) in raw.items():
+        if day is None:
+            continue
+        db.add(EmotionDailyRollup(
+            id_usuario=owner_id,
+            dia=day,
+            id_emocion=emotion_id,
+            total=total,
+            suma_confidence=confidence_sum,
+            horas=hours,
+        ))
+        written += 1
+
+    # Las rachas se recalculan para los mismos usuarios
+    if user_id is not None:
+        rebuild_streak(db, user_id)
+    else:
+        for (owner_id,) in db.query(User.id).all():
+            rebuild_streak(db, owner_id)
+
+    db.commit()
+    return written
+
+
+def check_rollups(db: Session, user_id: Optional[int] = None) -> List[Dict]:
+    """Compara el resumen y las rachas con los análisis crudos y devuelve las diferencias"""
+    raw = {key: value for key, value in fetch_raw_rollup_rows(db, user_id).items() if key[1] is not None}
+
+    query = db.query(EmotionDailyRollup)
+    if user_id is not None:
+        query = query.filter(EmotionDailyRollup.id_usuario == user_id)
+    stored = {
+        (row.id_usuario, row.dia, row.id_emocion): [row.total, row.suma_confidence, list(row.horas or [])]
+        for row in query.all()
+    }
+
+    mismatches = []
+    for key in sorted(set(raw) | set(stored), key=lambda k: (k[0], k[1] or date.min, k[2])):
+        expected = raw.get(key)
+        actual = stored.get(key)
+        if (
+            expected is None
+            or actual is None
+            or expected[0] != actual[0]
+            or abs(expected[1] - actual[1]) > CONFIDENCE_TOLERANCE
+            or expected[2] != actual[2]
+        ):
+            mismatches.append({
+                'user_id': key[0],
+                'day': key[1].isoformat() if key[1] else None,
+                'emotion_id': key[2],
+                'expected': expected,
+                'stored': actual,
+            })
+
+    streaks = db.query(UserStreak)
+    if user_id is not None:
+        streaks = streaks.filter(UserStreak.id_usuario == user_id)
+    for row in streaks.all():
+        last_day, length = fetch_latest_streak(db, row.id_usuario)
+        if (row.ultimo_dia, row.racha) != (last_day, length):
+            mismatches.append({
+                'user_id': row.id_usuario,
+                'streak_expected': [last_day.isoformat() if last_day else None, length],
+                'streak_stored': [row.ultimo_dia.isoformat() if row.ultimo_dia else None, row.racha],
+            })
+    return mismatches
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mantenimiento del resumen diario de emociones")
+    parser.add_argument("command", choices=["backfill", "check"])
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    from server.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if args.command == "backfill":
+            written = backfill_rollups(db, args.user_id)
+            print(f"✅ Resumen reconstruido: {written} filas")
+            return 0
+
+        mismatches = check_rollups(db, args.user_id)
+        for mismatch in mismatches:
+            print(f"❌ {mismatch}")
+        print(f"{'✅' if not mismatches else '⚠️'} Diferencias encontradas: {len(mismatches)}")
+        return 1 if mismatches else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
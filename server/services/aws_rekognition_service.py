@@ -1,19 +1,48 @@
+import asyncio
 import boto3
+import threading
+import time
+from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
 from server.core.config import settings
 import logging
 from typing import Dict, Any, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# Parte del timeout por llamada reservada para abrir la conexión (como máximo 2 s)
+CONNECT_TIMEOUT_SECONDS = 2.0
+
+
+class RekognitionTimeoutError(BotoCoreError):
+    fmt = 'Rekognition call {operation} timed out after {seconds}s'
+
+
 class AWSRekognitionService:
+    """
+    boto3 es síncrono: cada llamada corre en un pool de hilos propio, limitado por
+    un semáforo (AWS_REKOGNITION_MAX_CONCURRENCY) y con un timeout por llamada,
+    para que el event loop siga atendiendo otras peticiones mientras AWS responde.
+    Un solo intento de botocore (conexión + lectura) cabe dentro de ese timeout.
+    """
+
     def __init__(self):
         try:
+            self.max_concurrency = max(1, settings.AWS_REKOGNITION_MAX_CONCURRENCY)
+            self.timeout_seconds = settings.AWS_REKOGNITION_TIMEOUT_SECONDS
+            connect_timeout = min(CONNECT_TIMEOUT_SECONDS, self.timeout_seconds / 4)
             self.client = boto3.client(
                 'rekognition',
                 aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
                 aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_REGION
+                region_name=settings.AWS_REGION,
+                config=Config(
+                    max_pool_connections=self.max_concurrency,
+                    connect_timeout=connect_timeout,
+                    read_timeout=self.timeout_seconds - connect_timeout,
+                    retries={'total_max_attempts': 1}  # Un reintento no terminaría antes del timeout
+                )
             )
             self.default_max_labels = settings.AWS_REKOGNITION_MAX_LABELS
             self.default_min_confidence = settings.AWS_REKOGNITION_MIN_CONFIDENCE
@@ -22,13 +51,109 @@ class AWSRekognitionService:
         except Exception as e:
             logger.error(f"Failed to initialize AWS Rekognition: {str(e)}")
             raise
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="rekognition")
+            return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _call(self, operation: str, **kwargs) -> Dict[str, Any]:
+        """
+        Ejecuta self.client.<operation>(**kwargs) en el pool, sin bloquear el event loop.
+        El permiso del semáforo y in_flight se liberan cuando termina el hilo, no al
+        vencer el timeout: una llamada abandonada sigue ocupando su lugar en el pool.
+        """
+        with self._lock:
+            self.queued += 1
+        semaphore = self._get_semaphore()
+        try:
+            await semaphore.acquire()
+        finally:
+            with self._lock:
+                self.queued -= 1
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            work = self._get_executor().submit(lambda: getattr(self.client, operation)(**kwargs))
+        except Exception:
+            with self._lock:
+                self.in_flight -= 1
+                self.errors += 1
+            semaphore.release()
+            raise
+        work.add_done_callback(lambda _: self._finish_call(loop, semaphore, started))
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(work), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+                self.errors += 1
+            raise RekognitionTimeoutError(operation=operation, seconds=self.timeout_seconds)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+
+    def _finish_call(self, loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore, started: float) -> None:
+        """Callback del hilo del pool al terminar (o cancelarse) la llamada"""
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.total_ms += (time.perf_counter() - started) * 1000
+        try:
+            loop.call_soon_threadsafe(semaphore.release)
+        except RuntimeError:
+            pass  # El loop ya se cerró; su semáforo no se vuelve a usar
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "timeout_seconds": self.timeout_seconds,
+                "queue_depth": self.queued,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "avg_ms": round(self.total_ms / self.completed, 2) if self.completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
     
     async def detect_faces(self, image_bytes: bytes) -> Dict[str, Any]:
         """
         Detecta caras en una imagen con todos los atributos
         """
         try:
-            response = self.client.detect_faces(
+            response = await self._call(
+                'detect_faces',
                 Image={'Bytes': image_bytes},
                 Attributes=['ALL']  # O puedes usar ['DEFAULT'] para menos atributos
             )
@@ -70,7 +195,8 @@ class AWSRekognitionService:
         Detecta etiquetas/objetos en una imagen
         """
         try:
-            response = self.client.detect_labels(
+            response = await self._call(
+                'detect_labels',
                 Image={'Bytes': image_bytes},
                 MaxLabels=max_labels or self.default_max_labels,
                 MinConfidence=min_confidence or self.default_min_confidence
@@ -105,7 +231,8 @@ class AWSRekognitionService:
         Detecta texto en una imagen
         """
         try:
-            response = self.client.detect_text(
+            response = await self._call(
+                'detect_text',
                 Image={'Bytes': image_bytes}
             )
             
@@ -138,7 +265,8 @@ class AWSRekognitionService:
         Compara caras entre dos imágenes
         """
         try:
-            response = self.client.compare_faces(
+            response = await self._call(
+                'compare_faces',
                 SourceImage={'Bytes': source_image_bytes},
                 TargetImage={'Bytes': target_image_bytes},
                 SimilarityThreshold=similarity_threshold or self.default_similarity_threshold
@@ -183,7 +311,8 @@ class AWSRekognitionService:
         Detecta contenido inapropiado en imágenes
         """
         try:
-            response = self.client.detect_moderation_labels(
+            response = await self._call(
+                'detect_moderation_labels',
                 Image={'Bytes': image_bytes},
                 MinConfidence=min_confidence or self.default_min_confidence
             )
@@ -0,0 +1,134 @@
+"""
+Catálogo de emociones (tabla emocion) cargado una vez en memoria.
+
+Se carga al arrancar la app (y crea las emociones básicas que falten).
+Solo vuelve a leer la tabla cuando aparece un nombre o id desconocido,
+por ejemplo una emoción creada por otro worker. Los desconocidos se recuerdan
+MISS_TTL_SECONDS (vienen de query params: un ?emotion= inventado no debe
+recargar la tabla en cada petición); una inserción propia limpia esa lista.
+"""
+import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import Callable, Dict, Hashable, Mapping, Optional, Tuple
+from sqlalchemy.orm import Session
+from server.db.models.analysis import Emotion
+
+logger = logging.getLogger(__name__)
+
+BASIC_EMOTIONS = ('happy', 'sad', 'angry', 'relaxed', 'energetic')
+MISS_TTL_SECONDS = 60
+MAX_MISSES = 1024
+
+
+class EmotionCatalog:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._misses: Dict[Hashable, float] = {}  # nombre o id desconocido -> vence
+        self.reloads = 0
+        self.loaded = False
+        # La tabla no tiene UNIQUE(nombre): un nombre puede tener varios ids
+        self.ids_by_name: Mapping[str, Tuple[int, ...]] = MappingProxyType({})
+        self.names_by_id: Mapping[int, str] = MappingProxyType({})
+
+    def load(self, db: Session, seed: bool = True) -> None:
+        """Lee la tabla completa y reemplaza los mapas (opcionalmente crea las emociones básicas)"""
+        with self._lock:
+            rows = db.query(Emotion.id, Emotion.nombre).order_by(Emotion.id).all()
+            if seed:
+                existing = {nombre for _, nombre in rows}
+                missing = [name for name in BASIC_EMOTIONS if name not in existing]
+                if missing:
+                    db.add_all([Emotion(nombre=name) for name in missing])
+                    db.commit()
+                    rows = db.query(Emotion.id, Emotion.nombre).order_by(Emotion.id).all()
+
+            ids_by_name = {}
+            for emotion_id, nombre in rows:
+                ids_by_name.setdefault(nombre, ())
+                ids_by_name[nombre] += (emotion_id,)
+
+            self.ids_by_name = MappingProxyType(ids_by_name)
+            self.names_by_id = MappingProxyType({emotion_id: nombre for emotion_id, nombre in rows})
+            self.reloads += 1
+            self.loaded = True
+        logger.info(f"Emotion catalog loaded: {len(rows)} rows")
+
+    def _ensure_loaded(self, db: Session) -> None:
+        if not self.loaded:
+            self.load(db)
+
+    def _recently_missed(self, key: Hashable) -> bool:
+        with self._lock:
+            expires = self._misses.get(key)
+            if expires is None:
+                return False
+            if expires <= self._clock():
+                del self._misses[key]
+                return False
+            return True
+
+    def _remember_miss(self, key: Hashable) -> None:
+        with self._lock:
+            if len(self._misses) >= MAX_MISSES:
+                self._misses.clear()
+            self._misses[key] = self._clock() + MISS_TTL_SECONDS
+
+    def _reload_for(self, db: Session, key: Hashable) -> bool:
+        """Recarga por un desconocido, salvo que ya se haya buscado hace poco. True si recargó"""
+        if self._recently_missed(key):
+            return False
+        self.load(db, seed=False)
+        return True
+
+    def ids_for(self, db: Session, name: str) -> Tuple[int, ...]:
+        """Todos los ids con ese nombre (para filtrar); tupla vacía si no existe"""
+        self._ensure_loaded(db)
+        ids = self.ids_by_name.get(name)
+        if ids is None:
+            if self._reload_for(db, ('name', name)):
+                ids = self.ids_by_name.get(name)
+            if ids is None:
+                self._remember_miss(('name', name))
+                ids = ()
+        return ids
+
+    def id_for(self, db: Session, name: str) -> Optional[int]:
+        """Id canónico (el menor) para un nombre de emoción"""
+        ids = self.ids_for(db, name)
+        return ids[0] if ids else None
+
+    def name_for(self, db: Session, emotion_id: int) -> Optional[str]:
+        self._ensure_loaded(db)
+        name = self.names_by_id.get(emotion_id)
+        if name is None:
+            if self._reload_for(db, ('id', emotion_id)):
+                name = self.names_by_id.get(emotion_id)
+            if name is None:
+                self._remember_miss(('id', emotion_id))
+        return name
+
+    def names(self, db: Session) -> Mapping[int, str]:
+        self._ensure_loaded(db)
+        return self.names_by_id
+
+    def get_or_create_id(self, db: Session, name: str) -> int:
+        """Id de la emoción; la crea (y recarga el catálogo) si no existe"""
+        emotion_id = self.id_for(db, name)
+        if emotion_id is not None:
+            return emotion_id
+
+        emotion = Emotion(nombre=name)
+        db.add(emotion)
+        db.commit()
+        db.refresh(emotion)
+        with self._lock:
+            self._misses.clear()
+        self.load(db, seed=False)
+        return self.id_for(db, name) or emotion.id
+
+
+# Instancia global del catálogo
+emotion_catalog = EmotionCatalog()
@@ -0,0 +1,217 @@
+"""
+Caché de resultados de detect_faces para el análisis de emociones.
+
+Los usuarios repiten selfies casi idénticas y los clientes reintentan subidas;
+cada una costaba una llamada pagada a Rekognition. Se busca primero por
+SHA-256 de los bytes recibidos (reintentos exactos, sin preprocesar) y después
+por dHash de la imagen preprocesada dentro de una distancia de Hamming.
+El índice perceptual es por usuario: una foto parecida de otra persona nunca
+devuelve su resultado (edad, género, cajas); entre usuarios solo valen los
+aciertos exactos por SHA-256 de respuestas reales de Rekognition. Las subidas
+idénticas simultáneas comparten una sola llamada (single-flight).
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+from server.core.config import settings
+from server.utils.image import dhash
+
+logger = logging.getLogger(__name__)
+
+# A partir de este tamaño el SHA-256 se calcula fuera del event loop
+HASH_IN_THREAD_BYTES = 1024 * 1024
+
+
+class CachedResult(NamedTuple):
+    expires_at: float
+    phash: Optional[int]
+    result: Dict[str, Any]
+    user_key: Optional[str]  # Dueño de la entrada para las búsquedas por dHash
+    private: bool  # Copia de un acierto por dHash: el SHA-256 solo acierta para su dueño
+
+
+class SharedDetectionCancelled(Exception):
+    """La petición que hacía la llamada compartida se canceló; quien esperaba la repite"""
+
+
+class DetectionOutcome(NamedTuple):
+    result: Dict[str, Any]
+    preprocessing: Optional[Dict[str, Any]]
+    cache_status: str  # exact, similar, shared o miss
+
+
+class FaceResultCache:
+    def __init__(self, ttl_seconds: int, max_entries: int, max_distance: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._inflight: Dict[str, Tuple[asyncio.Future, Optional[str]]] = {}  # digest -> (llamada, usuario dueño)
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, digest: str, user_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if entry.expires_at <= self._clock():
+                del self._entries[digest]
+                return None
+            if entry.private and entry.user_key != user_key:
+                return None
+            self._entries.move_to_end(digest)
+            self.exact_hits += 1
+            return entry.result
+
+    def find_similar(self, phash: int, user_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Resultado de la imagen más parecida del mismo usuario dentro de max_distance bits
+        (recorrido lineal, acotado por max_entries). Sin usuario no se busca.
+        """
+        if self.max_distance < 0 or user_key is None:
+            return None
+        now = self._clock()
+        with self._lock:
+            best_key, best_distance = None, self.max_distance + 1
+            for key, entry in self._entries.items():
+                if entry.phash is None or entry.user_key != user_key or entry.expires_at <= now:
+                    continue
+                distance = (entry.phash ^ phash).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+                    if distance == 0:
+                        break
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.similar_hits += 1
+            return self._entries[best_key].result
+
+    def put(
+        self,
+        digest: str,
+        phash: Optional[int],
+        result: Dict[str, Any],
+        user_key: Optional[str] = None,
+        private: bool = False,
+    ) -> None:
+        with self._lock:
+            self._entries[digest] = CachedResult(self._clock() + self.ttl_seconds, phash, result, user_key, private)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def detect(
+        self,
+        image_bytes,
+        prepare: Callable[[Any], Awaitable[Any]],
+        detect_faces: Callable[[Any], Awaitable[Dict[str, Any]]],
+        user_key: Optional[str] = None,
+    ) -> DetectionOutcome:
+        """
+        Resultado de detect_faces para la imagen, desde el caché si es posible.
+        prepare devuelve (data, report) como ImagePreprocessor.process. Solo se
+        guardan las respuestas con success=True. user_key (el sub del token)
+        habilita los aciertos por dHash entre imágenes del mismo usuario.
+        """
+        if len(image_bytes) >= HASH_IN_THREAD_BYTES:
+            digest = await asyncio.to_thread(lambda: hashlib.sha256(image_bytes).hexdigest())
+        else:
+            digest = hashlib.sha256(image_bytes).hexdigest()
+
+        cached = self.get(digest, user_key)
+        if cached is not None:
+            return DetectionOutcome(cached, None, "exact")
+
+        with self._lock:
+            flight = self._inflight.get(digest)
+            if flight is None:
+                pending = asyncio.get_running_loop().create_future()
+                self._inflight[digest] = (pending, user_key)
+                owner = True
+            else:
+                pending, owner_key = flight
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            try:
+                outcome = await asyncio.shield(pending)
+            except SharedDetectionCancelled:
+                return await self._detect_uncached(digest, image_bytes, prepare, detect_faces, user_key)
+            if outcome.cache_status == "similar" and owner_key != user_key:
+                # El dueño acertó en su propio índice por dHash: ese resultado no es de esta imagen
+                return await self._detect_uncached(digest, image_bytes, prepare, detect_faces, user_key)
+            return DetectionOutcome(outcome.result, outcome.preprocessing, "shared")
+
+        try:
+            outcome = await self._detect_uncached(digest, image_bytes, prepare, detect_faces, user_key)
+            pending.set_result(outcome)
+            return outcome
+        except asyncio.CancelledError:
+            # Los que esperan reciben una excepción normal y repiten la llamada
+            pending.set_exception(SharedDetectionCancelled())
+            pending.exception()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            pending.exception()  # Marcada como leída aunque nadie más espere
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(digest, None)
+
+    async def _detect_uncached(self, digest: str, image_bytes, prepare, detect_faces, user_key: Optional[str]) -> DetectionOutcome:
+        data, report = await prepare(image_bytes)
+        phash: Optional[int] = None
+        try:
+            phash = await asyncio.to_thread(dhash, data)
+        except Exception as e:
+            logger.warning(f"Perceptual hash failed, exact matches only: {e}")
+
+        if phash is not None:
+            similar = self.find_similar(phash, user_key)
+            if similar is not None:
+                self.put(digest, phash, similar, user_key, private=True)
+                return DetectionOutcome(similar, report, "similar")
+
+        with self._lock:
+            self.misses += 1
+        result = await detect_faces(data)
+        if result.get('success'):
+            self.put(digest, phash, result, user_key)
+        return DetectionOutcome(result, report, "miss")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "in_flight": len(self._inflight),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "max_distance": self.max_distance,
+            }
+
+
+# Instancia global del caché de resultados
+face_result_cache = FaceResultCache(
+    settings.ANALYSIS_RESULT_CACHE_TTL_SECONDS,
+    settings.ANALYSIS_RESULT_CACHE_MAX_ENTRIES,
+    settings.ANALYSIS_RESULT_CACHE_MAX_DISTANCE,
+)
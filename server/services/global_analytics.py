@@ -0,0 +1,153 @@
+"""
+Job incremental de las analíticas globales (resumen_global_hora y usuarios_global_hora).
+
+Procesa los análisis con id mayor a la marca de agua guardada en
+estado_job_analiticas, por lotes, y suma sus conteos a la hora UTC que les
+corresponde. La fila de estado se bloquea (SELECT ... FOR UPDATE) mientras
+dura cada lote, así que varios workers con el job activo no cuentan dos veces.
+
+La app lo ejecuta cada GLOBAL_ANALYTICS_REFRESH_SECONDS. También se puede correr a mano:
+
+    python -m server.services.global_analytics
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from server.controllers.analytics_controller import truncate_column
+from server.db.models.analysis import Analysis
+from server.db.models.analytics import GlobalEmotionHourly, GlobalHourlyUsers, AnalyticsJobState
+from server.utils.hyperloglog import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "global_hourly"
+HLL_PRECISION = 12
+REFRESH_BATCH_SIZE = 10000
+# Los análisis más recientes esperan al siguiente ciclo: un INSERT con id menor
+# que aún no hizo commit no debe quedar detrás de la marca de agua
+COMMIT_LAG = timedelta(seconds=60)
+
+
+def _as_hour(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def lock_job_state(db: Session) -> AnalyticsJobState:
+    state = db.query(AnalyticsJobState).filter_by(nombre=JOB_NAME).with_for_update().first()
+    if state is None:
+        db.add(AnalyticsJobState(nombre=JOB_NAME, ultimo_id=0))
+        db.commit()
+        state = db.query(AnalyticsJobState).filter_by(nombre=JOB_NAME).with_for_update().first()
+    return state
+
+
+def refresh_global_batch(db: Session, batch_size: int = REFRESH_BATCH_SIZE, now: Optional[datetime] = None) -> int:
+    """Suma un lote de análisis nuevos a los agregados y avanza la marca de agua. Devuelve cuántos"""
+    now = now or datetime.utcnow()
+    state = lock_job_state(db)
+    high_water_mark = state.ultimo_id or 0
+
+    # Límite superior: antes del primer análisis todavía dentro de COMMIT_LAG
+    pending_id = db.query(func.min(Analysis.id)).filter(
+        Analysis.id > high_water_mark,
+        Analysis.fecha_analisis > now - COMMIT_LAG,
+    ).scalar()
+    candidates = db.query(Analysis.id).filter(Analysis.id > high_water_mark)
+    if pending_id is not None:
+        candidates = candidates.filter(Analysis.id < pending_id)
+    batch = candidates.order_by(Analysis.id).limit(batch_size).subquery()
+    new_mark, processed = db.query(func.max(batch.c.id), func.count(batch.c.id)).one()
+
+    state.actualizado = now
+    if not processed:
+        db.commit()
+        return 0
+
+    in_batch = (Analysis.id > high_water_mark, Analysis.id <= new_mark, Analysis.fecha_analisis.isnot(None))
+    hour_col = truncate_column(db, "hour", Analysis.fecha_analisis)
+
+    counts = db.query(
+        hour_col, Analysis.id_emocion, func.count(Analysis.id), func.coalesce(func.sum(Analysis.confidence), 0.0)
+    ).filter(*in_batch).group_by(hour_col, Analysis.id_emocion).all()
+    for hour, emotion_id, total, confidence_sum in counts:
+        row = db.get(GlobalEmotionHourly, (_as_hour(hour), emotion_id))
+        if row is None:
+            row = GlobalEmotionHourly(hora=_as_hour(hour), id_emocion=emotion_id, total=0, suma_confidence=0.0)
+            db.add(row)
+        row.total = (row.total or 0) + int(total)
+        row.suma_confidence = (row.suma_confidence or 0.0) + float(confidence_sum or 0.0)
+
+    sketches = {}
+    for hour, user_id in db.query(hour_col, Analysis.id_usuario).filter(*in_batch).distinct():
+        hour = _as_hour(hour)
+        if hour not in sketches:
+            stored = db.get(GlobalHourlyUsers, hour)
+            sketches[hour] = (stored, HyperLogLog.from_bytes(stored.sketch) if stored else HyperLogLog(HLL_PRECISION))
+        sketches[hour][1].add(user_id)
+    for hour, (stored, sketch) in sketches.items():
+        if stored is None:
+            db.add(GlobalHourlyUsers(hora=hour, sketch=sketch.to_bytes()))
+        else:
+            stored.sketch = sketch.to_bytes()
+
+    state.ultimo_id = new_mark
+    db.commit()
+    return int(processed)
+
+
+def refresh_global_aggregates(session_factory: Callable[[], Session], batch_size: int = REFRESH_BATCH_SIZE) -> int:
+    """Procesa lotes hasta alcanzar los análisis recientes. Devuelve el total procesado"""
+    total = 0
+    db = session_factory()
+    try:
+        while True:
+            processed = refresh_global_batch(db, batch_size)
+            total += processed
+            if processed < batch_size:
+                return total
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class GlobalAnalyticsScheduler:
+    """Ejecuta el job periódicamente dentro del proceso, en un hilo para no bloquear el event loop"""
+
+    def __init__(self, session_factory: Callable[[], Session], interval_seconds: int):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await asyncio.to_thread(refresh_global_aggregates, self.session_factory)
+                if processed:
+                    logger.info(f"Global analytics refreshed: {processed} analyses")
+            except Exception as e:
+                logger.warning(f"Global analytics refresh failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self.interval_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+if __name__ == "__main__":
+    from server.db.session import SessionLocal
+
+    print(f"✅ Análisis procesados: {refresh_global_aggregates(SessionLocal)}")
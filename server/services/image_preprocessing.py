@@ -0,0 +1,123 @@
+"""
+Preprocesado de imágenes antes de enviarlas a Rekognition.
+
+Las fotos de móvil pesan varios MB: la latencia de Rekognition y el ancho de
+banda de subida crecen con el tamaño, y Image.Bytes rechaza más de 5 MB.
+Reducir y recodificar es CPU pura, así que corre en un pool de hilos acotado
+(PIL libera el GIL al decodificar y redimensionar) y nunca en el event loop.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, NamedTuple, Optional
+from server.core.config import settings
+from server.utils.image import prepare_for_rekognition
+
+logger = logging.getLogger(__name__)
+
+
+class PreprocessResult(NamedTuple):
+    data: Any  # bytes o el buffer original si no hizo falta tocarlo
+    report: Dict[str, Any]
+
+
+class ImagePreprocessor:
+    def __init__(self, max_edge: int, quality: int, workers: int):
+        self.max_edge = max_edge
+        self.quality = quality
+        self.workers = max(1, workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.total_ms = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-preprocess")
+            return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Como mucho una imagen por hilo dentro del pool; el resto espera sin ocupar la cola
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.workers)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def _run(self, data) -> PreprocessResult:
+        started = time.perf_counter()
+        output, info = prepare_for_rekognition(data, self.max_edge, self.quality)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        report = {
+            **info,
+            "original_bytes": len(data),
+            "processed_bytes": len(output),
+            "bytes_saved": len(data) - len(output),
+            "elapsed_ms": round(elapsed_ms, 2),
+        }
+        return PreprocessResult(output, report)
+
+    async def process(self, data) -> PreprocessResult:
+        """
+        Imagen lista para Rekognition y el informe del paso (bytes ahorrados, tiempos).
+        Si PIL falla se devuelve la imagen original: el preprocesado nunca rompe el análisis.
+        """
+        queued_at = time.perf_counter()
+        async with self._get_semaphore():
+            wait_ms = (time.perf_counter() - queued_at) * 1000
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(self._get_executor(), self._run, data)
+            except Exception as e:
+                logger.warning(f"Image preprocessing failed, sending original: {e}")
+                with self._lock:
+                    self.failed += 1
+                return PreprocessResult(data, {"reencoded": False, "original_bytes": len(data), "processed_bytes": len(data), "bytes_saved": 0, "error": str(e)})
+
+        result.report["queue_ms"] = round(wait_ms, 2)
+        with self._lock:
+            self.processed += 1
+            self.bytes_in += result.report["original_bytes"]
+            self.bytes_out += result.report["processed_bytes"]
+            self.total_ms += result.report["elapsed_ms"]
+        logger.info(
+            f"Image preprocessed: {result.report['original_bytes']} -> {result.report['processed_bytes']} bytes "
+            f"in {result.report['elapsed_ms']:.1f} ms (queue {wait_ms:.1f} ms)"
+        )
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_edge": self.max_edge,
+                "quality": self.quality,
+                "processed": self.processed,
+                "failed": self.failed,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "avg_ms": round(self.total_ms / self.processed, 2) if self.processed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+# Instancia global del preprocesado
+image_preprocessor = ImagePreprocessor(
+    settings.ANALYSIS_PREPROCESS_MAX_EDGE,
+    settings.ANALYSIS_PREPROCESS_JPEG_QUALITY,
+    settings.ANALYSIS_PREPROCESS_WORKERS,
+)
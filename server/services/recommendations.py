@@ -0,0 +1,122 @@
+"""
+Recomendaciones musicales para una emoción, llamadas en el mismo proceso.
+
+Las rutas de análisis antes pedían /recommend y /recommend/mockup al propio
+servidor por HTTP (bloqueando el event loop y, con un solo worker, arriesgando
+un deadlock). Aquí se resuelve lo mismo sin salir del proceso: Spotify si el
+JWT trae un token de Spotify y, si no hay canciones, el mockup local.
+"""
+import asyncio
+import copy
+import json
+import logging
+import os
+import random
+import threading
+from typing import Dict, List, Optional
+from server.controllers.recommend_controller import recommend_songs_by_emotion
+from server.core.security import verify_token
+
+logger = logging.getLogger(__name__)
+
+MOCK_DATA_PATH = os.path.join(os.path.dirname(__file__), '../../recomendacionesSpotify.json')
+SPOTIFY_TIMEOUT_SECONDS = 10
+
+# Mapeo de emociones a diferentes conjuntos de canciones
+EMOTION_TRACK_FILTERS = {
+    "happy": lambda tracks: tracks[:30],
+    "sad": lambda tracks: tracks[:30],
+    "angry": lambda tracks: tracks[:30],
+    "relaxed": lambda tracks: tracks[:30],
+    "energetic": lambda tracks: tracks[:30]
+}
+
+_mock_data: Optional[Dict] = None
+_mock_lock = threading.Lock()
+
+
+def generate_fallback_data():
+    """Datos de respaldo si no se encuentra el JSON"""
+    return {
+        "tracks": [
+            {
+                "name": "Happy Song",
+                "artists": [{"name": "Artist Name"}],
+                "album": {
+                    "name": "Album Name",
+                    "images": [{"url": "https://via.placeholder.com/300"}]
+                },
+                "external_urls": {"spotify": "https://open.spotify.com"},
+                "duration_ms": 180000,
+                "popularity": 75
+            }
+        ] * 10,
+        "emotion": "happy",
+        "total_tracks": 10,
+        "search_method": "fallback"
+    }
+
+
+def load_mock_data() -> Dict:
+    """Datos mockup desde recomendacionesSpotify.json (se leen una sola vez)"""
+    global _mock_data
+    with _mock_lock:
+        if _mock_data is None:
+            try:
+                with open(MOCK_DATA_PATH, 'r', encoding='utf-8') as f:
+                    _mock_data = json.load(f)
+            except FileNotFoundError:
+                _mock_data = generate_fallback_data()
+        return _mock_data
+
+
+def mockup_tracks(emotion: str) -> List[Dict]:
+    """Canciones mockup aleatorias para la emoción (ValueError si no es válida)"""
+    filter_func = EMOTION_TRACK_FILTERS.get(emotion.lower())
+    if filter_func is None:
+        raise ValueError(f"Emoción inválida. Opciones: {', '.join(EMOTION_TRACK_FILTERS.keys())}")
+    # Copias: ni el shuffle ni quien reciba las canciones deben alterar los datos compartidos
+    all_tracks = list(load_mock_data().get("tracks", []))
+    random.shuffle(all_tracks)
+    return copy.deepcopy(filter_func(all_tracks))
+
+
+def spotify_access_token(authorization: Optional[str]) -> Optional[str]:
+    """Token de Spotify guardado en el JWT de la app ("Bearer ..."), si lo hay"""
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    try:
+        payload = verify_token(authorization.split(" ")[1].strip())
+    except Exception:
+        return None
+    spotify_info = payload.get('spotify') if payload else None
+    if spotify_info and spotify_info.get('access_token'):
+        return spotify_info['access_token']
+    return None
+
+
+async def get_music_recommendations(authorization: Optional[str], emotion: str) -> List[Dict]:
+    """
+    Recomendaciones para la emoción detectada: Spotify primero (en un hilo, porque
+    el cliente es síncrono) y el mockup si Spotify falla o no devuelve canciones.
+    Nunca lanza: ante cualquier error devuelve una lista vacía.
+    """
+    access_token = spotify_access_token(authorization)
+    if access_token:
+        try:
+            result = await asyncio.wait_for(
+                asyncio.to_thread(recommend_songs_by_emotion, access_token, emotion),
+                timeout=SPOTIFY_TIMEOUT_SECONDS
+            )
+            tracks = result.get('tracks', []) if result else []
+            if tracks:
+                return tracks
+            logger.info(f"Spotify returned no tracks for {emotion} ({result.get('error') if result else None}), using mockup")
+        except Exception as e:
+            logger.warning(f"Spotify recommendations failed for {emotion}: {e}")
+
+    try:
+        return mockup_tracks(emotion)
+    except Exception as e:
+        logger.error(f"Mockup recommendations failed for {emotion}: {e}")
+        return []
@@ -109,7 +109,7 @@ def get_recommendations(access_token: str, emotion: str) -> Dict:
         }
         
         while True:
-            response = requests.get(url, headers=headers, params=params)
+            response = requests.get(url, headers=headers, params=params, timeout=10)
             
 
             if response.status_code == 401:
@@ -219,7 +219,7 @@ def get_fallback_recommendations(access_token: str, emotion: str) -> Dict:
         url = f"{SPOTIFY_API_BASE_URL}/search"
         
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = requests.get(url, headers=headers, params=params, timeout=10)
 
 
             if response.status_code == 401:
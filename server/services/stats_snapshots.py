@@ -0,0 +1,115 @@
+"""
+Últimas estadísticas calculadas por usuario, para servir el dashboard en modo
+stale-while-revalidate (/v1/analytics/stats?mode=swr).
+
+A diferencia del caché de analíticas, un snapshot no se invalida al guardar un
+análisis: se sigue sirviendo (marcado como viejo) mientras un único recálculo
+en segundo plano lo reemplaza. Los recálculos concurrentes del mismo usuario y
+clave se agrupan en uno (single-flight).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+from sqlalchemy.orm import Session
+from server.controllers.analytics_controller import fetch_data_version
+from server.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot(NamedTuple):
+    data: Dict[str, Any]
+    data_version: Tuple[int, int]  # fetch_data_version() leído antes de calcular
+    computed_at: float
+
+
+class StatsSnapshotStore:
+    def __init__(self, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[tuple, Snapshot]" = OrderedDict()
+        self._refreshing: set = set()
+        self.served_stale = 0
+        self.refreshes = 0
+        self.coalesced = 0
+
+    def get(self, user_id: int, key: str) -> Optional[Snapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get((user_id, key))
+            if snapshot is not None:
+                self._snapshots.move_to_end((user_id, key))
+            return snapshot
+
+    def put(self, user_id: int, key: str, data: Dict[str, Any], data_version: Tuple[int, int]) -> None:
+        with self._lock:
+            current = self._snapshots.get((user_id, key))
+            if current is not None and current.data_version[0] > data_version[0]:
+                return  # Un recálculo más nuevo ya terminó antes
+            self._snapshots[(user_id, key)] = Snapshot(data, tuple(data_version), self._clock())
+            self._snapshots.move_to_end((user_id, key))
+            while len(self._snapshots) > self.max_entries:
+                self._snapshots.popitem(last=False)
+
+    def age(self, snapshot: Snapshot) -> float:
+        return max(0.0, self._clock() - snapshot.computed_at)
+
+    def mark_served_stale(self) -> None:
+        with self._lock:
+            self.served_stale += 1
+
+    def begin_refresh(self, user_id: int, key: str) -> bool:
+        """True si el llamador debe recalcular; False si ya hay un recálculo en curso"""
+        with self._lock:
+            if (user_id, key) in self._refreshing:
+                self.coalesced += 1
+                return False
+            self._refreshing.add((user_id, key))
+            self.refreshes += 1
+            return True
+
+    def end_refresh(self, user_id: int, key: str) -> None:
+        with self._lock:
+            self._refreshing.discard((user_id, key))
+
+    def is_refreshing(self, user_id: int, key: str) -> bool:
+        with self._lock:
+            return (user_id, key) in self._refreshing
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "snapshots": len(self._snapshots),
+                "refreshing": len(self._refreshing),
+                "served_stale": self.served_stale,
+                "refreshes": self.refreshes,
+                "coalesced": self.coalesced,
+            }
+
+
+def refresh_snapshot(
+    store: StatsSnapshotStore,
+    session_factory: Callable[[], Session],
+    user_id: int,
+    key: str,
+    compute: Callable[[Session], Dict[str, Any]],
+) -> None:
+    """
+    Recalcula un snapshot con su propia sesión (corre después de responder).
+    Siempre libera la marca de recálculo, aunque falle.
+    """
+    db = session_factory()
+    try:
+        version = fetch_data_version(db, user_id)
+        store.put(user_id, key, compute(db), version)
+    except Exception as e:
+        logger.warning(f"Stats snapshot refresh failed for user {user_id}: {e}")
+    finally:
+        db.close()
+        store.end_refresh(user_id, key)
+
+
+# Instancia global de snapshots
+stats_snapshots = StatsSnapshotStore(settings.ANALYTICS_CACHE_MAX_ENTRIES)
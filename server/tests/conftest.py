@@ -8,6 +8,8 @@ from server.db.base import Base
 # Import models so tables are registered
 from server.db.models import user as user_model  # noqa: F401
 from server.db.models import session as session_model  # noqa: F401
+from server.db.models import analysis as analysis_model  # noqa: F401
+from server.db.models import analytics as analytics_model  # noqa: F401
 
 
 TEST_DB_PATH = pathlib.Path(__file__).parent / "test.db"
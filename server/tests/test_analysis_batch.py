@@ -0,0 +1,44 @@
+from server.controllers.analysis_controller import aggregate_emotions
+from server.core.config import settings
+from server.tests.test_analytics_routes import client, login_new_user
+from server.tests.test_image_intake import tiny_png
+
+
+def test_aggregate_emotions_averages_normalized_maps():
+    aggregate = aggregate_emotions([
+        {"happy": 0.8, "sad": 0.2},
+        {"happy": 0.4, "relaxed": 0.6},
+    ])
+    assert aggregate["emotions_detected"] == {"happy": 0.6, "sad": 0.1, "relaxed": 0.3}
+    assert aggregate["emotion"] == "happy"
+    assert aggregate["confidence"] == 0.6
+    assert aggregate_emotions([])["emotion"] is None
+
+
+def test_analyze_batch_returns_per_image_results_and_aggregate(engine):
+    headers = login_new_user()
+    files = [
+        ("images", ("a.png", tiny_png(), "image/png")),
+        ("images", ("broken.png", b"not an image", "image/png")),
+        ("images", ("b.png", tiny_png(), "image/png")),
+    ]
+    response = client.post("/v1/analysis/analyze-batch", files=files, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+
+    assert (body["analyzed"], body["failed"]) == (2, 1)
+    assert [r["index"] for r in body["results"]] == [0, 1, 2]
+    assert [r["success"] for r in body["results"]] == [True, False, True]
+    assert body["results"][1]["error"]
+    assert body["emotion"] in body["emotions_detected"]
+    assert abs(sum(body["emotions_detected"].values()) - 1.0) < 0.01
+    assert body["recommendations"]
+
+
+def test_analyze_batch_limits(engine):
+    headers = login_new_user()
+    too_many = [("images", (f"{i}.png", tiny_png(), "image/png")) for i in range(settings.ANALYSIS_BATCH_MAX_IMAGES + 1)]
+    assert client.post("/v1/analysis/analyze-batch", files=too_many, headers=headers).status_code == 400
+
+    all_broken = [("images", ("x.png", b"nope", "image/png"))]
+    assert client.post("/v1/analysis/analyze-batch", files=all_broken, headers=headers).status_code == 400
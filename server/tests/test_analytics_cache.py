@@ -0,0 +1,103 @@
+from server.services.analytics_cache import (
+    MemoryAnalyticsCache,
+    RedisAnalyticsCache,
+    get_or_compute,
+    invalidate_user,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Sustituto mínimo de redis-py para pruebas locales"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+def test_memory_cache_hits_ttl_and_invalidation():
+    clock = FakeClock()
+    cache = MemoryAnalyticsCache(ttl_seconds=10, max_entries=10, clock=clock)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"total_analyses": len(calls)}
+
+    assert get_or_compute(cache, 1, "stats", compute) == {"total_analyses": 1}
+    assert get_or_compute(cache, 1, "stats", compute) == {"total_analyses": 1}
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    invalidate_user(cache, 1)
+    assert get_or_compute(cache, 1, "stats", compute) == {"total_analyses": 2}
+
+    clock.now = 11
+    assert get_or_compute(cache, 1, "stats", compute) == {"total_analyses": 3}
+
+
+def test_memory_cache_lru_eviction_and_stale_write():
+    cache = MemoryAnalyticsCache(ttl_seconds=60, max_entries=2)
+    for user_id in (1, 2):
+        cache.set(user_id, "stats", user_id, cache.version(user_id))
+    cache.get(1, "stats", 0)  # El usuario 1 pasa a ser el más reciente
+    cache.set(3, "stats", 3, 0)
+    assert cache.get(2, "stats", 0) is None
+    assert cache.get(1, "stats", 0) == 1
+    assert cache.stats()["evictions"] == 1
+
+    # Un resultado calculado antes de la invalidación no se guarda
+    version = cache.version(1)
+    invalidate_user(cache, 1)
+    cache.set(1, "stats", "stale", version)
+    assert cache.get(1, "stats", cache.version(1)) is None
+
+
+def test_redis_cache_with_stand_in_client():
+    cache = RedisAnalyticsCache(FakeRedis(), ttl_seconds=60)
+    assert get_or_compute(cache, 7, "stats", lambda: {"streak": 2}) == {"streak": 2}
+    assert get_or_compute(cache, 7, "stats", lambda: {"streak": 99}) == {"streak": 2}
+    invalidate_user(cache, 7)
+    assert get_or_compute(cache, 7, "stats", lambda: {"streak": 3}) == {"streak": 3}
+    assert cache.stats()["hits"] == 1
+
+
+def test_memory_invalidation_only_touches_that_users_entries():
+    cache = MemoryAnalyticsCache(ttl_seconds=60, max_entries=3)
+    for user_id in (1, 2):
+        cache.set(user_id, "stats", user_id, cache.version(user_id))
+    cache.set(1, "history", "h", cache.version(1))
+    cache.set(3, "stats", 3, cache.version(3))  # Expulsa (1, stats) por LRU
+
+    invalidate_user(cache, 1)
+    assert cache.stats()["entries"] == 2
+    assert cache.get(2, "stats", cache.version(2)) == 2
+    assert cache._user_keys == {2: {(2, 0, "stats")}, 3: {(3, 0, "stats")}}
+
+
+def test_memory_versions_stay_bounded_without_losing_entries_or_stale_guards():
+    cache = MemoryAnalyticsCache(ttl_seconds=60, max_entries=3)
+    cache.set(1, "stats", "vivo", cache.version(1))
+    stale_version = cache.version(2)
+    for user_id in range(2, 50):
+        invalidate_user(cache, user_id)
+
+    assert cache.stats()["versions"] <= 4
+    assert cache.get(1, "stats", cache.version(1)) == "vivo"  # Su versión se conservó al podar
+    cache.set(2, "stats", "stale", stale_version)  # Empezó antes de una invalidación ya olvidada
+    assert cache.get(2, "stats", cache.version(2)) is None
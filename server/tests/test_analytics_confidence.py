@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+from server.controllers.analytics_controller import compute_confidence_stats, percentile_cont
+from server.db.models.analysis import Analysis
+from server.tests.test_analytics_controller import seed_user_with_session, add_analysis
+
+
+def test_percentile_cont_interpolates():
+    assert percentile_cont([], 0.5) is None
+    assert percentile_cont([0.4], 0.9) == 0.4
+    assert abs(percentile_cont([0.1, 0.2, 0.3, 0.4], 0.5) - 0.25) < 1e-9
+    assert abs(percentile_cont([0.1, 0.2, 0.3, 0.4], 0.1) - 0.13) < 1e-9
+
+
+def test_confidence_stats_per_emotion(db_session):
+    user, session = seed_user_with_session(db_session, "confidence@example.com")
+    start = datetime(2024, 5, 1, 8)
+    for i, value in enumerate([0.35, 0.55, 0.95, 1.0]):
+        add_analysis(db_session, session, "happy", start + timedelta(minutes=i), value)
+    analysis = add_analysis(db_session, session, "sad", start + timedelta(hours=1), 0.6)
+    analysis.emotions_detected = {"sad": 0.6, "relaxed": 0.3, "happy": 0.1}
+    db_session.commit()
+
+    stats = compute_confidence_stats(db_session, user.id, bins=4)
+
+    assert stats.bin_edges == [0.0, 0.25, 0.5, 0.75, 1.0]
+    happy, sad = stats.emotions
+    assert happy.emotion == "happy" and happy.count == 4
+    assert happy.histogram == [0, 1, 1, 2]  # 1.0 cae en el último bin
+    assert abs(happy.average_confidence - 0.7125) < 1e-9
+    assert abs(happy.p50 - 0.75) < 1e-9
+    assert happy.average_components == {"happy": 0.7125}
+    assert sad.histogram == [0, 0, 1, 0]
+    assert sad.p10 == sad.p90 == 0.6
+    assert sad.average_components == {"happy": 0.1, "sad": 0.6, "relaxed": 0.3}
+
+
+def test_confidence_stats_postgres_sql():
+    pg = SimpleNamespace(dialect=postgresql.dialect())
+    captured = {}
+
+    class FakeQuery:
+        def __init__(self, *columns):
+            captured["columns"] = columns
+
+        def filter(self, *args):
+            return self
+
+        def group_by(self, *args):
+            return self
+
+        def all(self):
+            return []
+
+    fake_db = SimpleNamespace(get_bind=lambda: pg, query=FakeQuery)
+    assert compute_confidence_stats(fake_db, 1).emotions == []
+    sql = " ".join(str(c.compile(dialect=pg.dialect)) for c in captured["columns"])
+    assert "width_bucket" in sql
+    assert "percentile_cont" in sql and "WITHIN GROUP" in sql
+    assert Analysis.__tablename__ in sql
@@ -0,0 +1,79 @@
+from datetime import date, datetime, timedelta
+from server.controllers.analytics_controller import compute_user_stats
+from server.db.models.user import User
+from server.db.models.session import Session as UserSession
+from server.db.models.analysis import Analysis, Emotion
+from server.core.security import hash_password
+from server.services.analytics_rollup import record_analysis, record_streak_day
+
+
+def seed_user_with_session(db, email):
+    user = User(nombre="Stats", email=email, password=hash_password("Password123!"))
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    session = UserSession(id_usuario=user.id, fecha_inicio=datetime.utcnow())
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return user, session
+
+
+def get_emotion(db, nombre):
+    emotion = db.query(Emotion).filter(Emotion.nombre == nombre).first()
+    if not emotion:
+        emotion = Emotion(nombre=nombre)
+        db.add(emotion)
+        db.commit()
+        db.refresh(emotion)
+    return emotion
+
+
+def add_analysis(db, session, nombre, when, confidence=0.8):
+    analysis = Analysis(
+        id_sesion=session.id,
+        id_usuario=session.id_usuario,
+        id_emocion=get_emotion(db, nombre).id,
+        fecha_analisis=when,
+        confidence=confidence,
+        emotions_detected={nombre: confidence},
+    )
+    db.add(analysis)
+    record_analysis(db, session.id_usuario, analysis)
+    record_streak_day(db, session.id_usuario, when.date())
+    db.commit()
+    return analysis
+
+
+def test_compute_user_stats_empty(db_session):
+    user, _ = seed_user_with_session(db_session, "stats_empty@example.com")
+    stats = compute_user_stats(db_session, user.id)
+    assert stats.total_analyses == 0
+    assert stats.hourly_activity == [0] * 24
+    assert len(stats.weekly_activity) == 7
+
+
+def test_compute_user_stats_aggregates(db_session):
+    user, session = seed_user_with_session(db_session, "stats_agg@example.com")
+    today = date(2024, 5, 15)  # Miércoles
+    wednesday = datetime(2024, 5, 15, 10, 30)
+    add_analysis(db_session, session, "happy", wednesday, 0.9)
+    add_analysis(db_session, session, "happy", wednesday + timedelta(minutes=5), 0.7)
+    add_analysis(db_session, session, "sad", datetime(2024, 5, 14, 22, 0), 0.5)
+    add_analysis(db_session, session, "angry", datetime(2024, 4, 1, 8, 0), 0.6)
+
+    stats = compute_user_stats(db_session, user.id, today=today)
+
+    assert stats.total_analyses == 4
+    assert stats.most_frequent_emotion == "happy"
+    assert abs(stats.average_confidence - 0.675) < 1e-9
+    assert stats.hourly_activity[10] == 2
+    assert stats.hourly_activity[22] == 1
+    assert stats.hourly_activity[8] == 1
+    assert [w.analyses_count for w in stats.weekly_activity] == [0, 1, 2, 0, 0, 0, 0]
+    assert len(stats.weekly_emotions) == 8
+    assert stats.weekly_emotions[-1].week_start == "2024-05-13"
+    assert stats.weekly_emotions[-1].emotions == {"happy": 2, "sad": 1}
+    assert stats.weekly_emotions[1].emotions == {"angry": 1}
+    assert stats.positive_negative_balance == {"positive": 2, "negative": 2}
+    assert stats.streak == 2
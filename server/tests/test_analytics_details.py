@@ -0,0 +1,70 @@
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from server.controllers.analytics_controller import fetch_analysis_details
+from server.db.models.analysis import Cancion, AnalisisCancion
+from server.db.models.session import Session as UserSession
+from server.services.emotion_catalog import emotion_catalog
+from server.tests.test_analytics_controller import seed_user_with_session, add_analysis
+
+
+def link_song(db, analysis, titulo, spotify_id):
+    song = Cancion(titulo=titulo, spotify_id=spotify_id, track_raw={"id": spotify_id, "name": titulo})
+    db.add(song)
+    db.commit()
+    db.add(AnalisisCancion(ID_analisis=analysis.id, ID_cancion=song.id))
+    db.commit()
+
+
+def test_batch_details_two_queries_and_ownership(db_session):
+    user, session = seed_user_with_session(db_session, "details_owner@example.com")
+    other, other_session = seed_user_with_session(db_session, "details_other@example.com")
+    first = add_analysis(db_session, session, "happy", datetime(2024, 10, 1, 9, 0))
+    second = add_analysis(db_session, session, "sad", datetime(2024, 10, 2, 9, 0))
+    foreign = add_analysis(db_session, other_session, "angry", datetime(2024, 10, 3, 9, 0))
+    link_song(db_session, first, "Uno", "sp-uno")
+    link_song(db_session, first, "Dos", "sp-dos")
+    link_song(db_session, second, "Tres", "sp-tres")
+    emotion_catalog.load(db_session, seed=False)
+    user_id, ids = user.id, [second.id, foreign.id, first.id, 999999]
+    db_session.expire_all()
+
+    statements = []
+    engine = db_session.get_bind()
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        details = fetch_analysis_details(db_session, user_id, ids)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len([sql for sql in statements if sql.startswith("SELECT")]) == 2
+    assert [d.id for d in details] == [ids[0], ids[2]]
+    assert [t["id"] for t in details[1].recommendations] == ["sp-uno", "sp-dos"]
+    assert details[0].emotion == "sad"
+    assert details[0].recommendations == [{"id": "sp-tres", "name": "Tres"}]
+
+
+def test_song_load_failure_falls_back_without_discarding_pending_work(db_session):
+    user, session = seed_user_with_session(db_session, "details_fallback@example.com")
+    analysis = add_analysis(db_session, session, "happy", datetime(2024, 10, 4, 9, 0))
+    analysis.recommendations = [{"id": "guardada"}]
+    db_session.commit()
+    emotion_catalog.load(db_session, seed=False)
+    pending = UserSession(id_usuario=user.id, fecha_inicio=datetime(2024, 10, 5))
+    db_session.add(pending)
+
+    def fail_on_songs(conn, cursor, statement, *args):
+        if "analisis_cancion" in statement:
+            raise OperationalError(statement, {}, Exception("canciones no disponibles"))
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", fail_on_songs)
+    try:
+        details = fetch_analysis_details(db_session, user.id, [analysis.id])
+    finally:
+        event.remove(engine, "before_cursor_execute", fail_on_songs)
+
+    assert details[0].recommendations == [{"id": "guardada"}]
+    db_session.commit()
+    assert db_session.get(UserSession, pending.id) is not None
@@ -0,0 +1,35 @@
+import csv
+import io
+import json
+from datetime import datetime
+from server.controllers.analytics_controller import iter_history_export
+from server.db.models.analysis import Cancion, AnalisisCancion
+from server.tests.test_analytics_controller import seed_user_with_session, add_analysis
+
+
+def test_export_ndjson_with_songs(db_session):
+    user, session = seed_user_with_session(db_session, "export_ndjson@example.com")
+    first = add_analysis(db_session, session, "happy", datetime(2024, 9, 1, 10, 0), 0.9)
+    add_analysis(db_session, session, "sad", datetime(2024, 9, 2, 10, 0), 0.4)
+
+    song = Cancion(titulo="Song", spotify_id="sp1", artists=[{"name": "Artist"}], external_url="https://open.spotify.com/track/sp1")
+    db_session.add(song)
+    db_session.commit()
+    db_session.add(AnalisisCancion(ID_analisis=first.id, ID_cancion=song.id))
+    db_session.commit()
+
+    lines = "".join(iter_history_export(db_session, user.id, "ndjson", include_songs=True)).splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [r["emotion"] for r in records] == ["happy", "sad"]
+    assert records[0]["songs"] == [{"id": "sp1", "name": "Song", "artists": ["Artist"], "url": "https://open.spotify.com/track/sp1"}]
+    assert records[1]["songs"] == []
+
+
+def test_export_csv(db_session):
+    user, session = seed_user_with_session(db_session, "export_csv@example.com")
+    add_analysis(db_session, session, "angry", datetime(2024, 9, 3, 10, 0), 0.7)
+
+    rows = list(csv.reader(io.StringIO("".join(iter_history_export(db_session, user.id, "csv")))))
+    assert rows[0] == ["id", "date", "emotion", "confidence", "emotions_detected", "session_id"]
+    assert rows[1][2] == "angry"
+    assert json.loads(rows[1][4]) == {"angry": 0.7}
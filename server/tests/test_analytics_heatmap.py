@@ -0,0 +1,43 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from server.controllers.analytics_controller import compute_heatmap, fetch_heatmap_sql
+from server.tests.test_analytics_controller import seed_user_with_session, add_analysis
+from server.tests.test_analytics_routes import client, login_new_user
+
+
+def test_heatmap_from_rollups(db_session):
+    user, session = seed_user_with_session(db_session, "heatmap@example.com")
+    add_analysis(db_session, session, "happy", datetime(2024, 5, 13, 9, 15))  # Lunes
+    add_analysis(db_session, session, "happy", datetime(2024, 5, 20, 9, 45))  # Lunes siguiente
+    add_analysis(db_session, session, "sad", datetime(2024, 5, 19, 23, 0))  # Domingo
+
+    heatmap = compute_heatmap(db_session, user.id)
+
+    assert heatmap.days[0] == "Lun"
+    assert heatmap.emotions["happy"][0][9] == 2
+    assert heatmap.emotions["sad"][6][23] == 1
+    assert heatmap.total[0][9] == 2
+    assert sum(map(sum, heatmap.total)) == 3
+    assert all(len(row) == 24 for row in heatmap.total) and len(heatmap.total) == 7
+
+    # Domingo 23:00 UTC es lunes 08:00 en Tokio; coincide con el GROUP BY en SQL
+    tokyo = compute_heatmap(db_session, user.id, ZoneInfo("Asia/Tokyo"))
+    assert tokyo.emotions["sad"][0][8] == 1
+    assert tokyo.emotions == fetch_heatmap_sql(db_session, user.id, ZoneInfo("Asia/Tokyo"))
+
+
+def test_heatmap_half_hour_zone_uses_sql(db_session):
+    user, session = seed_user_with_session(db_session, "heatmap_kolkata@example.com")
+    add_analysis(db_session, session, "angry", datetime(2024, 5, 19, 18, 40))  # Lunes 00:10 en India
+
+    heatmap = compute_heatmap(db_session, user.id, ZoneInfo("Asia/Kolkata"))
+    assert heatmap.emotions["angry"][0][0] == 1
+    assert heatmap.timezone == "Asia/Kolkata"
+
+
+def test_heatmap_route():
+    headers = login_new_user()
+    empty = client.get("/v1/analytics/heatmap", headers=headers)
+    assert empty.status_code == 200
+    assert empty.json()["emotions"] == {}
+    assert len(empty.json()["total"]) == 7
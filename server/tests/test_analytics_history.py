@@ -0,0 +1,57 @@
+import pytest
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from server.controllers.analytics_controller import fetch_history_page
+from server.tests.test_analytics_controller import seed_user_with_session, add_analysis
+
+
+def test_history_pages_with_cursor(db_session):
+    user, session = seed_user_with_session(db_session, "history_pages@example.com")
+    start = datetime(2024, 7, 1, 12, 0)
+    for i in range(5):
+        add_analysis(db_session, session, "happy" if i % 2 else "sad", start + timedelta(days=i))
+    # Dos análisis con la misma fecha: el id desempata el orden
+    add_analysis(db_session, session, "angry", start + timedelta(days=4))
+
+    seen = []
+    cursor = None
+    while True:
+        page = fetch_history_page(db_session, user.id, limit=2, cursor=cursor)
+        assert page.total == 6
+        seen.extend(page.analyses)
+        cursor = page.next_cursor
+        if not cursor:
+            break
+
+    assert len(seen) == 6
+    assert len({a.id for a in seen}) == 6
+    keys = [(a.date, int(a.id)) for a in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_history_range_emotion_and_counts(db_session):
+    user, session = seed_user_with_session(db_session, "history_range@example.com")
+    add_analysis(db_session, session, "happy", datetime(2024, 8, 1, 9, 0))
+    add_analysis(db_session, session, "happy", datetime(2024, 8, 2, 9, 0))
+    add_analysis(db_session, session, "sad", datetime(2024, 8, 2, 10, 0))
+    add_analysis(db_session, session, "happy", datetime(2024, 8, 3, 9, 0))
+
+    page = fetch_history_page(
+        db_session, user.id,
+        date_from=datetime(2024, 8, 2), date_to=datetime(2024, 8, 3), emotion="happy"
+    )
+    assert [a.date for a in page.analyses] == [datetime(2024, 8, 2, 9, 0)]
+    assert page.total == 1
+    assert page.next_cursor is None
+
+    estimated = fetch_history_page(db_session, user.id, date_from=datetime(2024, 8, 2), count_mode="estimated")
+    assert estimated.total == 3
+    assert estimated.total_is_estimate is True
+
+    assert fetch_history_page(db_session, user.id, count_mode="none").total is None
+
+
+def test_history_rejects_invalid_cursor(db_session):
+    user, _ = seed_user_with_session(db_session, "history_cursor@example.com")
+    with pytest.raises(HTTPException):
+        fetch_history_page(db_session, user.id, cursor="not-a-cursor")
@@ -0,0 +1,41 @@
+from datetime import datetime
+from server.db.models.analysis import Analysis
+from server.db.models.analytics import EmotionDailyRollup
+from server.services.analytics_rollup import backfill_rollups, check_rollups
+from server.tests.test_analytics_controller import seed_user_with_session, get_emotion, add_analysis
+
+
+def test_record_analysis_updates_same_row(db_session):
+    user, session = seed_user_with_session(db_session, "rollup_record@example.com")
+    add_analysis(db_session, session, "happy", datetime(2024, 3, 1, 9, 15), 0.9)
+    add_analysis(db_session, session, "happy", datetime(2024, 3, 1, 21, 0), 0.5)
+
+    rows = db_session.query(EmotionDailyRollup).filter_by(id_usuario=user.id).all()
+    assert len(rows) == 1
+    assert rows[0].total == 2
+    assert abs(rows[0].suma_confidence - 1.4) < 1e-9
+    assert rows[0].horas[9] == 1 and rows[0].horas[21] == 1
+    assert check_rollups(db_session, user.id) == []
+
+
+def test_check_detects_drift_and_backfill_repairs(db_session):
+    user, session = seed_user_with_session(db_session, "rollup_backfill@example.com")
+    add_analysis(db_session, session, "sad", datetime(2024, 3, 2, 8, 0), 0.6)
+
+    # Análisis insertado sin pasar por el resumen
+    db_session.add(Analysis(
+        id_sesion=session.id,
+        id_usuario=user.id,
+        id_emocion=get_emotion(db_session, "angry").id,
+        fecha_analisis=datetime(2024, 3, 3, 12, 0),
+        confidence=0.7,
+    ))
+    db_session.commit()
+
+    mismatches = check_rollups(db_session, user.id)
+    assert len(mismatches) == 2
+    assert mismatches[0]["stored"] is None
+    assert mismatches[1]["streak_stored"] == ["2024-03-02", 1]
+
+    assert backfill_rollups(db_session, user.id) == 2
+    assert check_rollups(db_session, user.id) == []
@@ -0,0 +1,92 @@
+from fastapi.testclient import TestClient
+import uuid
+from server.app.main import app
+from server.utils.responses import etag_matches
+
+client = TestClient(app)
+
+
+def login_new_user():
+    email = f"analytics_{uuid.uuid4().hex[:8]}@example.com"
+    client.post("/v1/auth/register", json={"name": "Analytics", "email": email, "password": "Password123!"})
+    login = client.post("/v1/auth/login", json={"email": email, "password": "Password123!"})
+    assert login.status_code == 200
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches(None, '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+
+
+def test_stats_and_history_answer_304_until_new_analysis():
+    headers = login_new_user()
+
+    first = client.get("/v1/analytics/stats", headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = client.get("/v1/analytics/stats", headers={**headers, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    history = client.get("/v1/analytics/history", headers=headers)
+    assert history.status_code == 200
+    history_etag = history.headers["ETag"]
+
+    saved = client.post(
+        "/v1/analytics/save-analysis",
+        headers=headers,
+        json={"emotion": "happy", "confidence": 0.9, "emotions_detected": {"happy": 0.9}},
+    )
+    assert saved.status_code == 200
+
+    changed = client.get("/v1/analytics/stats", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["total_analyses"] == 1
+    assert changed.headers["ETag"] != etag
+
+    history_changed = client.get("/v1/analytics/history", headers={**headers, "If-None-Match": history_etag})
+    assert history_changed.status_code == 200
+    assert history_changed.json()["total"] == 1
+
+
+def test_export_streams_ndjson():
+    headers = login_new_user()
+    client.post(
+        "/v1/analytics/save-analysis",
+        headers=headers,
+        json={"emotion": "sad", "confidence": 0.6, "emotions_detected": {"sad": 0.6}},
+    )
+
+    resp = client.get("/v1/analytics/export?format=ndjson", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = resp.text.strip().splitlines()
+    assert len(lines) == 1
+    assert '"emotion": "sad"' in lines[0]
+
+
+def test_save_analysis_links_songs_in_the_same_transaction(engine):
+    headers = login_new_user()
+    tracks = [
+        {"id": f"sp-{uuid.uuid4().hex[:8]}", "name": "Uno", "artists": [{"name": "A"}]},
+        {"id": f"sp-{uuid.uuid4().hex[:8]}", "name": "Mal", "artists": ["sin-dict"]},  # Falla solo su savepoint
+        {"id": f"sp-{uuid.uuid4().hex[:8]}", "name": "Dos"},
+    ]
+    saved = client.post(
+        "/v1/analytics/save-analysis",
+        headers=headers,
+        json={"emotion": "happy", "confidence": 0.8, "emotions_detected": {"happy": 0.8}, "recommendations": tracks},
+    )
+    assert saved.status_code == 200
+    assert saved.json()["saved_tracks"] == 2
+    assert len(saved.json()["errors"]) == 1
+
+    analysis_id = client.get("/v1/analytics/history", headers=headers).json()["analyses"][0]["id"]
+    details = client.get(f"/v1/analytics/analysis/{analysis_id}", headers=headers)
+    assert details.status_code == 200
+    assert [t["name"] for t in details.json()["recommendations"]] == ["Uno", "Dos"]
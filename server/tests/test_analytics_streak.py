@@ -0,0 +1,44 @@
+from datetime import date, datetime, timedelta
+from server.controllers.analytics_controller import fetch_latest_streak, read_user_streak, streak_as_of
+from server.db.models.analytics import UserStreak
+from server.tests.test_analytics_controller import seed_user_with_session, add_analysis
+
+
+def test_streak_as_of_tolerates_one_day_ahead():
+    today = date(2024, 6, 10)
+    assert streak_as_of(None, 0, today) == 0
+    assert streak_as_of(today, 3, today) == 3
+    # Fechas UTC pueden caer en "mañana" respecto a la fecha local del servidor
+    assert streak_as_of(today + timedelta(days=1), 4, today) == 4
+    assert streak_as_of(today + timedelta(days=2), 4, today) == 0
+    assert streak_as_of(today - timedelta(days=1), 5, today) == 0
+
+
+def test_streak_counts_calendar_days_across_midnight(db_session):
+    user, session = seed_user_with_session(db_session, "streak_midnight@example.com")
+    add_analysis(db_session, session, "happy", datetime(2024, 6, 8, 23, 59, 59))
+    add_analysis(db_session, session, "happy", datetime(2024, 6, 9, 0, 0, 0))
+    add_analysis(db_session, session, "sad", datetime(2024, 6, 9, 18, 0))
+
+    assert fetch_latest_streak(db_session, user.id) == (date(2024, 6, 9), 2)
+    stored = db_session.get(UserStreak, user.id)
+    assert (stored.ultimo_dia, stored.racha) == (date(2024, 6, 9), 2)
+    assert read_user_streak(db_session, user.id, date(2024, 6, 9)) == 2
+    assert read_user_streak(db_session, user.id, date(2024, 6, 8)) == 2
+    assert read_user_streak(db_session, user.id, date(2024, 6, 10)) == 0
+
+
+def test_streak_gap_resets_and_backdated_day_rebuilds(db_session):
+    user, session = seed_user_with_session(db_session, "streak_gap@example.com")
+    add_analysis(db_session, session, "happy", datetime(2024, 6, 1, 12, 0))
+    add_analysis(db_session, session, "happy", datetime(2024, 6, 2, 12, 0))
+    add_analysis(db_session, session, "happy", datetime(2024, 6, 4, 12, 0))
+
+    stored = db_session.get(UserStreak, user.id)
+    assert (stored.ultimo_dia, stored.racha) == (date(2024, 6, 4), 1)
+
+    # Un análisis con fecha anterior cierra el hueco y obliga a recalcular
+    add_analysis(db_session, session, "sad", datetime(2024, 6, 3, 8, 0))
+    db_session.refresh(stored)
+    assert (stored.ultimo_dia, stored.racha) == (date(2024, 6, 4), 4)
+    assert fetch_latest_streak(db_session, user.id) == (date(2024, 6, 4), 4)
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+from server.controllers.analytics_controller import fetch_confidence_timeline
+from server.utils.downsampling import lttb_indices
+from server.tests.test_analytics_controller import seed_user_with_session, add_analysis
+from server.tests.test_analytics_routes import client, login_new_user
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[123] = 1.0
+    y[777] = -1.0
+
+    selected = lttb_indices(x, y, 20)
+    assert len(selected) == 20
+    assert selected[0] == 0 and selected[-1] == 999
+    assert 123 in selected and 777 in selected
+    assert np.all(np.diff(selected) > 0)
+
+    assert lttb_indices(x[:10], y[:10], 50).tolist() == list(range(10))
+
+
+def test_confidence_timeline_downsamples(db_session):
+    user, session = seed_user_with_session(db_session, "timeline@example.com")
+    start = datetime(2024, 2, 1, 12)
+    for i in range(40):
+        add_analysis(db_session, session, "happy", start + timedelta(hours=i), 0.99 if i == 17 else 0.5)
+    add_analysis(db_session, session, "sad", start + timedelta(days=10), 0.7)
+
+    full = fetch_confidence_timeline(db_session, user.id, points=100)
+    assert full.total_points == full.points == 41
+    assert full.dates[0] == start
+    assert full.emotions[-1] == "sad"
+
+    reduced = fetch_confidence_timeline(db_session, user.id, points=8)
+    assert reduced.total_points == 41 and reduced.points == 8
+    assert 0.99 in reduced.confidence
+    assert reduced.dates == sorted(reduced.dates)
+
+    only_sad = fetch_confidence_timeline(db_session, user.id, emotion="sad")
+    assert only_sad.ids == [full.ids[-1]]
+
+
+def test_confidence_timeline_uses_local_time(db_session):
+    user, session = seed_user_with_session(db_session, "timeline_tz@example.com")
+    add_analysis(db_session, session, "happy", datetime(2024, 3, 1, 2, 0))  # 22:00 del 29/02 en Caracas
+    add_analysis(db_session, session, "sad", datetime(2024, 3, 1, 12, 0))
+    caracas = ZoneInfo("America/Caracas")
+
+    local = fetch_confidence_timeline(db_session, user.id, date_from=datetime(2024, 3, 1), zone=caracas)
+    assert local.timezone == "America/Caracas"
+    assert local.dates == [datetime(2024, 3, 1, 8, 0)]
+    assert fetch_confidence_timeline(db_session, user.id, date_from=datetime(2024, 3, 1)).total_points == 2
+
+
+def test_timeline_route_empty():
+    headers = login_new_user()
+    response = client.get("/v1/analytics/timeline", params={"points": 50}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["points"] == 0
+    assert client.get("/v1/analytics/timeline", params={"tz": "Mars/Olympus"}, headers=headers).status_code == 400
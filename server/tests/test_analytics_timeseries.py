@@ -0,0 +1,89 @@
+from datetime import datetime
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from server.controllers.analytics_controller import (
+    _bucket_series,
+    count_buckets,
+    fetch_timeseries,
+    truncate_datetime,
+)
+from server.tests.test_analytics_controller import seed_user_with_session, add_analysis
+from server.tests.test_analytics_routes import client, login_new_user
+
+
+def test_truncate_datetime():
+    value = datetime(2024, 5, 15, 10, 42, 7)  # Miércoles
+    assert truncate_datetime(value, "hour") == datetime(2024, 5, 15, 10)
+    assert truncate_datetime(value, "day") == datetime(2024, 5, 15)
+    assert truncate_datetime(value, "week") == datetime(2024, 5, 13)
+    assert truncate_datetime(value, "month") == datetime(2024, 5, 1)
+    assert count_buckets(datetime(2023, 11, 1), datetime(2024, 2, 1), "month") == 4
+
+
+def test_daily_series_fills_empty_buckets(db_session):
+    user, session = seed_user_with_session(db_session, "series_day@example.com")
+    add_analysis(db_session, session, "happy", datetime(2024, 5, 1, 9))
+    add_analysis(db_session, session, "happy", datetime(2024, 5, 1, 18))
+    add_analysis(db_session, session, "sad", datetime(2024, 5, 4, 12))
+    add_analysis(db_session, session, "sad", datetime(2024, 5, 9, 12))  # Fuera del rango
+
+    series = fetch_timeseries(db_session, user.id, "day", datetime(2024, 5, 1), datetime(2024, 5, 6))
+
+    assert series.buckets == [datetime(2024, 5, d) for d in range(1, 6)]
+    assert series.total == [2, 0, 0, 1, 0]
+    assert series.emotions == {"happy": [2, 0, 0, 0, 0], "sad": [0, 0, 0, 1, 0]}
+
+
+def test_series_emotion_filter_and_timezone(db_session):
+    user, session = seed_user_with_session(db_session, "series_tz@example.com")
+    add_analysis(db_session, session, "angry", datetime(2024, 6, 1, 2))  # 31 de mayo, 22:00 en Caracas
+    add_analysis(db_session, session, "happy", datetime(2024, 6, 1, 15))
+
+    series = fetch_timeseries(
+        db_session, user.id, "month", datetime(2024, 5, 1), datetime(2024, 7, 1),
+        emotion="angry", zone=ZoneInfo("America/Caracas"),
+    )
+    assert series.buckets == [datetime(2024, 5, 1), datetime(2024, 6, 1)]
+    assert series.total == [1, 0]
+    assert series.emotions == {"angry": [1, 0]}
+
+    empty = fetch_timeseries(db_session, user.id, "week", datetime(2024, 1, 1), datetime(2024, 1, 15))
+    assert empty.total == [0, 0]
+    assert empty.emotions == {}
+
+
+def test_series_rejects_bad_ranges(db_session):
+    user, _ = seed_user_with_session(db_session, "series_bad@example.com")
+    with pytest.raises(HTTPException):
+        fetch_timeseries(db_session, user.id, "day", datetime(2024, 5, 2), datetime(2024, 5, 1))
+    with pytest.raises(HTTPException):
+        fetch_timeseries(db_session, user.id, "hour", datetime(2020, 1, 1), datetime(2024, 1, 1))
+
+
+def test_postgres_series_uses_generate_series():
+    pg = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=postgresql.dialect()))
+    series = _bucket_series(pg, "week", datetime(2024, 1, 1), datetime(2024, 3, 4))
+    sql = str(series.select().compile(dialect=postgresql.dialect()))
+    assert "generate_series" in sql
+    assert "interval '1 week'" in sql
+
+
+def test_timeseries_route_defaults():
+    headers = login_new_user()
+    client.post(
+        "/v1/analytics/save-analysis",
+        headers=headers,
+        json={"emotion": "relaxed", "confidence": 0.8, "emotions_detected": {"relaxed": 0.8}},
+    )
+
+    response = client.get("/v1/analytics/timeseries", params={"granularity": "day"}, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["buckets"]) == 30
+    assert body["total"][-1] == 1
+    assert body["emotions"]["relaxed"][-1] == 1
+
+    assert client.get("/v1/analytics/timeseries", params={"granularity": "year"}, headers=headers).status_code == 422
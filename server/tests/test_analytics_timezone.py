@@ -0,0 +1,78 @@
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+import pytest
+from fastapi import HTTPException
+from server.controllers.analytics_controller import (
+    compute_user_stats,
+    fetch_local_stats_buckets,
+    fetch_stats_buckets,
+    localize_buckets,
+    resolve_timezone,
+)
+from server.tests.test_analytics_controller import seed_user_with_session, add_analysis
+from server.tests.test_analytics_routes import client, login_new_user
+
+
+def test_resolve_timezone():
+    assert resolve_timezone(None).key == "UTC"
+    assert resolve_timezone("America/Caracas").key == "America/Caracas"
+    with pytest.raises(HTTPException) as exc:
+        resolve_timezone("Marte/Olympus")
+    assert exc.value.status_code == 400
+
+
+def test_stats_bucket_in_user_timezone(db_session):
+    user, session = seed_user_with_session(db_session, "tz_caracas@example.com")
+    # 02:30 UTC del jueves = 22:30 del miércoles en Caracas (UTC-4)
+    add_analysis(db_session, session, "happy", datetime(2024, 5, 16, 2, 30), 0.9)
+    add_analysis(db_session, session, "sad", datetime(2024, 5, 15, 12, 0), 0.5)
+
+    utc = compute_user_stats(db_session, user.id, today=date(2024, 5, 16))
+    assert utc.hourly_activity[2] == 1
+    assert [w.analyses_count for w in utc.weekly_activity] == [0, 0, 1, 1, 0, 0, 0]
+    assert utc.streak == 2
+
+    local = compute_user_stats(db_session, user.id, today=date(2024, 5, 15), zone=ZoneInfo("America/Caracas"))
+    assert local.hourly_activity[22] == 1
+    assert local.hourly_activity[8] == 1
+    assert [w.analyses_count for w in local.weekly_activity] == [0, 0, 2, 0, 0, 0, 0]
+    assert local.streak == 1
+    assert local.total_analyses == 2
+    assert abs(local.average_confidence - 0.7) < 1e-9
+
+
+def test_localized_rollup_matches_sql_bucketing(db_session):
+    user, session = seed_user_with_session(db_session, "tz_match@example.com")
+    for when in [datetime(2024, 1, 1, 23, 10), datetime(2024, 1, 2, 0, 5), datetime(2024, 1, 2, 3, 0)]:
+        add_analysis(db_session, session, "relaxed", when)
+
+    zone = ZoneInfo("Asia/Tokyo")
+    from_rollup = localize_buckets(fetch_stats_buckets(db_session, user.id), zone)
+    from_sql = fetch_local_stats_buckets(db_session, user.id, zone)
+    assert sorted((b.day, b.emotion, b.count, b.hours) for b in from_rollup) == \
+        sorted((b.day, b.emotion, b.count, b.hours) for b in from_sql)
+
+
+def test_half_hour_zone_falls_back_to_sql(db_session):
+    user, session = seed_user_with_session(db_session, "tz_kolkata@example.com")
+    add_analysis(db_session, session, "energetic", datetime(2024, 3, 4, 18, 45))  # 00:15 del 5 en India
+
+    zone = ZoneInfo("Asia/Kolkata")
+    assert localize_buckets(fetch_stats_buckets(db_session, user.id), zone) is None
+
+    stats = compute_user_stats(db_session, user.id, today=date(2024, 3, 5), zone=zone)
+    assert stats.hourly_activity[0] == 1
+    assert [w.analyses_count for w in stats.weekly_activity] == [0, 1, 0, 0, 0, 0, 0]
+    assert stats.streak == 1
+
+
+def test_stats_route_accepts_tz():
+    headers = login_new_user()
+
+    utc = client.get("/v1/analytics/stats", headers=headers)
+    local = client.get("/v1/analytics/stats", params={"tz": "America/Bogota"}, headers=headers)
+    assert local.status_code == 200
+    assert local.headers["ETag"] != utc.headers["ETag"]
+
+    invalid = client.get("/v1/analytics/stats", params={"tz": "Nowhere/City"}, headers=headers)
+    assert invalid.status_code == 400
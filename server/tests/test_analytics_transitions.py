@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from server.controllers.analytics_controller import compute_transition_matrix
+from server.db.models.session import Session as UserSession
+from server.services.emotion_catalog import emotion_catalog
+from server.tests.test_analytics_controller import seed_user_with_session, add_analysis
+from server.tests.test_analytics_routes import client, login_new_user
+
+
+def cell(matrix, source, target, field="counts"):
+    return getattr(matrix, field)[matrix.emotions.index(source)][matrix.emotions.index(target)]
+
+
+def test_transition_matrix_counts_and_probabilities(db_session):
+    user, session = seed_user_with_session(db_session, "markov@example.com")
+    start = datetime(2024, 5, 1, 8)
+    for i, name in enumerate(["sad", "relaxed", "sad", "happy", "happy"]):
+        add_analysis(db_session, session, name, start + timedelta(minutes=10 * i))
+    emotion_catalog.load(db_session)
+
+    matrix = compute_transition_matrix(db_session, user.id)
+
+    assert matrix.total_transitions == 4
+    assert cell(matrix, "sad", "relaxed") == 1
+    assert cell(matrix, "sad", "happy") == 1
+    assert cell(matrix, "relaxed", "sad") == 1
+    assert cell(matrix, "happy", "happy") == 1
+    assert cell(matrix, "sad", "relaxed", "probabilities") == 0.5
+    assert sum(matrix.probabilities[matrix.emotions.index("angry")]) == 0.0
+    assert len(matrix.counts) == len(matrix.emotions)
+
+
+def test_transition_scope_and_gap(db_session):
+    user, first = seed_user_with_session(db_session, "markov_scope@example.com")
+    second = UserSession(id_usuario=user.id, fecha_inicio=datetime(2024, 5, 2))
+    db_session.add(second)
+    db_session.commit()
+
+    add_analysis(db_session, first, "angry", datetime(2024, 5, 1, 20, 0))
+    add_analysis(db_session, first, "relaxed", datetime(2024, 5, 1, 20, 5))
+    add_analysis(db_session, second, "happy", datetime(2024, 5, 2, 9, 0))
+    emotion_catalog.load(db_session)
+
+    assert compute_transition_matrix(db_session, user.id).total_transitions == 2
+
+    per_session = compute_transition_matrix(db_session, user.id, scope="session")
+    assert per_session.total_transitions == 1
+    assert cell(per_session, "angry", "relaxed") == 1
+
+    short_gap = compute_transition_matrix(db_session, user.id, max_gap_minutes=30)
+    assert short_gap.total_transitions == 1
+    assert cell(short_gap, "relaxed", "happy") == 0
+
+
+def test_transition_day_scope_uses_local_days(db_session):
+    user, session = seed_user_with_session(db_session, "markov_tz@example.com")
+    # 23:00 y 01:00 UTC caen en días distintos; en Caracas (UTC-4) son 19:00 y 21:00 del mismo día
+    add_analysis(db_session, session, "sad", datetime(2024, 5, 1, 23, 0))
+    add_analysis(db_session, session, "happy", datetime(2024, 5, 2, 1, 0))
+    emotion_catalog.load(db_session)
+
+    assert compute_transition_matrix(db_session, user.id, scope="day").total_transitions == 0
+
+    local = compute_transition_matrix(db_session, user.id, scope="day", zone=ZoneInfo("America/Caracas"))
+    assert local.timezone == "America/Caracas"
+    assert cell(local, "sad", "happy") == 1
+
+
+def test_transition_gap_is_measured_in_utc_across_dst(db_session):
+    user, session = seed_user_with_session(db_session, "markov_dst@example.com")
+    # 3 nov 2024 en Nueva York: 01:30 EDT y, 30 minutos después, 01:00 EST
+    add_analysis(db_session, session, "sad", datetime(2024, 11, 3, 5, 30))
+    add_analysis(db_session, session, "happy", datetime(2024, 11, 3, 6, 0))
+    emotion_catalog.load(db_session)
+    new_york = ZoneInfo("America/New_York")
+
+    kept = compute_transition_matrix(db_session, user.id, scope="day", max_gap_minutes=45, zone=new_york)
+    assert cell(kept, "sad", "happy") == 1
+    dropped = compute_transition_matrix(db_session, user.id, scope="day", max_gap_minutes=20, zone=new_york)
+    assert dropped.total_transitions == 0
+
+
+def test_transitions_route():
+    headers = login_new_user()
+    response = client.get("/v1/analytics/transitions", params={"scope": "session"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["total_transitions"] == 0
+    assert client.get("/v1/analytics/transitions", params={"scope": "week"}, headers=headers).status_code == 422
+    assert client.get("/v1/analytics/transitions", params={"tz": "Mars/Olympus"}, headers=headers).status_code == 400
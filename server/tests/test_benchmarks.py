@@ -0,0 +1,47 @@
+import random
+from datetime import datetime
+from server.benchmarks.__main__ import main
+from server.benchmarks.runner import compare_results, run_benchmarks, save_results, summarize
+from server.benchmarks.synthetic import synthetic_timestamp
+
+
+def test_summarize():
+    summary = summarize([3.0, 1.0, 2.0, 10.0])
+    assert summary['min_ms'] == 1.0
+    assert summary['median_ms'] == 2.5
+    assert summary['p95_ms'] == 10.0
+    assert summary['runs'] == 4
+
+
+def test_synthetic_timestamps_never_pass_now():
+    rng = random.Random(7)
+    now = datetime(2024, 6, 1, 3, 15)
+    timestamps = [synthetic_timestamp(rng, now, days=2) for _ in range(500)]
+    assert max(timestamps) <= now
+    assert any(ts.date() == now.date() for ts in timestamps)
+
+
+def test_run_small_population(tmp_path):
+    results = run_benchmarks(f"sqlite:///{tmp_path / 'bench.db'}", sizes=[40], repeat=2)
+
+    assert results['meta']['dialect'] == 'sqlite'
+    measured = results['results']['40']
+    for name in ('stats_cold', 'stats_warm', 'history_first_page', 'analysis_details', 'save_analysis'):
+        assert measured[name]['runs'] == 2
+        assert measured[name]['median_ms'] > 0
+
+
+def test_compare_flags_regressions(tmp_path):
+    baseline = {'results': {'1000': {'stats_cold': {'median_ms': 10.0}, 'seed_seconds': 1.0}}}
+    slower = {'results': {'1000': {'stats_cold': {'median_ms': 13.0}, 'seed_seconds': 9.0}}}
+
+    rows = compare_results(baseline, slower, threshold=0.2)
+    assert rows == [{
+        'size': '1000', 'endpoint': 'stats_cold', 'baseline_ms': 10.0,
+        'current_ms': 13.0, 'change': 0.3, 'regression': True,
+    }]
+    assert not compare_results(baseline, slower, threshold=0.5)[0]['regression']
+
+    save_results(baseline, tmp_path / "base.json")
+    save_results(slower, tmp_path / "current.json")
+    assert main(["compare", str(tmp_path / "base.json"), str(tmp_path / "current.json")]) == 1
@@ -0,0 +1,51 @@
+from server.db.models.analysis import Emotion
+from server.services.emotion_catalog import EmotionCatalog, BASIC_EMOTIONS, MISS_TTL_SECONDS
+from server.tests.test_analytics_cache import FakeClock
+
+
+def test_load_seeds_basic_emotions(db_session):
+    catalog = EmotionCatalog()
+    catalog.load(db_session)
+    for name in BASIC_EMOTIONS:
+        emotion_id = catalog.id_for(db_session, name)
+        assert emotion_id is not None
+        assert catalog.name_for(db_session, emotion_id) == name
+
+
+def test_unknown_emotion_triggers_refresh_and_create(db_session):
+    catalog = EmotionCatalog()
+    catalog.load(db_session)
+
+    # Creada por "otro worker": el catálogo la descubre al recargar
+    other = Emotion(nombre="catalog_external")
+    db_session.add(other)
+    db_session.commit()
+    assert catalog.id_for(db_session, "catalog_external") == other.id
+    assert catalog.name_for(db_session, other.id) == "catalog_external"
+
+    created_id = catalog.get_or_create_id(db_session, "catalog_new")
+    assert db_session.get(Emotion, created_id).nombre == "catalog_new"
+    assert catalog.get_or_create_id(db_session, "catalog_new") == created_id
+    assert catalog.ids_for(db_session, "catalog_missing") == ()
+
+
+def test_unknown_names_do_not_reload_on_every_lookup(db_session):
+    clock = FakeClock()
+    catalog = EmotionCatalog(clock=clock)
+    catalog.load(db_session)
+    reloads = catalog.reloads
+
+    for _ in range(5):
+        assert catalog.ids_for(db_session, "catalog_bogus") == ()
+        assert catalog.name_for(db_session, 987654) is None
+    assert catalog.reloads == reloads + 2  # Una por el nombre y otra por el id
+
+    # Tras el TTL se vuelve a mirar la tabla (p. ej. la creó otro worker)
+    db_session.add(Emotion(nombre="catalog_bogus"))
+    db_session.commit()
+    clock.now += MISS_TTL_SECONDS + 1
+    assert catalog.ids_for(db_session, "catalog_bogus") != ()
+
+    # Una inserción propia recarga y limpia los desconocidos
+    created = catalog.get_or_create_id(db_session, "catalog_created_after_miss")
+    assert catalog.id_for(db_session, "catalog_created_after_miss") == created
@@ -0,0 +1,191 @@
+import asyncio
+import io
+import random
+from PIL import Image, ImageFilter
+from server.services.face_result_cache import FaceResultCache
+from server.tests.test_analytics_cache import FakeClock
+from server.utils.image import dhash
+
+
+def photo(seed: int, size=(320, 240)) -> Image.Image:
+    # Bloques aleatorios ampliados: estructura visible que sobrevive a recomprimir
+    rng = random.Random(seed)
+    small = Image.frombytes("L", (16, 12), rng.randbytes(16 * 12)).convert("RGB")
+    return small.resize(size, Image.BILINEAR)
+
+
+def encode(img: Image.Image, quality: int = 90) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+class FakeRekognition:
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.delay = delay
+
+    async def detect_faces(self, data):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"success": True, "faces": [{"emotions": [{"Type": "HAPPY", "Confidence": 99.0}]}], "call": self.calls}
+
+
+async def prepare(data):
+    return data, {"original_bytes": len(data), "processed_bytes": len(data)}
+
+
+def test_dhash_is_stable_for_near_duplicates():
+    base = photo(1)
+    original = dhash(encode(base))
+    recompressed = dhash(encode(base.filter(ImageFilter.GaussianBlur(1)), quality=40))
+    other = dhash(encode(photo(2)))
+    assert (original ^ recompressed).bit_count() <= 6
+    assert (original ^ other).bit_count() > 12
+
+
+def test_exact_similar_and_miss():
+    cache = FaceResultCache(ttl_seconds=60, max_entries=10, max_distance=6)
+    rekognition = FakeRekognition()
+    first = encode(photo(1))
+    retake = encode(photo(1).filter(ImageFilter.GaussianBlur(1)), quality=40)
+
+    async def run():
+        return [
+            await cache.detect(first, prepare, rekognition.detect_faces, "alice"),
+            await cache.detect(first, prepare, rekognition.detect_faces, "alice"),
+            await cache.detect(retake, prepare, rekognition.detect_faces, "alice"),
+            await cache.detect(encode(photo(3)), prepare, rekognition.detect_faces, "alice"),
+        ]
+
+    outcomes = asyncio.run(run())
+    assert [o.cache_status for o in outcomes] == ["miss", "exact", "similar", "miss"]
+    assert rekognition.calls == 2
+    assert outcomes[2].result["call"] == 1
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["similar_hits"], stats["misses"]) == (1, 1, 2)
+
+
+def test_similar_matches_stay_within_the_same_user():
+    cache = FaceResultCache(ttl_seconds=60, max_entries=10, max_distance=6)
+    rekognition = FakeRekognition()
+    first = encode(photo(1))
+    retake = encode(photo(1).filter(ImageFilter.GaussianBlur(1)), quality=40)
+
+    async def run():
+        return [
+            await cache.detect(first, prepare, rekognition.detect_faces, "alice"),
+            await cache.detect(retake, prepare, rekognition.detect_faces, "bob"),
+            await cache.detect(first, prepare, rekognition.detect_faces, "bob"),
+            await cache.detect(encode(photo(1), quality=60), prepare, rekognition.detect_faces, None),
+        ]
+
+    outcomes = asyncio.run(run())
+    # Otro usuario (o sin usuario) solo aprovecha los aciertos exactos por SHA-256
+    assert [o.cache_status for o in outcomes] == ["miss", "miss", "exact", "miss"]
+    assert outcomes[1].result["call"] == 2
+    assert rekognition.calls == 3
+
+
+def test_similar_hits_are_not_exact_hits_for_other_users():
+    cache = FaceResultCache(ttl_seconds=60, max_entries=10, max_distance=6)
+    rekognition = FakeRekognition()
+    first = encode(photo(1))
+    retake = encode(photo(1).filter(ImageFilter.GaussianBlur(1)), quality=40)
+
+    async def run():
+        return [
+            await cache.detect(first, prepare, rekognition.detect_faces, "alice"),
+            await cache.detect(retake, prepare, rekognition.detect_faces, "alice"),
+            await cache.detect(retake, prepare, rekognition.detect_faces, "alice"),
+            await cache.detect(retake, prepare, rekognition.detect_faces, "bob"),
+            await cache.detect(retake, prepare, rekognition.detect_faces, "alice"),
+        ]
+
+    outcomes = asyncio.run(run())
+    assert [o.cache_status for o in outcomes] == ["miss", "similar", "exact", "miss", "exact"]
+    assert outcomes[3].result["call"] == 2  # Bob obtiene su propia respuesta, no la de Alice
+    assert outcomes[4].result["call"] == 2  # Ya es una respuesta real de esos bytes: se comparte
+
+
+def test_identical_uploads_from_different_users_share_one_call():
+    cache = FaceResultCache(ttl_seconds=60, max_entries=10, max_distance=6)
+    rekognition = FakeRekognition(delay=0.05)
+    image = encode(photo(4))
+
+    async def run():
+        return await asyncio.gather(*[cache.detect(image, prepare, rekognition.detect_faces, user) for user in ("a", "b", "c")])
+
+    outcomes = asyncio.run(run())
+    assert rekognition.calls == 1
+    assert sorted(o.cache_status for o in outcomes) == ["miss", "shared", "shared"]
+
+
+def test_waiter_from_another_user_does_not_share_a_similar_hit():
+    cache = FaceResultCache(ttl_seconds=60, max_entries=10, max_distance=6)
+    rekognition = FakeRekognition()
+    retake = encode(photo(1).filter(ImageFilter.GaussianBlur(1)), quality=40)
+
+    async def run():
+        await cache.detect(encode(photo(1)), prepare, rekognition.detect_faces, "alice")
+        owner = asyncio.create_task(cache.detect(retake, prepare, rekognition.detect_faces, "alice"))
+        waiter = asyncio.create_task(cache.detect(retake, prepare, rekognition.detect_faces, "bob"))
+        return await owner, await waiter
+
+    owner, waiter = asyncio.run(run())
+    assert owner.cache_status == "similar"
+    assert waiter.cache_status == "miss" and waiter.result["call"] == 2
+    assert cache.stats()["coalesced"] == 1
+
+
+def test_waiters_retry_when_the_owner_is_cancelled():
+    cache = FaceResultCache(ttl_seconds=60, max_entries=10, max_distance=-1)
+    rekognition = FakeRekognition(delay=0.05)
+    image = encode(photo(9))
+
+    async def run():
+        owner = asyncio.create_task(cache.detect(image, prepare, rekognition.detect_faces, "alice"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.detect(image, prepare, rekognition.detect_faces, "alice"))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        return await waiter
+
+    outcome = asyncio.run(run())
+    assert outcome.cache_status == "miss"
+    assert outcome.result["success"]
+    assert rekognition.calls == 2
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_concurrent_identical_uploads_share_one_call():
+    cache = FaceResultCache(ttl_seconds=60, max_entries=10, max_distance=-1)
+    rekognition = FakeRekognition(delay=0.05)
+    image = encode(photo(4))
+
+    async def run():
+        return await asyncio.gather(*[cache.detect(image, prepare, rekognition.detect_faces) for _ in range(5)])
+
+    outcomes = asyncio.run(run())
+    assert rekognition.calls == 1
+    assert sorted(o.cache_status for o in outcomes) == ["miss"] + ["shared"] * 4
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_failures_are_not_cached_and_ttl_lru_apply():
+    clock = FakeClock()
+    cache = FaceResultCache(ttl_seconds=10, max_entries=2, max_distance=-1, clock=clock)
+
+    async def failing(data):
+        return {"success": False, "error": "boom"}
+
+    image = encode(photo(5))
+    assert asyncio.run(cache.detect(image, prepare, failing)).cache_status == "miss"
+    assert cache.stats()["entries"] == 0
+
+    for seed in (6, 7, 8):
+        cache.put(f"digest-{seed}", None, {"success": True})
+    assert cache.get("digest-6") is None  # Expulsada por LRU
+    assert cache.get("digest-8") is not None
+    clock.now += 11
+    assert cache.get("digest-8") is None
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from sqlalchemy.orm import sessionmaker
+from server.controllers.admin_analytics_controller import fetch_global_analytics
+from server.db.models.analytics import AnalyticsJobState
+from server.services.emotion_catalog import emotion_catalog
+from server.services.global_analytics import JOB_NAME, refresh_global_aggregates, refresh_global_batch
+from server.utils.hyperloglog import HyperLogLog
+from server.tests.test_analytics_controller import seed_user_with_session, add_analysis
+from server.tests.test_analytics_routes import client, login_new_user
+
+
+def test_hyperloglog_estimates_and_merges():
+    first, second = HyperLogLog(12), HyperLogLog(12)
+    first.update(range(0, 6000))
+    second.update(range(4000, 10000))
+    assert abs(first.count() - 6000) / 6000 < 0.05
+
+    first.merge(HyperLogLog.from_bytes(second.to_bytes()))
+    assert abs(first.count() - 10000) / 10000 < 0.05
+
+    hours = [HyperLogLog(12) for _ in range(3)]
+    for i, sketch in enumerate(hours):
+        sketch.update(range(i * 3000, i * 3000 + 4000))
+    union = HyperLogLog.union(12, [memoryview(sketch.to_bytes()) for sketch in hours])
+    assert abs(union.count() - 10000) / 10000 < 0.05
+    assert HyperLogLog.union(12, []).count() == 0
+
+    small = HyperLogLog(12)
+    small.update([1, 2, 3, 3, 3])
+    assert small.count() == 3
+
+
+def test_incremental_refresh_and_read(db_session, engine):
+    emotion_catalog.load(db_session)
+    refresh_global_aggregates(sessionmaker(bind=engine))
+    later = datetime.utcnow() + timedelta(minutes=5)
+    refresh_global_batch(db_session, batch_size=100000, now=later)  # Lo que dejaron otros tests
+
+    alice, alice_session = seed_user_with_session(db_session, "global_a@example.com")
+    bob, bob_session = seed_user_with_session(db_session, "global_b@example.com")
+    add_analysis(db_session, alice_session, "happy", datetime(2019, 3, 1, 10, 5), 0.8)
+    add_analysis(db_session, alice_session, "happy", datetime(2019, 3, 1, 10, 50), 0.6)
+    add_analysis(db_session, bob_session, "sad", datetime(2019, 3, 1, 12, 0), 0.4)
+
+    assert refresh_global_batch(db_session, batch_size=2, now=later) == 2
+    assert refresh_global_batch(db_session, batch_size=2, now=later) == 1
+    assert refresh_global_batch(db_session, batch_size=2, now=later) == 0
+
+    window = dict(date_from=datetime(2019, 3, 1, 9), date_to=datetime(2019, 3, 1, 13))
+    view = fetch_global_analytics(db_session, **window)
+    assert view.hours[0] == datetime(2019, 3, 1, 9) and len(view.hours) == 4
+    assert view.analyses_per_hour == [0, 2, 0, 1]
+    assert view.total_analyses == 3
+    assert abs(view.average_confidence - 0.6) < 1e-9
+    assert [(e.emotion, e.count) for e in view.emotions_distribution] == [("happy", 2), ("sad", 1)]
+    assert view.distinct_users_estimate == 2
+    assert view.high_water_mark == db_session.get(AnalyticsJobState, JOB_NAME).ultimo_id
+
+    # Un análisis recién insertado espera al siguiente ciclo (COMMIT_LAG)
+    recent = add_analysis(db_session, bob_session, "sad", datetime.utcnow())
+    assert refresh_global_batch(db_session) == 0
+    assert refresh_global_batch(db_session, now=later + timedelta(minutes=5)) == 1
+    assert db_session.get(AnalyticsJobState, JOB_NAME).ultimo_id == recent.id
+
+
+def test_global_route_requires_admin():
+    headers = login_new_user()
+    assert client.get("/v1/admin/analytics/global", headers=headers).status_code == 403
@@ -0,0 +1,145 @@
+import base64
+import io
+import json
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from server.tests.test_analytics_routes import client, login_new_user
+from server.utils.image import Base64StreamDecoder, ImageBuffer, JsonImageFieldReader, validate_image
+
+
+def tiny_png() -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (4, 4), (200, 30, 30)).save(out, format="PNG")
+    return out.getvalue()
+
+
+def feed_in_chunks(reader, payload: bytes, size: int) -> None:
+    for i in range(0, len(payload), size):
+        reader.feed(payload[i:i + size])
+    reader.close()
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64])
+def test_base64_decoder_handles_any_chunk_split(size):
+    raw = tiny_png()
+    encoded = b"data:image/png;base64," + base64.b64encode(raw)
+    buffer = ImageBuffer()
+    feed_in_chunks(Base64StreamDecoder(buffer), encoded, size)
+    assert bytes(buffer.data) == raw
+    assert validate_image(buffer) == "PNG"
+
+
+def test_base64_decoder_accepts_plain_base64_with_newlines():
+    raw = tiny_png()
+    encoded = base64.encodebytes(raw)  # Líneas de 76 caracteres
+    buffer = ImageBuffer()
+    feed_in_chunks(Base64StreamDecoder(buffer), encoded, 5)
+    assert bytes(buffer.data) == raw
+
+
+@pytest.mark.parametrize("payload", [b"abc", b"ab!d", b"data:image/png;base64"])
+def test_base64_decoder_rejects_invalid_input(payload):
+    with pytest.raises(HTTPException) as exc:
+        feed_in_chunks(Base64StreamDecoder(ImageBuffer()), payload, 2)
+    assert exc.value.status_code == 400
+
+
+def test_buffer_limit_is_enforced_while_decoding():
+    buffer = ImageBuffer(limit=16)
+    decoder = Base64StreamDecoder(buffer)
+    with pytest.raises(HTTPException) as exc:
+        decoder.feed(base64.b64encode(b"x" * 64))
+    assert exc.value.status_code == 413
+    assert len(buffer) <= 16
+
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+def test_json_reader_extracts_image_field_with_escaped_slashes(size):
+    raw = tiny_png()
+    value = "data:image/png;base64," + base64.b64encode(raw).decode()
+    body = json.dumps({"note": "x", "image": value}).replace("/", "\\/").encode()
+    buffer = ImageBuffer()
+    feed_in_chunks(JsonImageFieldReader(Base64StreamDecoder(buffer)), body, size)
+    assert bytes(buffer.data) == raw
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_json_reader_decodes_escaped_newlines_and_unicode(size):
+    raw = tiny_png()
+    # encodebytes parte el base64 en líneas que json.dumps escribe como \n; la "d" de data: se escapa a mano
+    value = "data:image/png;base64,\r\n" + base64.encodebytes(raw).decode()
+    body = json.dumps({"image": value}).replace('"data', '"\\u0064ata').encode()
+    assert b"\\n" in body and b"\\u0064" in body
+    buffer = ImageBuffer()
+    feed_in_chunks(JsonImageFieldReader(Base64StreamDecoder(buffer)), body, size)
+    assert bytes(buffer.data) == raw
+
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+def test_json_reader_only_matches_top_level_key(size):
+    raw = tiny_png()
+    body = json.dumps({
+        "note": 'texto con "image": "AAAA" dentro',
+        "meta": {"image": "QUJD", "list": [{"image": 1}, "]"]},
+        "image": base64.b64encode(raw).decode(),
+    }).encode()
+    buffer = ImageBuffer()
+    feed_in_chunks(JsonImageFieldReader(Base64StreamDecoder(buffer)), body, size)
+    assert bytes(buffer.data) == raw
+
+
+def test_json_reader_requires_image_field():
+    with pytest.raises(HTTPException) as exc:
+        feed_in_chunks(JsonImageFieldReader(Base64StreamDecoder(ImageBuffer())), b'{"foto": "abcd"}', 3)
+    assert exc.value.status_code == 400
+
+    with pytest.raises(HTTPException) as exc:
+        feed_in_chunks(JsonImageFieldReader(Base64StreamDecoder(ImageBuffer())), b'{"meta": {"image": "abcd"}}', 3)
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.parametrize("body", [b'{"image": null}', b'{"image": 12}', b'["image"]', b'{"image" "abcd"}', b'{"image": "ab'])
+def test_json_reader_rejects_non_string_image_with_422(body):
+    with pytest.raises(HTTPException) as exc:
+        feed_in_chunks(JsonImageFieldReader(Base64StreamDecoder(ImageBuffer())), body, 2)
+    assert exc.value.status_code == 422
+
+
+def test_analyze_binary_and_base64_routes(engine):
+    headers = login_new_user()
+    raw = tiny_png()
+
+    binary = client.post("/v1/analysis/analyze-binary", content=raw, headers={**headers, "Content-Type": "image/png"})
+    assert binary.status_code == 200
+    assert binary.json()["emotion"]
+
+    encoded = client.post(
+        "/v1/analysis/analyze-base64",
+        json={"image": "data:image/png;base64," + base64.b64encode(raw).decode()},
+        headers=headers,
+    )
+    assert encoded.status_code == 200
+    assert encoded.json()["emotion"]
+
+    null_image = client.post("/v1/analysis/analyze-base64", json={"image": None}, headers=headers)
+    assert null_image.status_code == 422
+
+    upload = client.post("/v1/analysis/analyze", files={"image": ("face.png", raw, "image/png")}, headers=headers)
+    assert upload.status_code == 200
+
+
+def test_analyze_binary_rejects_bad_input(engine):
+    headers = login_new_user()
+    wrong_type = client.post("/v1/analysis/analyze-binary", content=b"{}", headers={**headers, "Content-Type": "application/json"})
+    assert wrong_type.status_code == 415
+
+    not_an_image = client.post("/v1/analysis/analyze-binary", content=b"hello", headers={**headers, "Content-Type": "application/octet-stream"})
+    assert not_an_image.status_code == 400
+
+    too_large = client.post(
+        "/v1/analysis/analyze-binary",
+        content=b"\0" * 1024,
+        headers={**headers, "Content-Type": "application/octet-stream", "Content-Length": str(50 * 1024 * 1024)},
+    )
+    assert too_large.status_code == 413
@@ -0,0 +1,81 @@
+import asyncio
+import io
+import random
+from PIL import Image
+from server.services.image_preprocessing import ImagePreprocessor
+from server.utils.image import EXIF_ORIENTATION, prepare_for_rekognition
+
+
+def encode(img: Image.Image, fmt: str, **kwargs) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format=fmt, **kwargs)
+    return out.getvalue()
+
+
+def noisy_image(size) -> Image.Image:
+    # Ruido: la imagen no se comprime casi nada y pesa como una foto real
+    return Image.frombytes("RGB", size, random.Random(7).randbytes(size[0] * size[1] * 3))
+
+
+def test_large_image_is_downscaled_and_reencoded():
+    original = encode(noisy_image((2400, 1600)), "PNG")
+    data, info = prepare_for_rekognition(original, max_edge=800, quality=80)
+
+    assert info["reencoded"] is True
+    assert (info["width"], info["height"]) == (800, 533)
+    assert len(data) < len(original)
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.format == "JPEG"
+        assert img.size == (800, 533)
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6  # Rotada 90° (foto de móvil en vertical)
+    original = encode(Image.new("RGB", (300, 100), (10, 200, 10)), "JPEG", exif=exif)
+    data, info = prepare_for_rekognition(original, max_edge=1280, quality=85)
+
+    assert info["reencoded"] is True
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.size == (100, 300)
+
+
+def test_small_jpeg_is_sent_untouched():
+    original = encode(Image.new("RGB", (64, 64), (0, 0, 255)), "JPEG")
+    data, info = prepare_for_rekognition(original, max_edge=1280, quality=85)
+    assert data is original
+    assert info["reencoded"] is False
+
+
+def test_webp_and_transparency_become_jpeg():
+    original = encode(Image.new("RGBA", (50, 40), (255, 0, 0, 0)), "WEBP")
+    data, info = prepare_for_rekognition(original, max_edge=1280, quality=85)
+    assert info["format"] == "JPEG"
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.mode == "RGB"
+        assert img.getpixel((0, 0)) > (240, 240, 240)  # Fondo blanco, no negro
+
+
+def test_preprocessor_reports_savings_and_falls_back_on_errors():
+    preprocessor = ImagePreprocessor(max_edge=400, quality=80, workers=2)
+    original = bytearray(encode(noisy_image((1200, 900)), "PNG"))
+
+    async def run():
+        return await asyncio.gather(*[preprocessor.process(original) for _ in range(4)], preprocessor.process(b"not an image"))
+
+    try:
+        *results, broken = asyncio.run(run())
+    finally:
+        preprocessor.shutdown()
+
+    for result in results:
+        assert result.report["bytes_saved"] == len(original) - len(result.data) > 0
+        assert result.report["elapsed_ms"] >= 0
+        assert "queue_ms" in result.report
+    assert broken.data == b"not an image"
+    assert "error" in broken.report
+
+    stats = preprocessor.stats()
+    assert stats["processed"] == 4
+    assert stats["failed"] == 1
+    assert stats["bytes_saved"] > 0
@@ -0,0 +1,53 @@
+import asyncio
+from server.core.security import create_access_token
+from server.services import recommendations
+from server.services.recommendations import get_music_recommendations, mockup_tracks, spotify_access_token
+
+
+def spotify_header(access_token: str = "spotify-token") -> str:
+    jwt = create_access_token({"sub": "user@example.com", "spotify": {"access_token": access_token}})
+    return f"Bearer {jwt}"
+
+
+def test_spotify_token_is_read_from_app_jwt():
+    assert spotify_access_token(spotify_header("abc")) == "abc"
+    assert spotify_access_token(f"Bearer {create_access_token({'sub': 'x'})}") is None
+    assert spotify_access_token("Bearer not-a-jwt") is None
+    assert spotify_access_token(None) is None
+
+
+def test_mockup_tracks_do_not_mutate_shared_data():
+    tracks = mockup_tracks("HAPPY")
+    assert tracks
+    tracks[0]["name"] = "changed"
+    assert all(t["name"] != "changed" for t in recommendations.load_mock_data()["tracks"])
+
+
+def test_uses_spotify_in_process_when_token_present(monkeypatch):
+    calls = []
+
+    def fake_spotify(access_token, emotion):
+        calls.append((access_token, emotion))
+        return {"tracks": [{"name": "From Spotify"}]}
+
+    monkeypatch.setattr(recommendations, "recommend_songs_by_emotion", fake_spotify)
+    tracks = asyncio.run(get_music_recommendations(spotify_header("tok"), "sad"))
+    assert tracks == [{"name": "From Spotify"}]
+    assert calls == [("tok", "sad")]
+
+
+def test_falls_back_to_mockup(monkeypatch):
+    def expired(access_token, emotion):
+        return {"error": "token_expired", "tracks": []}
+
+    def broken(access_token, emotion):
+        raise RuntimeError("spotify down")
+
+    for fake in (expired, broken):
+        monkeypatch.setattr(recommendations, "recommend_songs_by_emotion", fake)
+        tracks = asyncio.run(get_music_recommendations(spotify_header(), "relaxed"))
+        assert tracks and "From Spotify" not in [t["name"] for t in tracks]
+
+    # Sin token de Spotify ni emoción conocida: nunca lanza
+    assert asyncio.run(get_music_recommendations(None, "happy"))
+    assert asyncio.run(get_music_recommendations(None, None)) == []
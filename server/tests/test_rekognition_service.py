@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+from server.services.aws_rekognition_service import AWSRekognitionService
+
+
+class SlowClient:
+    """Cliente boto3 falso: bloquea el hilo como una llamada real a AWS"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def detect_faces(self, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return {"FaceDetails": [{"Emotions": [{"Type": "HAPPY", "Confidence": 90.0}], "Confidence": 99.0}]}
+
+
+def make_service(delay: float, concurrency: int, timeout: float) -> AWSRekognitionService:
+    service = AWSRekognitionService()
+    service.client = SlowClient(delay)
+    service.max_concurrency = concurrency
+    service.timeout_seconds = timeout
+    return service
+
+
+def test_calls_run_off_the_event_loop_with_bounded_concurrency():
+    service = make_service(delay=0.1, concurrency=2, timeout=5)
+    snapshots = []
+
+    async def watch():
+        # Si boto3 bloqueara el loop, este contador apenas avanzaría
+        ticks = 0
+        while service.completed < 6:
+            snapshots.append(service.metrics())
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks
+
+    async def run():
+        return await asyncio.gather(watch(), *[service.detect_faces(b"img") for _ in range(6)])
+
+    try:
+        ticks, *results = asyncio.run(run())
+    finally:
+        service.shutdown()
+
+    assert all(result["success"] and result["face_count"] == 1 for result in results)
+    assert service.client.peak == 2
+    assert ticks >= 10
+    assert max(s["queue_depth"] for s in snapshots) >= 1
+    assert max(s["in_flight"] for s in snapshots) == 2
+
+    metrics = service.metrics()
+    assert metrics["completed"] == 6
+    assert metrics["in_flight"] == 0 and metrics["queue_depth"] == 0
+    assert metrics["errors"] == 0
+
+
+def test_timeout_returns_error_result():
+    service = make_service(delay=0.5, concurrency=1, timeout=0.05)
+    try:
+        result = asyncio.run(service.detect_faces(b"img"))
+    finally:
+        service.shutdown()
+
+    assert result["success"] is False
+    assert "timed out" in result["error"]
+    assert result["faces"] == []
+    metrics = service.metrics()
+    assert metrics["timeouts"] == 1
+    assert metrics["errors"] == 1
+
+
+def test_timed_out_call_keeps_its_permit_until_the_thread_finishes():
+    service = make_service(delay=0.3, concurrency=1, timeout=0.05)
+
+    async def run():
+        first = await service.detect_faces(b"img")
+        held = service.metrics()["in_flight"]
+        started = time.perf_counter()
+        second = await service.detect_faces(b"img")
+        return first, held, time.perf_counter() - started, second
+
+    try:
+        first, held, waited, second = asyncio.run(run())
+        assert not first["success"] and not second["success"]
+        assert held == 1  # El hilo sigue ocupado tras el timeout
+        assert waited >= 0.2  # La segunda llamada esperó a que el hilo abandonado terminara
+        time.sleep(0.4)
+    finally:
+        service.shutdown()
+
+    metrics = service.metrics()
+    assert metrics["in_flight"] == 0
+    assert metrics["completed"] == 2
+    assert service.client.peak == 1
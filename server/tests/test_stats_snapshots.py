@@ -0,0 +1,73 @@
+from server.services.stats_snapshots import StatsSnapshotStore, refresh_snapshot
+from server.tests.test_analytics_cache import FakeClock
+from server.tests.test_analytics_routes import client, login_new_user
+
+
+def test_single_flight_and_version_order():
+    clock = FakeClock()
+    store = StatsSnapshotStore(max_entries=2, clock=clock)
+
+    assert store.begin_refresh(1, "stats")
+    assert not store.begin_refresh(1, "stats")
+    assert store.begin_refresh(2, "stats")
+    store.end_refresh(1, "stats")
+    assert store.begin_refresh(1, "stats")
+    assert store.stats()["coalesced"] == 1
+
+    store.put(1, "stats", {"total": 2}, (10, 2))
+    store.put(1, "stats", {"total": 1}, (5, 1))  # Recálculo viejo que terminó tarde
+    assert store.get(1, "stats").data == {"total": 2}
+    clock.now += 30
+    assert store.age(store.get(1, "stats")) == 30
+
+    store.put(2, "stats", {}, (1, 1))
+    store.put(3, "stats", {}, (1, 1))
+    assert store.get(1, "stats") is None  # LRU
+
+
+def test_refresh_releases_flag_on_error():
+    store = StatsSnapshotStore(max_entries=10)
+    closed = []
+
+    class BrokenSession:
+        def query(self, *args):
+            raise RuntimeError("db caída")
+
+        def close(self):
+            closed.append(True)
+
+    assert store.begin_refresh(7, "stats")
+    refresh_snapshot(store, BrokenSession, 7, "stats", lambda db: {})
+    assert closed == [True]
+    assert not store.is_refreshing(7, "stats")
+    assert store.get(7, "stats") is None
+
+
+def test_swr_serves_snapshot_then_refreshes():
+    headers = login_new_user()
+    params = {"mode": "swr"}
+
+    first = client.get("/v1/analytics/stats", params=params, headers=headers)
+    assert first.status_code == 200
+    assert first.headers["X-Stats-Stale"] == "0"
+
+    client.post(
+        "/v1/analytics/save-analysis",
+        headers=headers,
+        json={"emotion": "happy", "confidence": 0.9, "emotions_detected": {"happy": 0.9}},
+    )
+
+    # Se sirve el snapshot anterior y el recálculo corre después de la respuesta
+    stale = client.get("/v1/analytics/stats", params=params, headers=headers)
+    assert stale.headers["X-Stats-Stale"] == "1"
+    assert stale.json()["total_analyses"] == 0
+    assert "Age" in stale.headers
+
+    refreshed = client.get("/v1/analytics/stats", params=params, headers=headers)
+    assert refreshed.headers["X-Stats-Stale"] == "0"
+    assert refreshed.json()["total_analyses"] == 1
+
+    not_modified = client.get(
+        "/v1/analytics/stats", params=params, headers={**headers, "If-None-Match": refreshed.headers["ETag"]}
+    )
+    assert not_modified.status_code == 304
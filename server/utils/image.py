@@ -0,0 +1,416 @@
+"""
+Entrada de imágenes para el análisis de emociones.
+
+Todas las rutas (multipart, binario crudo y base64) escriben en un único
+ImageBuffer que aplica el límite de tamaño mientras se lee. El base64 se
+decodifica por partes, así que nunca existe la cadena completa en memoria:
+el pico por petición es ~1× el tamaño de la imagen.
+"""
+import binascii
+import io
+import json
+import re
+from typing import Dict, Optional, Tuple
+import numpy as np
+from fastapi import HTTPException, Request, UploadFile, status
+from PIL import Image, ImageOps
+from server.core.config import settings
+
+READ_CHUNK_SIZE = 64 * 1024
+EXIF_ORIENTATION = 0x0112
+# Formatos que Rekognition acepta tal cual
+REKOGNITION_FORMATS = ("JPEG", "PNG")
+_DATA_URL_PREFIX_MAX = 256
+_BASE64_WHITESPACE = b" \t\r\n"
+
+
+def image_too_large(limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"La imagen supera el tamaño máximo de {limit // (1024 * 1024)} MB"
+    )
+
+
+class ImageBuffer:
+    """Buffer único de la imagen; corta la lectura en cuanto se supera el límite"""
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit or settings.ANALYSIS_MAX_IMAGE_BYTES
+        self.data = bytearray()
+
+    def write(self, chunk) -> None:
+        if len(self.data) + len(chunk) > self.limit:
+            raise image_too_large(self.limit)
+        self.data += chunk
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def reader(self) -> "BufferReader":
+        return BufferReader(self.data)
+
+
+class BufferReader(io.RawIOBase):
+    """Archivo de solo lectura sobre el buffer, sin copiarlo (io.BytesIO copiaría el bytearray)"""
+
+    def __init__(self, data):
+        self._view = memoryview(data)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        size = max(0, min(len(target), len(self._view) - self._position))
+        target[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+class Base64StreamDecoder:
+    """
+    Decodifica base64 recibido por partes y escribe los bytes en un ImageBuffer.
+    Acepta el prefijo data:image/...;base64, y saltos de línea o espacios.
+    """
+
+    def __init__(self, sink: ImageBuffer):
+        self.sink = sink
+        self._pending = b""
+        self._head: Optional[bytes] = b""  # None cuando ya se resolvió el prefijo data:
+
+    def feed(self, chunk: bytes) -> None:
+        if self._head is not None:
+            chunk = self._strip_prefix(bytes(chunk), final=False)
+            if chunk is None:
+                return
+
+        data = self._pending + bytes(chunk).translate(None, _BASE64_WHITESPACE)
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        if usable:
+            self._decode(data[:usable])
+
+    def close(self) -> None:
+        if self._head is not None:
+            self.feed(self._strip_prefix(b"", final=True))
+        if self._pending:
+            raise invalid_base64()
+
+    def _strip_prefix(self, chunk: bytes, final: bool) -> Optional[bytes]:
+        """Devuelve los datos tras el prefijo data:...,; None si aún no se puede decidir"""
+        head = (self._head + chunk).lstrip()
+        if head.startswith(b"data:"):
+            comma = head.find(b",")
+            if comma < 0:
+                if final or len(head) > _DATA_URL_PREFIX_MAX:
+                    raise invalid_base64()
+                self._head = head
+                return None
+            head = head[comma + 1:]
+        elif not final and b"data:".startswith(head):
+            self._head = head  # Vacío o posible inicio de "data:"
+            return None
+        self._head = None
+        return head
+
+    def _decode(self, block: bytes) -> None:
+        try:
+            # Los espacios y saltos de línea ya se quitaron en feed: strict_mode solo rechaza caracteres ajenos
+            self.sink.write(binascii.a2b_base64(block, strict_mode=True))
+        except binascii.Error:
+            raise invalid_base64()
+
+
+def invalid_base64() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Formato de imagen inválido (no es Base64)."
+    )
+
+
+def invalid_json(detail: str = "JSON inválido") -> HTTPException:
+    return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail)
+
+
+class JsonImageFieldReader:
+    """
+    Extrae en streaming el valor del campo "image" del objeto JSON de primer nivel
+    ({"image": "data:image/jpeg;base64,..."}) y lo pasa al decodificador.
+    Se decodifican los escapes de cadena JSON (\\n, \\/, \\uXXXX...); una clave
+    "image" dentro de otro valor o de un objeto anidado no cuenta.
+    """
+    FIELD = "image"
+    KEY_MAX_BYTES = 256
+    _WHITESPACE = b" \t\r\n"
+    _SPECIAL = re.compile(rb'["\\]')
+    _ESCAPES = {
+        ord('"'): b'"', ord("\\"): b"\\", ord("/"): b"/", ord("b"): b"\b",
+        ord("f"): b"\f", ord("n"): b"\n", ord("r"): b"\r", ord("t"): b"\t",
+    }
+
+    def __init__(self, decoder: Base64StreamDecoder):
+        self.decoder = decoder
+        # start, key_or_end, key, colon, value_start, value, skip, end, done
+        self._state = "start"
+        self._key = bytearray()
+        self._escape: Optional[bytes] = None  # Lo leído tras "\\" en una cadena, None fuera de un escape
+        self._depth = 0  # Anidamiento dentro del valor que se salta
+        self._in_string = False
+
+    def feed(self, chunk: bytes) -> None:
+        chunk = bytes(chunk)
+        position = 0
+        while position < len(chunk) and self._state not in ("end", "done"):
+            if self._state == "value":
+                position = self._feed_value(chunk, position)
+            elif self._state == "skip":
+                position = self._skip_value(chunk, position)
+            elif self._state == "key":
+                position = self._read_key(chunk, position)
+            else:
+                self._structural(chunk[position])
+                position += 1
+
+    def _structural(self, byte: int) -> None:
+        """Un byte fuera de cadenas en el objeto de primer nivel"""
+        if byte in self._WHITESPACE:
+            return
+        state = self._state
+        if state == "start" and byte == ord("{"):
+            self._state = "key_or_end"
+        elif state == "key_or_end" and byte == ord('"'):
+            self._key.clear()
+            self._state = "key"
+        elif state == "key_or_end" and byte == ord("}"):
+            self._state = "end"
+        elif state == "colon" and byte == ord(":"):
+            self._state = "value_start" if self._key_name() == self.FIELD else "skip"
+            self._depth, self._in_string = 0, False
+        elif state == "value_start":
+            if byte != ord('"'):
+                raise invalid_json("El campo image debe ser una cadena Base64")
+            self._state = "value"
+        else:
+            raise invalid_json()
+
+    def _key_name(self) -> Optional[str]:
+        try:
+            return json.loads(b'"' + bytes(self._key) + b'"')
+        except ValueError:
+            raise invalid_json()
+
+    def _read_key(self, chunk: bytes, position: int) -> int:
+        """Acumula la clave sin decodificar (el cierre se detecta saltando los escapes)"""
+        while position < len(chunk):
+            byte = chunk[position]
+            position += 1
+            if self._escape is None and byte == ord('"'):
+                self._state = "colon"
+                return position
+            self._escape = b"" if self._escape is None and byte == ord("\\") else None
+            if len(self._key) < self.KEY_MAX_BYTES:
+                self._key.append(byte)
+        return position
+
+    def _skip_value(self, chunk: bytes, position: int) -> int:
+        """Salta el valor de otra clave, con sus cadenas y objetos o listas anidados"""
+        while position < len(chunk):
+            byte = chunk[position]
+            position += 1
+            if self._in_string:
+                if self._escape is not None:
+                    self._escape = None
+                elif byte == ord("\\"):
+                    self._escape = b""
+                elif byte == ord('"'):
+                    self._in_string = False
+            elif byte == ord('"'):
+                self._in_string = True
+            elif byte in b"{[":
+                self._depth += 1
+            elif byte in b"}]":
+                if self._depth == 0:
+                    if byte != ord("}"):
+                        raise invalid_json()
+                    self._state = "end"
+                    return position
+                self._depth -= 1
+            elif byte == ord(",") and self._depth == 0:
+                self._state = "key_or_end"
+                return position
+        return position
+
+    def _feed_value(self, chunk: bytes, position: int) -> int:
+        if self._escape is not None:
+            position = self._finish_escape(chunk, position)
+        while position < len(chunk):
+            match = self._SPECIAL.search(chunk, position)
+            if match is None:
+                self.decoder.feed(chunk[position:])
+                return len(chunk)
+            special = match.start()
+            self.decoder.feed(chunk[position:special])
+            if chunk[special] == ord('"'):
+                self._state = "done"
+                return special + 1
+            self._escape = b""
+            position = self._finish_escape(chunk, special + 1)
+        return position
+
+    def _finish_escape(self, chunk: bytes, position: int) -> int:
+        """Completa un escape que puede venir partido entre chunks y pasa el carácter al decodificador"""
+        first = self._escape[:1] or chunk[position:position + 1]
+        needed = 5 if first == b"u" else 1
+        take = needed - len(self._escape)
+        self._escape += chunk[position:position + take]
+        position += take
+        if len(self._escape) < needed:
+            return len(chunk)
+
+        escape, self._escape = self._escape, None
+        if escape[0] == ord("u"):
+            try:
+                code = int(escape[1:], 16)
+            except ValueError:
+                raise invalid_json()
+            if code > 0x7f:
+                raise invalid_base64()
+            self.decoder.feed(bytes([code]))
+        elif escape[0] in self._ESCAPES:
+            self.decoder.feed(self._ESCAPES[escape[0]])
+        else:
+            raise invalid_json()
+        return position
+
+    def close(self) -> None:
+        if self._state != "done":
+            if self._state not in ("start", "end"):
+                raise invalid_json()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No se proporcionó ninguna imagen"
+            )
+        self.decoder.close()
+
+
+def check_content_length(request: Request, limit: int) -> None:
+    """Rechaza antes de leer si el cliente declara un cuerpo demasiado grande"""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise image_too_large(limit)
+
+
+async def read_raw_image(request: Request, limit: Optional[int] = None) -> ImageBuffer:
+    """Cuerpo binario (application/octet-stream o image/*)"""
+    buffer = ImageBuffer(limit)
+    check_content_length(request, buffer.limit)
+    async for chunk in request.stream():
+        buffer.write(chunk)
+    return buffer
+
+
+async def read_base64_image(request: Request, limit: Optional[int] = None) -> ImageBuffer:
+    """Cuerpo JSON {"image": "<base64>"} o base64 plano (text/plain), decodificado por partes"""
+    buffer = ImageBuffer(limit)
+    # El base64 ocupa 4/3 del binario (más el JSON que lo envuelve)
+    check_content_length(request, buffer.limit * 4 // 3 + 1024)
+    decoder = Base64StreamDecoder(buffer)
+    is_json = "json" in request.headers.get("content-type", "application/json")
+    reader = JsonImageFieldReader(decoder) if is_json else decoder
+    async for chunk in request.stream():
+        reader.feed(chunk)
+    reader.close()
+    return buffer
+
+
+async def read_upload_image(upload: UploadFile, limit: Optional[int] = None) -> ImageBuffer:
+    buffer = ImageBuffer(limit)
+    while True:
+        chunk = await upload.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return buffer
+        buffer.write(chunk)
+
+
+def validate_image(buffer: ImageBuffer) -> str:
+    """Verifica que el buffer sea una imagen que PIL pueda abrir. Devuelve el formato"""
+    if not len(buffer):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No se proporcionó ninguna imagen"
+        )
+    try:
+        with Image.open(buffer.reader()) as img:
+            img.verify()
+            return img.format
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato de imagen inválido. Use JPEG, PNG o WebP."
+        )
+
+
+def prepare_for_rekognition(data, max_edge: int, quality: int) -> Tuple[bytes, Dict]:
+    """
+    Aplica la orientación EXIF, reduce el lado mayor a max_edge y recodifica a JPEG.
+    Un JPEG/PNG que ya cumple (sin rotar ni reducir) se devuelve sin tocar si
+    recodificarlo no lo achica. Es CPU pura: se ejecuta en el pool de preprocesado.
+    """
+    with Image.open(BufferReader(data)) as img:
+        source_format = img.format
+        width, height = img.size
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        needs_resize = max(width, height) > max_edge
+        if source_format == "JPEG" and not needs_resize and orientation == 1:
+            return data, {"format": source_format, "width": width, "height": height, "reencoded": False}
+
+        if needs_resize and source_format == "JPEG":
+            # El decodificador JPEG puede reducir por potencias de 2 al leer (mucho más barato)
+            img.draft("RGB", (max_edge, max_edge))
+        processed = ImageOps.exif_transpose(img)
+        if needs_resize:
+            processed.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        if processed.mode in ("RGBA", "LA", "P"):
+            rgba = processed.convert("RGBA")
+            processed = Image.new("RGB", rgba.size, (255, 255, 255))
+            processed.paste(rgba, mask=rgba.getchannel("A"))
+        elif processed.mode not in ("RGB", "L"):
+            processed = processed.convert("RGB")
+
+        out = io.BytesIO()
+        processed.save(out, format="JPEG", quality=quality)
+        encoded = out.getvalue()
+
+    unchanged = not needs_resize and orientation == 1
+    if unchanged and source_format in REKOGNITION_FORMATS and len(encoded) >= len(data):
+        return data, {"format": source_format, "width": width, "height": height, "reencoded": False}
+    return encoded, {"format": "JPEG", "width": processed.width, "height": processed.height, "reencoded": True}
+
+
+def dhash(data, size: int = 8) -> int:
+    """
+    Hash perceptual (difference hash) de size*size bits: compara cada píxel con
+    su vecino de la derecha en una miniatura en grises. Fotos casi iguales
+    (misma selfie recomprimida o reencuadrada apenas) difieren en pocos bits.
+    """
+    with Image.open(BufferReader(data)) as img:
+        img.draft("L", (size * 4, size * 4))
+        thumb = img.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = np.asarray(thumb, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
@@ -0,0 +1,30 @@
+import hashlib
+from typing import Optional
+from fastapi import Response, status
+
+
+def make_etag(*parts) -> str:
+    """ETag fuerte a partir de las piezas que determinan el contenido de la respuesta"""
+    digest = hashlib.sha256(":".join(str(p) for p in parts).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110), acepta listas y '*'"""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any((c[2:] if c.startswith("W/") else c) == opaque for c in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    # El navegador puede guardar la respuesta pero debe revalidarla siempre
+    response.headers["Cache-Control"] = "private, no-cache"